@@ -0,0 +1,106 @@
+# ai-models/batching.py
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+class MicroBatcher:
+    """
+    Collect concurrent single-item requests and run them as one batch
+
+    A background thread waits until either max_batch_size items are queued
+    or max_wait_ms has passed since the first queued item, then calls
+    batch_fn once with the whole batch. batch_fn must return one result per
+    item, in order.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=5.0, name='micro-batcher'):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.stats = {
+            'batches': 0,
+            'items': 0,
+            'largest_batch': 0
+        }
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Queue an item for the next batch
+
+        Returns:
+            Future: Resolves to the result for this item
+        """
+        future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._queue.append((item, future))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            # Give concurrent callers a short window to join this batch
+            deadline = time.monotonic() + self.max_wait
+            while len(self._queue) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            size = min(len(self._queue), self.max_batch_size)
+            return [self._queue.popleft() for _ in range(size)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+
+            # Drop requests that were cancelled while queued
+            batch = [(item, future) for item, future in batch
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.batch_fn(items))
+                if len(results) != len(items):
+                    raise ValueError(f"batch_fn returned {len(results)} results "
+                                     f"for {len(items)} items")
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                # Fail whatever is still pending so no caller waits forever
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            self.stats['batches'] += 1
+            self.stats['items'] += len(items)
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(items))
+
+    def close(self):
+        """Process anything still queued and stop the worker thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,346 @@
+# ai-models/benchmark.py
+"""
+Benchmark suite for the DreamAIService entry points.
+
+Measures cold start, p50/p95/p99 latency, throughput at several
+concurrency levels and batch sizes, and peak RSS for validate_dream_api,
+generate_dream_image_api and analyze_dream_themes_api. Cold start and peak
+RSS are measured in a fresh interpreter per operation, so neither includes
+models loaded for another operation. Results are written
+as JSON and can be compared against a stored baseline:
+
+    python ai-models/benchmark.py --output bench.json
+    python ai-models/benchmark.py --baseline bench.json --tolerance 0.1
+
+--serving-latency also compares per-call latency of each model's compiled
+tf.function against Keras Model.predict at batch size 1, and --tokenizer
+compares CompactTokenizer against the Keras Tokenizer and a sorted-array
+(np.searchsorted) word lookup.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+AI_MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, AI_MODELS_DIR)
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(AI_MODELS_DIR))
+
+OPERATIONS = ('validate', 'generate', 'analyze')
+
+# Code run in a fresh interpreter to time import + first call
+COLD_START_CALLS = {
+    'validate': "inference.validate_dream_api(TEXT)",
+    'generate': "inference.generate_dream_image_api(TEXT)",
+    'analyze': "inference.analyze_dream_themes_api(TEXT)",
+}
+
+# Single and batch calls run in a fresh interpreter to find an operation's peak RSS
+PEAK_RSS_CALLS = {
+    'validate': ("service.validate_dream_text", "service.validate_dreams_batch"),
+    'generate': ("service.generate_dream_image", "service.generate_dream_images"),
+    'analyze': ("service.analyze_dream_themes",
+                "lambda texts: [service.analyze_dream_themes(text) for text in texts]"),
+}
+
+def build_corpus(size, seed=0, path=None):
+    """
+    Synthetic dream texts of varied length
+
+    Built from the sentences in path (one per line) when given, otherwise
+    from the training datasets, which need the model modules to import.
+    """
+    if path:
+        with open(path, encoding='utf-8') as handle:
+            sentences = [line.strip() for line in handle if line.strip()]
+    else:
+        from dream_validator.model import load_dream_dataset
+        from image_generator.model import download_dream_dataset
+
+        dream_texts, _ = load_dream_dataset()
+        descriptions, _ = download_dream_dataset()
+        sentences = list(dream_texts) + [text.split(': ', 1)[-1] + '.' for text in set(descriptions)]
+
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(sentences) for _ in range(rng.randint(1, 6)))
+            for _ in range(size)]
+
+def percentiles(samples):
+    ordered = sorted(samples)
+
+    def pick(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99),
+            'mean_ms': sum(ordered) / len(ordered) * 1000}
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def measure_cold_start(operation):
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"sys.path.insert(0, {AI_MODELS_DIR!r})\n"
+        "import inference\n"
+        "TEXT = 'I was flying over a city with rainbow-colored buildings'\n"
+        f"{COLD_START_CALLS[operation]}\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True,
+                            text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def measure_peak_rss(operation, corpus, batch_size, micro_batching=False, backend='keras'):
+    """Peak RSS (MB) of a fresh process serving one operation, singly and in a batch"""
+    single_call, batch_call = PEAK_RSS_CALLS[operation]
+    code = (
+        "import json, sys\n"
+        f"sys.path.insert(0, {AI_MODELS_DIR!r})\n"
+        "from benchmark import peak_rss_mb\n"
+        "from inference import DreamAIService\n"
+        "from result_cache import ImageResultCache\n"
+        "texts = json.load(sys.stdin)\n"
+        f"service = DreamAIService(micro_batching={micro_batching!r}, "
+        f"image_cache=ImageResultCache(max_items=0), backend={backend!r})\n"
+        "for text in texts:\n"
+        f"    {single_call}(text)\n"
+        f"({batch_call})(texts)\n"
+        "print(peak_rss_mb())\n"
+    )
+    texts = (corpus * (batch_size // len(corpus) + 1))[:batch_size]
+    output = subprocess.run([sys.executable, '-c', code], input=json.dumps(texts),
+                            capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def measure_latency(fn, corpus, requests):
+    timings = []
+    for i in range(requests):
+        start = time.perf_counter()
+        fn(corpus[i % len(corpus)])
+        timings.append(time.perf_counter() - start)
+    return percentiles(timings)
+
+def measure_throughput(fn, corpus, requests, concurrency):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(fn, (corpus[i % len(corpus)] for i in range(requests))))
+    elapsed = time.perf_counter() - start
+    return {'concurrency': concurrency, 'requests': requests,
+            'requests_per_second': requests / elapsed}
+
+def measure_batches(batch_fn, corpus, batch_size, rounds):
+    timings = []
+    for i in range(rounds):
+        offset = (i * batch_size) % len(corpus)
+        batch = (corpus[offset:] + corpus)[:batch_size]
+        start = time.perf_counter()
+        batch_fn(batch)
+        timings.append(time.perf_counter() - start)
+    result = percentiles(timings)
+    result['batch_size'] = batch_size
+    result['items_per_second'] = batch_size * len(timings) / sum(timings)
+    return result
+
+def measure_serving_latency(corpus, runs=50):
+    """Median single-call latency (ms) of Model.predict vs the compiled serving functions"""
+    from dream_validator.model import DreamValidator
+    from image_generator.model import DreamImageGenerator
+
+    validator = DreamValidator().load()
+    generator = DreamImageGenerator.for_inference()
+    return {
+        'validator': validator.measure_latency(corpus[0], runs),
+        'generator': generator.measure_latency(corpus[0], runs)
+    }
+
+def measure_tokenizer(corpus, batch_sizes, rounds, num_words=10000):
+    """Median milliseconds per batch of texts_to_sequences for each word lookup"""
+    import numpy as np
+    from tensorflow.keras.preprocessing.text import Tokenizer
+    from vocab import CompactTokenizer
+
+    keras_tokenizer = Tokenizer(num_words=num_words, oov_token='<OOV>')
+    keras_tokenizer.fit_on_texts(corpus)
+    compact = CompactTokenizer.from_keras(keras_tokenizer)
+
+    # The same tokens looked up in one sorted word array instead of a dict
+    words = np.asarray(compact.words)
+    order = np.argsort(words)
+    sorted_words, sorted_ids = words[order], order + 1
+
+    def searchsorted(texts):
+        sequences = [[token for token in text.lower().translate(compact._translate).split(compact.split)
+                      if token] for text in texts]
+        tokens = np.asarray([token for sequence in sequences for token in sequence])
+        positions = np.minimum(np.searchsorted(sorted_words, tokens), len(sorted_words) - 1)
+        ids = np.where(sorted_words[positions] == tokens, sorted_ids[positions], compact.oov_index)
+        return np.split(ids, np.cumsum([len(sequence) for sequence in sequences])[:-1])
+
+    lookups = {
+        'keras': keras_tokenizer.texts_to_sequences,
+        'compact': compact.texts_to_sequences,
+        'searchsorted': searchsorted,
+    }
+    results = []
+    for batch_size in batch_sizes:
+        result = {'batch_size': batch_size}
+        for name, fn in lookups.items():
+            result[f'{name}_ms'] = measure_batches(fn, corpus, batch_size, rounds)['p50_ms']
+        results.append(result)
+    return {'vocabulary': len(compact.words), 'batches': results}
+
+def run_benchmarks(args):
+    from inference import DreamAIService
+    from result_cache import ImageResultCache
+
+    corpus = build_corpus(args.corpus_size, path=args.corpus)
+
+    # Disable the image cache so every request measures the model path
+    service = DreamAIService(micro_batching=args.micro_batching,
+                             image_cache=ImageResultCache(max_items=0),
+                             backend=args.backend)
+
+    targets = {
+        'validate': (service.validate_dream_text,
+                     service.validate_dreams_batch),
+        'generate': (service.generate_dream_image,
+                     lambda texts: service.generate_dream_images(texts)),
+        'analyze': (service.analyze_dream_themes,
+                    lambda texts: [service.analyze_dream_themes(text) for text in texts]),
+    }
+
+    results = {}
+    for operation in args.operations:
+        single_fn, batch_fn = targets[operation]
+        requests = args.requests if operation != 'generate' else max(1, args.requests // 5)
+        print(f"Benchmarking {operation}...")
+
+        report = {}
+        if not args.skip_cold_start:
+            report['cold_start_seconds'] = measure_cold_start(operation)
+
+        # Load models before timing the warm path
+        single_fn(corpus[0])
+
+        report['latency'] = measure_latency(single_fn, corpus, requests)
+        report['throughput'] = [measure_throughput(single_fn, corpus, requests, concurrency)
+                                for concurrency in args.concurrency]
+        report['batches'] = [measure_batches(batch_fn, corpus, batch_size, args.batch_rounds)
+                             for batch_size in args.batch_sizes]
+        report['peak_rss_mb'] = measure_peak_rss(operation, corpus, max(args.batch_sizes),
+                                                 args.micro_batching, args.backend)
+        results[operation] = report
+
+    report = {
+        'timestamp': time.time(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'config': {
+            'corpus_size': args.corpus_size,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'batch_sizes': args.batch_sizes,
+            'micro_batching': args.micro_batching,
+            'backend': args.backend
+        },
+        'results': results
+    }
+    if args.serving_latency:
+        print("Comparing compiled serving against Model.predict...")
+        report['serving_latency'] = measure_serving_latency(corpus)
+    if args.tokenizer:
+        print("Comparing tokenizer word lookups...")
+        report['tokenizer'] = measure_tokenizer(corpus, args.batch_sizes, max(args.batch_rounds, 50))
+    return report
+
+def compare_to_baseline(current, baseline, tolerance):
+    """List metrics that regressed by more than tolerance (a fraction)"""
+    regressions = []
+    for operation, report in current['results'].items():
+        base = baseline.get('results', {}).get(operation)
+        if not base:
+            continue
+
+        # Lower is better
+        checks = [(f'{operation}.latency.{key}', report['latency'][key], base['latency'][key], False)
+                  for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+
+        # Higher is better
+        base_throughput = {row['concurrency']: row for row in base.get('throughput', [])}
+        for row in report['throughput']:
+            if row['concurrency'] in base_throughput:
+                checks.append((f"{operation}.throughput.c{row['concurrency']}",
+                               row['requests_per_second'],
+                               base_throughput[row['concurrency']]['requests_per_second'], True))
+
+        base_batches = {row['batch_size']: row for row in base.get('batches', [])}
+        for row in report['batches']:
+            if row['batch_size'] in base_batches:
+                checks.append((f"{operation}.batches.b{row['batch_size']}",
+                               row['items_per_second'],
+                               base_batches[row['batch_size']]['items_per_second'], True))
+
+        for name, value, base_value, higher_is_better in checks:
+            if not base_value:
+                continue
+            change = (value - base_value) / base_value
+            if (higher_is_better and change < -tolerance) or (not higher_is_better and change > tolerance):
+                regressions.append(f"{name}: {base_value:.3f} -> {value:.3f} ({change:+.1%})")
+
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the DreamAIService entry points')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument('--corpus-size', type=int, default=500)
+    parser.add_argument('--corpus', help='Dream sentences to build the corpus from, one per line '
+                                         '(default: the training datasets)')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--batch-rounds', type=int, default=10)
+    parser.add_argument('--micro-batching', action='store_true')
+    parser.add_argument('--backend', default='keras',
+                        help="'keras' or a quantized TFLite backend such as 'tflite-int8'")
+    parser.add_argument('--skip-cold-start', action='store_true')
+    parser.add_argument('--serving-latency', action='store_true',
+                        help='Also compare compiled tf.function serving against Model.predict')
+    parser.add_argument('--tokenizer', action='store_true',
+                        help='Also compare tokenizer word lookups on the corpus')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help='Allowed relative regression before failing')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args)
+    with open(args.output, 'w') as handle:
+        json.dump(results, handle, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            baseline = json.load(handle)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# ai-models/bulk_process.py
+"""
+Streaming batch job that validates and theme-tags dream archives.
+
+Reads a JSONL or CSV archive lazily, runs fixed-size batches through
+DreamAIService.validate_dreams_batch and analyze_dream_themes and appends
+one JSON line per input row to the output, so memory stays bounded by the
+batch size whatever the archive size. After every batch a checkpoint
+records how far the input and output got; rerunning the same command
+resumes from there.
+
+    python ai-models/bulk_process.py dreams.jsonl results.jsonl --batch-size 256
+    python ai-models/bulk_process.py dreams.csv results.jsonl --text-field text --id-field id
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+# Make sibling modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+OPERATIONS = ('validate', 'analyze')
+
+def detect_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+def read_jsonl(path, offset=0):
+    """
+    Yield (row, offset after row) for each record, starting at a byte offset
+
+    Blank lines are skipped; the offsets let a checkpoint resume mid-file.
+    """
+    with open(path, 'rb') as handle:
+        handle.seek(offset)
+        for line in iter(handle.readline, b''):
+            offset += len(line)
+            if line.strip():
+                yield json.loads(line), offset
+
+def read_csv(path, offset=0):
+    """
+    Yield (row, rows read so far) for each CSV record after the header
+
+    CSV fields may contain newlines, so progress is counted in rows and a
+    resumed run re-parses (but does not re-process) the rows it skips.
+    """
+    with open(path, newline='', encoding='utf-8') as handle:
+        for position, row in enumerate(itertools.islice(csv.DictReader(handle), offset, None),
+                                       start=offset + 1):
+            yield row, position
+
+def batched(rows, batch_size):
+    iterator = iter(rows)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+def save_checkpoint(path, state):
+    # Written to a temporary file and renamed so a crash never leaves half a checkpoint
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as handle:
+        json.dump(state, handle)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+def process_batch(service, rows, args, first_index):
+    texts = [str(row.get(args.text_field) or '') for row in rows]
+    audio_urls = [row.get(args.audio_field) or None for row in rows]
+
+    # Rows without text are reported rather than sent to the models
+    valid = [i for i, text in enumerate(texts) if text.strip()]
+    valid_set = set(valid)
+    validations = {}
+    if 'validate' in args.operations and valid:
+        results = service.validate_dreams_batch([texts[i] for i in valid],
+                                                [audio_urls[i] for i in valid])
+        validations = dict(zip(valid, results))
+
+    records = []
+    for i, row in enumerate(rows):
+        record = {'id': row.get(args.id_field, first_index + i)}
+        if i not in valid_set:
+            record['error'] = 'Dream text is required'
+        else:
+            if 'validate' in args.operations:
+                record['validation'] = validations[i]
+            if 'analyze' in args.operations:
+                analysis = service.analyze_dream_themes(texts[i])
+                del analysis['dream_text']
+                record['analysis'] = analysis
+        records.append(record)
+    return records
+
+def run(args, service=None):
+    input_format = args.format or detect_format(args.input)
+    reader = read_csv if input_format == 'csv' else read_jsonl
+    checkpoint_path = args.checkpoint or f'{args.output}.checkpoint'
+
+    state = {'input': os.path.abspath(args.input), 'input_offset': 0,
+             'output_bytes': 0, 'rows': 0}
+    checkpoint = load_checkpoint(checkpoint_path) if not args.restart else None
+    if checkpoint is not None:
+        if checkpoint['input'] != state['input']:
+            raise ValueError(f"{checkpoint_path} belongs to {checkpoint['input']}; "
+                             "use --restart to start over")
+        state = checkpoint
+        print(f"Resuming after {state['rows']} rows")
+
+    if service is None:
+        from inference import DreamAIService
+        service = DreamAIService(backend=args.backend)
+
+    # Drop anything written after the last checkpoint, then append
+    mode = 'r+b' if state['output_bytes'] and os.path.exists(args.output) else 'wb'
+    with open(args.output, mode) as output:
+        output.truncate(state['output_bytes'])
+        output.seek(state['output_bytes'])
+
+        start = time.perf_counter()
+        processed = 0
+        rows = reader(args.input, state['input_offset'])
+        for batch in batched(rows, args.batch_size):
+            records = process_batch(service, [row for row, _ in batch], args, state['rows'])
+            output.write(b''.join(json.dumps(record).encode('utf-8') + b'\n' for record in records))
+            output.flush()
+            os.fsync(output.fileno())
+
+            state['input_offset'] = batch[-1][1]
+            state['output_bytes'] = output.tell()
+            state['rows'] += len(batch)
+            save_checkpoint(checkpoint_path, state)
+
+            processed += len(batch)
+            elapsed = time.perf_counter() - start
+            print(f"{state['rows']} rows done ({processed / elapsed:.1f} rows/s)")
+
+    state['completed'] = True
+    save_checkpoint(checkpoint_path, state)
+    print(f"Processed {processed} rows; results in {args.output}")
+    return state
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Validate and theme-tag a dream archive in batches')
+    parser.add_argument('input', help='JSONL or CSV file of dreams')
+    parser.add_argument('output', help='JSONL file of results, one line per input row')
+    parser.add_argument('--format', choices=('jsonl', 'csv'), help='Input format (default: by extension)')
+    parser.add_argument('--operations', nargs='+', choices=OPERATIONS, default=list(OPERATIONS))
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--text-field', default='dreamText')
+    parser.add_argument('--audio-field', default='audioUrl')
+    parser.add_argument('--id-field', default='id', help='Copied to each result (default: row number)')
+    parser.add_argument('--backend', default='keras',
+                        help="'keras' or a quantized TFLite backend such as 'tflite-int8'")
+    parser.add_argument('--checkpoint', help='Progress file (default: <output>.checkpoint)')
+    parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+    args = parser.parse_args(argv)
+
+    run(args)
+
+if __name__ == "__main__":
+    main()
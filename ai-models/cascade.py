@@ -0,0 +1,243 @@
+# ai-models/cascade.py
+"""
+Cheap-first validation cascade.
+
+A logistic regression over hashed word n-grams scores every dream first.
+Texts it is confident about (score <= low or >= high) are answered
+immediately; only the uncertain band goes on to the BiLSTM validator.
+Scoring is vectorized: a batch becomes one flat array of feature ids and
+the per-text sums are a single np.add.reduceat over the weight lookups.
+
+Training the fast model and reporting early-exit rate and accuracy
+against the full validator for a few threshold pairs:
+
+    python ai-models/cascade.py --output ai-models/dream-validator/cascade.npz
+"""
+import argparse
+import json
+import os
+import sys
+import zlib
+from contextlib import nullcontext
+
+import numpy as np
+
+from themes import tokenize
+
+DEFAULT_MODEL_PATH = 'ai-models/dream-validator/cascade.npz'
+
+def _feature_names(text, ngram):
+    tokens = tokenize(text)
+    # Numbers are a strong "fake dream" signal whatever their value
+    shapes = ['<num>' if token.isdigit() else token for token in tokens]
+    features = tokens + [shape for shape in shapes if shape == '<num>']
+    for n in range(2, ngram + 1):
+        features.extend(' '.join(shapes[i:i + n]) for i in range(len(shapes) - n + 1))
+    return features
+
+class HashedNgramClassifier:
+    """Logistic regression over hashed word 1..ngram-grams"""
+
+    def __init__(self, n_features=2 ** 18, ngram=2, weights=None, bias=0.0):
+        self.n_features = n_features
+        self.ngram = ngram
+        self.weights = weights if weights is not None else np.zeros(n_features, dtype=np.float32)
+        self.bias = bias
+
+    def featurize(self, texts):
+        """
+        Hashed feature ids for a batch
+
+        Returns:
+            tuple: (flat feature ids, start offset of each text, features per text)
+        """
+        ids = []
+        lengths = np.empty(len(texts), dtype=np.int64)
+        for i, text in enumerate(texts):
+            features = _feature_names(text, self.ngram)
+            ids.extend(zlib.crc32(feature.encode('utf-8')) % self.n_features for feature in features)
+            lengths[i] = len(features)
+        starts = np.cumsum(lengths) - lengths
+        return np.asarray(ids, dtype=np.int64), starts, lengths
+
+    def _logits(self, ids, starts, lengths):
+        logits = np.full(len(lengths), self.bias, dtype=np.float64)
+        nonempty = lengths > 0
+        if ids.size:
+            # reduceat needs strictly valid starts, so empty texts are skipped
+            sums = np.add.reduceat(self.weights[ids].astype(np.float64), starts[nonempty])
+            logits[nonempty] += sums
+        return logits
+
+    def predict_proba(self, texts):
+        """Probability that each text is an authentic dream"""
+        logits = self._logits(*self.featurize(texts))
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def fit(self, texts, labels, epochs=200, learning_rate=0.5, l2=1e-4):
+        """Full-batch gradient descent on the log loss"""
+        ids, starts, lengths = self.featurize(texts)
+        labels = np.asarray(labels, dtype=np.float64)
+        rows = np.repeat(np.arange(len(texts)), lengths)
+
+        for _ in range(epochs):
+            probabilities = 1.0 / (1.0 + np.exp(-self._logits(ids, starts, lengths)))
+            errors = (probabilities - labels) / len(texts)
+            gradient = np.bincount(ids, weights=errors[rows], minlength=self.n_features)
+            self.weights -= (learning_rate * (gradient + l2 * self.weights)).astype(np.float32)
+            self.bias -= learning_rate * float(errors.sum())
+        return self
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, weights=self.weights, bias=self.bias,
+                 n_features=self.n_features, ngram=self.ngram)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(int(data['n_features']), int(data['ngram']),
+                       data['weights'].astype(np.float32), float(data['bias']))
+
+class ValidationCascade:
+    """
+    Fast model first; the full validator only for uncertain texts
+
+    Scores at or below low, or at or above high, exit early with the fast
+    model's score as the authenticity score.
+    """
+
+    def __init__(self, fast_model, low=0.1, high=0.9):
+        if not 0.0 <= low <= high <= 1.0:
+            raise ValueError("Cascade thresholds need 0 <= low <= high <= 1")
+        self.fast_model = fast_model
+        self.low = low
+        self.high = high
+
+        # Optional Instrumentation from ai-models/instrumentation.py
+        self.metrics = None
+
+        self.stats = {
+            'requests': 0,
+            'early_exits': 0
+        }
+
+    @classmethod
+    def load(cls, path=DEFAULT_MODEL_PATH, low=0.1, high=0.9):
+        return cls(HashedNgramClassifier.load(path), low, high)
+
+    def score(self, dream_texts):
+        """
+        Fast scores and which texts are confident enough to exit early
+
+        Returns:
+            tuple: (scores, boolean early-exit mask)
+        """
+        scores = self.fast_model.predict_proba(dream_texts)
+        early = (scores <= self.low) | (scores >= self.high)
+        self.stats['requests'] += len(dream_texts)
+        self.stats['early_exits'] += int(early.sum())
+        return scores, early
+
+    def _stage(self):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.stage('validate', 'cascade')
+
+    def validate_batch(self, dream_texts, validator):
+        """validator.validate_batch results, with confident texts answered by the fast model"""
+        with self._stage():
+            scores, early = self.score(dream_texts)
+        if self.metrics is not None:
+            self.metrics.count('cascade_early_exits', int(early.sum()), operation='validate')
+
+        results = [None] * len(dream_texts)
+        for i in np.flatnonzero(early):
+            results[i] = validator._result(dream_texts[i], scores[i])
+
+        uncertain = np.flatnonzero(~early)
+        if len(uncertain):
+            scored = validator.validate_batch([dream_texts[i] for i in uncertain])
+            for i, result in zip(uncertain, scored):
+                results[i] = result
+        return results
+
+    def early_exit_rate(self):
+        return self.stats['early_exits'] / self.stats['requests'] if self.stats['requests'] else 0.0
+
+def evaluate_cascade(fast_model, validator, texts, labels, thresholds):
+    """
+    Early-exit rate and accuracy of the cascade for each (low, high) pair
+
+    Accuracy uses the validator's decision threshold for every score, so
+    the cascade is compared like-for-like against the full validator.
+    """
+    labels = np.asarray(labels) > 0.5
+    fast_scores = fast_model.predict_proba(texts)
+    full_scores = np.asarray([result['authenticity_score']
+                              for result in validator.validate_batch(texts)])
+    full_decisions = full_scores > validator.threshold
+
+    report = {
+        'samples': len(texts),
+        'full_model_accuracy': float(np.mean(full_decisions == labels)),
+        'fast_model_accuracy': float(np.mean((fast_scores > validator.threshold) == labels)),
+        'cascades': []
+    }
+    for low, high in thresholds:
+        early = (fast_scores <= low) | (fast_scores >= high)
+        decisions = np.where(early, fast_scores > validator.threshold, full_decisions)
+        report['cascades'].append({
+            'low': low,
+            'high': high,
+            'early_exit_rate': float(np.mean(early)),
+            'accuracy': float(np.mean(decisions == labels)),
+            'agreement_with_full_model': float(np.mean(decisions == full_decisions)),
+            'early_exit_accuracy': float(np.mean(decisions[early] == labels[early])) if early.any() else None
+        })
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Train the fast cascade model and report early-exit accuracy')
+    parser.add_argument('--shards', help="Labelled JSONL/CSV shards, e.g. 'data/dreams-*.jsonl' "
+                                         "(default: the built-in dataset)")
+    parser.add_argument('--output', default=DEFAULT_MODEL_PATH)
+    parser.add_argument('--validation-percent', type=int, default=20)
+    parser.add_argument('--thresholds', nargs='+', default=['0.05:0.95', '0.1:0.9', '0.2:0.8'],
+                        help='low:high pairs to evaluate')
+    parser.add_argument('--report', default='cascade_report.json')
+    args = parser.parse_args(argv)
+
+    # Make sibling modules and model packages importable when run as a script
+    ai_models_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, ai_models_dir)
+    sys.path.append(os.path.dirname(ai_models_dir))
+
+    import glob
+    from dream_validator.model import (DreamValidator, load_dream_dataset,
+                                       read_labelled_shard, in_validation_split)
+
+    if args.shards:
+        rows = [row for path in sorted(glob.glob(args.shards)) for row in read_labelled_shard(path)]
+    else:
+        rows = list(zip(*load_dream_dataset()))
+
+    train = [row for row in rows if not in_validation_split(row[0], args.validation_percent)]
+    held_out = [row for row in rows if in_validation_split(row[0], args.validation_percent)] or train
+
+    fast_model = HashedNgramClassifier().fit([text for text, _ in train], [label for _, label in train])
+    fast_model.save(args.output)
+    print(f"Fast model saved to {args.output}")
+
+    thresholds = [tuple(float(value) for value in pair.split(':')) for pair in args.thresholds]
+    report = evaluate_cascade(fast_model, DreamValidator().load(),
+                              [text for text, _ in held_out], [label for _, label in held_out],
+                              thresholds)
+
+    with open(args.report, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# ai-models/check_import_time.py
+"""
+Guard against start-up regressions in the lightweight service paths.
+
+Importing the service, running a theme analysis and importing the inference
+server must not pull in TensorFlow, NumPy, Pillow or matplotlib, and must
+finish within a time budget. Each scenario runs in a fresh interpreter.
+
+    python ai-models/check_import_time.py [--budget-ms 300]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+AI_MODELS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+HEAVY_MODULES = ('tensorflow', 'keras', 'numpy', 'PIL', 'matplotlib', 'pandas', 'sklearn')
+
+SCENARIOS = {
+    'import inference': "import inference",
+    'analyze_dream_themes_api': (
+        "import inference\n"
+        "inference.analyze_dream_themes_api('I was flying over the sea and felt happy')"
+    ),
+    'import server': "import server",
+}
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+exec({code!r})
+elapsed = time.perf_counter() - start
+heavy = sorted(name for name in {heavy!r} if name in sys.modules)
+print(json.dumps({{'seconds': elapsed, 'heavy_modules': heavy}}))
+'''
+
+def run_scenario(code):
+    probe = PROBE.format(code=code, heavy=HEAVY_MODULES)
+    start_code = f"import sys; sys.path.insert(0, {AI_MODELS_DIR!r})\n" + probe
+    output = subprocess.run(
+        [sys.executable, '-c', start_code],
+        capture_output=True, text=True, check=True, cwd=AI_MODELS_DIR
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check service import time and heavy imports')
+    parser.add_argument('--budget-ms', type=float, default=300.0,
+                        help='Maximum time allowed per scenario')
+    args = parser.parse_args(argv)
+
+    failures = []
+    for name, code in SCENARIOS.items():
+        result = run_scenario(code)
+        elapsed_ms = result['seconds'] * 1000
+        print(f"{name}: {elapsed_ms:.1f} ms, heavy modules: {result['heavy_modules'] or 'none'}")
+
+        if result['heavy_modules']:
+            failures.append(f"{name} imported {', '.join(result['heavy_modules'])}")
+        if elapsed_ms > args.budget_ms:
+            failures.append(f"{name} took {elapsed_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        return 1
+
+    print("Import time check passed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,377 @@
+# ai-models/dedup_index.py
+"""
+Near-duplicate index of submitted dreams.
+
+Each text is sketched as a 64-bit SimHash of its hashed content words
+(optionally word n-grams); stopwords are dropped, since short dreams
+share most of them ("I was ... and I could ..."). Changing one word of a
+dream moves the signature by a few bits, while unrelated dreams
+typically differ in 20 or more. The signature only finds candidates: a
+candidate is returned only if its content words also overlap the query's
+by at least min_similarity (Jaccard), so a short unrelated dream that
+happens to hash close by is never reused.
+
+The signature is split into four 16-bit bands. Two signatures within
+Hamming distance d differ in at most d // 4 bits of some band, so a
+lookup probes every key within that radius of each of its band keys
+(one key per band for d < 4, 17 for d < 8, 137 for d < 12) and only
+compares the entries found there. Each band is a sorted array searched with
+searchsorted, recent inserts sit in a small tail scanned with vectorized
+comparisons, and the tail is merged into the sorted arrays every
+merge_every inserts. Distances of MAX_DISTANCE or more are rejected:
+they would probe a large share of the index and reach unrelated dreams.
+
+With a path the index persists to a directory: signatures and payload
+offsets live in memory-mapped uint64 files, payloads and content words
+(JSON) in an append-only file, and a small header records how much of
+each is valid. Indexes written by an older format are derived data and
+are started afresh.
+"""
+import atexit
+import functools
+import hashlib
+import itertools
+import json
+import os
+import threading
+
+import numpy as np
+
+from themes import tokenize
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+MAX_DISTANCE = 16
+FORMAT_VERSION = 2
+
+STOPWORDS = frozenset('''
+a about above after again all am an and any are as at be been before being below between both
+but by can could did do does doing down during each few for from further had has have having he
+her here hers herself him himself his how i i'm if in into is it it's its itself just me more
+most my myself now of off on once only or other our ours out over own same she should
+so some such than that the their theirs them then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you
+your yours
+'''.split())
+
+_BIT_SHIFTS = np.arange(64, dtype=np.uint64)
+
+def _popcount(values):
+    # Set bits per uint64
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+def _probe_radius(max_distance):
+    # Bits a band may differ by when the whole signature is within max_distance
+    return max_distance // BANDS
+
+@functools.lru_cache(maxsize=None)
+def _probe_masks(radius):
+    # Every band-wide XOR mask with at most radius bits set
+    masks = [sum(1 << bit for bit in bits)
+             for r in range(radius + 1)
+             for bits in itertools.combinations(range(BAND_BITS), r)]
+    return np.asarray(masks, dtype=np.uint16)
+
+def _ranges(starts, ends):
+    # Concatenated arange(start, end) for every pair
+    lengths = ends - starts
+    total = int(lengths.sum())
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return offsets + np.arange(total)
+
+def content_words(text):
+    """Tokens of text without stopwords (all tokens if only stopwords remain)"""
+    tokens = tokenize(text)
+    return [token for token in tokens if token not in STOPWORDS] or tokens
+
+def similarity(words, other):
+    """Jaccard similarity of two collections of words"""
+    words, other = set(words), set(other)
+    if not words and not other:
+        return 1.0
+    return len(words & other) / len(words | other)
+
+def simhash(text, ngram=1):
+    """64-bit SimHash of a text's content word 1..ngram-grams"""
+    tokens = content_words(text)
+    shingles = [' '.join(tokens[i:i + n]) for n in range(1, ngram + 1)
+                for i in range(len(tokens) - n + 1)]
+    if not shingles:
+        return 0
+
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+         for shingle in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    bits = (hashes[:, None] >> _BIT_SHIFTS) & np.uint64(1)
+    # Bit i is set when most shingles have it set
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int((votes.astype(np.uint64) << _BIT_SHIFTS).sum())
+
+class DedupIndex:
+    """Incremental banded-SimHash index mapping dreams to stored payloads"""
+
+    def __init__(self, path=None, max_distance=8, min_similarity=0.7, ngram=1, merge_every=4096,
+                 flush_every=1000, initial_capacity=1024):
+        self.path = path
+        self.max_distance = self._check_distance(max_distance)
+        self.min_similarity = min_similarity
+        self.ngram = ngram
+        self.merge_every = merge_every
+        self.flush_every = flush_every
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._merged = 0
+        self._unflushed = 0
+        self._records = {}
+        self._payload_file = None
+        self._payload_end = 0
+
+        self.stats = {
+            'lookups': 0,
+            'hits': 0,
+            # Candidates within max_distance whose words did not match
+            'rejected': 0,
+            'inserts': 0
+        }
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._open(initial_capacity)
+            atexit.register(self.close)
+        else:
+            self._signatures = np.zeros(initial_capacity, dtype=np.uint64)
+
+        self._rebuild_bands()
+
+    @staticmethod
+    def _check_distance(max_distance):
+        if not 0 <= max_distance < MAX_DISTANCE:
+            raise ValueError(f"max_distance must be between 0 and {MAX_DISTANCE - 1}, got {max_distance}")
+        return max_distance
+
+    # Persistence
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open(self, initial_capacity):
+        header = {'count': 0, 'payload_bytes': 0}
+        if os.path.exists(self._file('index.json')):
+            with open(self._file('index.json')) as handle:
+                header = json.load(handle)
+            if header.get('version') != FORMAT_VERSION:
+                print(f"Dedup index at {self.path} has an old format; starting a new one")
+                header = {'count': 0, 'payload_bytes': 0}
+        self._count = header['count']
+        self._payload_end = header['payload_bytes']
+        # Stored signatures are only comparable with the n-gram size they were built with
+        self.ngram = header.get('ngram', self.ngram)
+
+        capacity = max(initial_capacity, self._count)
+        self._signatures = self._map('signatures.u64', capacity)
+        self._offsets = self._map('offsets.u64', capacity)
+
+        # Drop payloads written after the last flushed header
+        self._payload_file = open(self._file('payloads.jsonl'), 'ab+')
+        self._payload_file.truncate(self._payload_end)
+
+    def _map(self, name, capacity):
+        path = self._file(name)
+        size = os.path.getsize(path) // 8 if os.path.exists(path) else 0
+        if size < capacity:
+            with open(path, 'ab') as handle:
+                handle.truncate(capacity * 8)
+            size = capacity
+        return np.memmap(path, dtype=np.uint64, mode='r+', shape=(size,))
+
+    def _grow(self):
+        capacity = len(self._signatures) * 2
+        if self.path:
+            self._signatures.flush()
+            self._offsets.flush()
+            self._signatures = self._map('signatures.u64', capacity)
+            self._offsets = self._map('offsets.u64', capacity)
+        else:
+            signatures = np.zeros(capacity, dtype=np.uint64)
+            signatures[:self._count] = self._signatures[:self._count]
+            self._signatures = signatures
+
+    def flush(self):
+        """Make every insert so far durable"""
+        if not self.path:
+            return
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._payload_file is None:
+            return
+        self._payload_file.flush()
+        os.fsync(self._payload_file.fileno())
+        self._signatures.flush()
+        self._offsets.flush()
+
+        # The header is written last, so it never covers data that is not on disk
+        tmp_path = self._file('index.json.tmp')
+        with open(tmp_path, 'w') as handle:
+            json.dump({'version': FORMAT_VERSION, 'count': self._count,
+                       'payload_bytes': self._payload_end, 'ngram': self.ngram}, handle)
+        os.replace(tmp_path, self._file('index.json'))
+        self._unflushed = 0
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._payload_file is not None:
+                self._payload_file.close()
+                self._payload_file = None
+
+    # Band index
+
+    def _band_keys(self, signatures, band):
+        return ((signatures >> np.uint64(band * BAND_BITS)) & np.uint64(BAND_MASK)).astype(np.uint16)
+
+    def _rebuild_bands(self):
+        signatures = self._signatures[:self._count]
+        self._band_keys_sorted = []
+        self._band_ids_sorted = []
+        for band in range(BANDS):
+            keys = self._band_keys(signatures, band)
+            order = np.argsort(keys, kind='stable')
+            self._band_keys_sorted.append(keys[order])
+            self._band_ids_sorted.append(order.astype(np.uint32))
+        self._merged = self._count
+
+    def _merge_tail(self):
+        tail_ids = np.arange(self._merged, self._count, dtype=np.uint32)
+        tail = self._signatures[self._merged:self._count]
+        for band in range(BANDS):
+            keys = self._band_keys(tail, band)
+            order = np.argsort(keys, kind='stable')
+            positions = np.searchsorted(self._band_keys_sorted[band], keys[order], side='right')
+            self._band_keys_sorted[band] = np.insert(self._band_keys_sorted[band], positions, keys[order])
+            self._band_ids_sorted[band] = np.insert(self._band_ids_sorted[band], positions, tail_ids[order])
+        self._merged = self._count
+
+    def _candidates(self, signature, max_distance):
+        query = np.uint64(signature)
+        radius = _probe_radius(max_distance)
+        masks = _probe_masks(radius)
+        found = []
+        for band in range(BANDS):
+            # Same dtype as the band, so searchsorted does not convert the whole array
+            probes = np.uint16((signature >> (band * BAND_BITS)) & BAND_MASK) ^ masks
+            keys = self._band_keys_sorted[band]
+            starts = np.searchsorted(keys, probes, side='left')
+            ends = np.searchsorted(keys, probes, side='right')
+            hit = ends > starts
+            if hit.any():
+                found.append(self._band_ids_sorted[band][_ranges(starts[hit], ends[hit])])
+
+        # Unmerged inserts are compared directly
+        if self._count > self._merged:
+            tail = self._signatures[self._merged:self._count]
+            matches = np.zeros(len(tail), dtype=bool)
+            for band in range(BANDS):
+                shift = np.uint64(band * BAND_BITS)
+                matches |= _popcount(((tail ^ query) >> shift) & np.uint64(BAND_MASK)) <= radius
+            found.append((np.flatnonzero(matches) + self._merged).astype(np.uint32))
+
+        if not found:
+            return np.empty(0, dtype=np.uint32)
+        return np.unique(np.concatenate(found))
+
+    # Lookups and inserts
+
+    def _search(self, signature, k, max_distance):
+        candidates = self._candidates(signature, max_distance)
+        if not len(candidates):
+            return candidates, candidates
+        distances = _popcount(self._signatures[candidates] ^ np.uint64(signature))
+        nearest = np.argsort(distances, kind='stable')[:k]
+        return candidates[nearest], distances[nearest]
+
+    def top_k(self, text, k=5):
+        """
+        Closest stored dreams among those probed for max_distance
+
+        Every stored dream within max_distance bits is considered; farther
+        ones are only returned when they happen to be probed.
+
+        Returns:
+            list: (entry id, Hamming distance, payload), nearest first
+        """
+        signature = simhash(text, self.ngram)
+        with self._lock:
+            ids, distances = self._search(signature, k, self.max_distance)
+            return [(int(entry_id), int(distance), self._record(int(entry_id))['payload'])
+                    for entry_id, distance in zip(ids, distances)]
+
+    def lookup(self, text, max_distance=None, candidates=8):
+        """
+        Payload of the nearest stored dream that matches text, or None
+
+        A stored dream matches when its signature is within max_distance
+        bits and its content words overlap text's by min_similarity. Up to
+        candidates of the nearest signatures are checked.
+        """
+        max_distance = self.max_distance if max_distance is None else self._check_distance(max_distance)
+        words = content_words(text)
+        signature = simhash(text, self.ngram)
+        with self._lock:
+            self.stats['lookups'] += 1
+            ids, distances = self._search(signature, candidates, max_distance)
+            for entry_id, distance in zip(ids.tolist(), distances.tolist()):
+                if distance > max_distance:
+                    break
+                record = self._record(entry_id)
+                if similarity(words, record['words']) >= self.min_similarity:
+                    self.stats['hits'] += 1
+                    return record['payload']
+                self.stats['rejected'] += 1
+            return None
+
+    def add(self, text, payload):
+        """Store a JSON-serializable payload for text and return its entry id"""
+        signature = simhash(text, self.ngram)
+        record = {'words': sorted(set(content_words(text))), 'payload': payload}
+        data = json.dumps(record).encode('utf-8') + b'\n'
+        with self._lock:
+            if self._count == len(self._signatures):
+                self._grow()
+
+            entry_id = self._count
+            self._signatures[entry_id] = signature
+            if self.path:
+                self._offsets[entry_id] = self._payload_end
+                self._payload_file.write(data)
+                self._payload_end += len(data)
+            else:
+                self._records[entry_id] = record
+            self._count += 1
+            self.stats['inserts'] += 1
+
+            if self._count - self._merged >= self.merge_every:
+                self._merge_tail()
+            self._unflushed += 1
+            if self.path and self._unflushed >= self.flush_every:
+                self._flush()
+        return entry_id
+
+    def _record(self, entry_id):
+        # {'words': content words, 'payload': payload} of an entry
+        if not self.path:
+            return self._records[entry_id]
+
+        start = int(self._offsets[entry_id])
+        end = int(self._offsets[entry_id + 1]) if entry_id + 1 < self._count else self._payload_end
+        # Buffered writes must reach the file before they can be read back
+        self._payload_file.flush()
+        return json.loads(os.pread(self._payload_file.fileno(), end - start, start))
+
+    def __len__(self):
+        return self._count
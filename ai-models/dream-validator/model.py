@@ -1,13 +1,27 @@
 # ai-models/dream-validator/model.py
+import csv
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from contextlib import nullcontext
 import pandas as pd
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
 from tensorflow.keras.models import Sequential
 from tensorflow.keras.layers import Embedding, LSTM, Dense, Dropout, Bidirectional
 from sklearn.model_selection import train_test_split
 
+# Add parent directory to path for the shared ai-models helpers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vocab import CompactTokenizer, load_tokenizer
+from length_buckets import DEFAULT_BUCKETS, bucket_boundaries, bucket_dataset, run_bucketed
+
 # Load training data
 # This would typically be a dataset of real dreams vs fake/generated texts
 def load_dream_dataset():
@@ -46,15 +60,37 @@ def preprocess_text(texts, max_words=10000, max_sequence_length=100):
     tokenizer = Tokenizer(num_words=max_words, oov_token="<OOV>")
     tokenizer.fit_on_texts(texts)
 
-    sequences = tokenizer.texts_to_sequences(texts)
-    padded_sequences = pad_sequences(sequences, maxlen=max_sequence_length, padding='post')
+    compact_tokenizer = save_tokenizer(tokenizer)
+    padded_sequences = compact_tokenizer.texts_to_padded(texts, max_sequence_length)
+
+    return padded_sequences, tokenizer
 
-    # Save tokenizer for inference
+def save_tokenizer(tokenizer):
+    """Save the fitted tokenizer for inference and return its compact form"""
     import pickle
     with open('ai-models/dream-validator/tokenizer.pickle', 'wb') as handle:
         pickle.dump(tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
 
-    return padded_sequences, tokenizer
+    # Compact copy holding only the words the model can see
+    compact_tokenizer = CompactTokenizer.from_keras(tokenizer)
+    compact_tokenizer.save('ai-models/dream-validator/tokenizer.vocab')
+    return compact_tokenizer
+
+def build_model(vocab_size, embedding_dim=128):
+    # Padding is masked, so texts can be run at their bucketed length
+    model = Sequential([
+        Embedding(vocab_size, embedding_dim, mask_zero=True),
+        Bidirectional(LSTM(64, return_sequences=True)),
+        Bidirectional(LSTM(32)),
+        Dense(64, activation='relu'),
+        Dropout(0.5),
+        Dense(1, activation='sigmoid')
+    ])
+
+    model.compile(loss='binary_crossentropy',
+                  optimizer='adam',
+                  metrics=['accuracy'])
+    return model
 
 # Build and train model
 def build_and_train_model():
@@ -70,32 +106,29 @@ def build_and_train_model():
     )
 
     # Build model
-    embedding_dim = 128
     vocab_size = len(tokenizer.word_index) + 1
+    model = build_model(vocab_size)
 
-    model = Sequential([
-        Embedding(vocab_size, embedding_dim),
-        Bidirectional(LSTM(64, return_sequences=True)),
-        Bidirectional(LSTM(32)),
-        Dense(64, activation='relu'),
-        Dropout(0.5),
-        Dense(1, activation='sigmoid')
-    ])
-
-    model.compile(loss='binary_crossentropy',
-                  optimizer='adam',
-                  metrics=['accuracy'])
+    # Batch texts of similar length together so short ones skip the padding
+    boundaries = bucket_boundaries(X_train.shape[1])
+    train_dataset = bucket_dataset(
+        tf.data.Dataset.from_tensor_slices((X_train, y_train)).shuffle(len(X_train)),
+        boundaries, batch_size=32
+    ).prefetch(tf.data.AUTOTUNE)
+    test_dataset = bucket_dataset(
+        tf.data.Dataset.from_tensor_slices((X_test, y_test)), boundaries, batch_size=32
+    )
 
     # Train model
     history = model.fit(
-        X_train, y_train,
+        train_dataset,
         epochs=20,
-        validation_data=(X_test, y_test),
+        validation_data=test_dataset,
         verbose=1
     )
 
     # Evaluate model
-    loss, accuracy = model.evaluate(X_test, y_test)
+    loss, accuracy = model.evaluate(test_dataset)
     print(f"Test Accuracy: {accuracy:.4f}")
 
     # Save model
@@ -103,41 +136,448 @@ def build_and_train_model():
 
     return model, history
 
-# Function to use model for inference
-def validate_dream(dream_text):
-    # Load tokenizer
-    import pickle
-    with open('ai-models/dream-validator/tokenizer.pickle', 'rb') as handle:
-        tokenizer = pickle.load(handle)
+# Out-of-core training on sharded files of labelled dreams
+def read_labelled_shard(path, text_field='text', label_field='label'):
+    """Yield (text, label) from one JSONL or CSV shard without loading it whole"""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as handle:
+            for row in csv.DictReader(handle):
+                yield row[text_field], float(row[label_field])
+    else:
+        with open(path, encoding='utf-8') as handle:
+            for line in handle:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row[text_field], float(row[label_field])
+
+def in_validation_split(text, validation_percent):
+    # Stable hash of the text: the same dream always lands in the same split
+    # and duplicates never straddle train and validation
+    return zlib.crc32(text.encode('utf-8')) % 100 < validation_percent
+
+def fit_tokenizer_streaming(shard_paths, max_words=10000):
+    """Fit the vocabulary in one pass over the shards; memory grows with the vocabulary only"""
+    tokenizer = Tokenizer(num_words=max_words, oov_token="<OOV>")
+    tokenizer.fit_on_texts(text for path in shard_paths for text, _ in read_labelled_shard(path))
+    return tokenizer
+
+def make_shard_dataset(shard_paths, tokenizer, validation, validation_percent=20,
+                       max_sequence_length=100, batch_size=64, chunk_size=1024,
+                       shuffle_buffer=10000, parallel_shards=4):
+    """
+    Stream one split of the shards as a prefetching tf.data pipeline
+
+    Shards are read in parallel, each tokenized chunk_size rows at a time
+    with the compact tokenizer; examples are shuffled within a bounded
+    buffer, batched by length bucket and prefetched so tokenization
+    overlaps training.
+    """
+    def generate(path):
+        path = path.decode('utf-8') if isinstance(path, bytes) else path
+        texts, labels = [], []
+        for text, label in read_labelled_shard(path):
+            if in_validation_split(text, validation_percent) != validation:
+                continue
+            texts.append(text)
+            labels.append(label)
+            if len(texts) == chunk_size:
+                yield tokenizer.texts_to_padded(texts, max_sequence_length), np.asarray(labels, np.float32)
+                texts, labels = [], []
+        if texts:
+            yield tokenizer.texts_to_padded(texts, max_sequence_length), np.asarray(labels, np.float32)
+
+    signature = (tf.TensorSpec(shape=(None, max_sequence_length), dtype=tf.int32),
+                 tf.TensorSpec(shape=(None,), dtype=tf.float32))
+
+    dataset = tf.data.Dataset.from_tensor_slices(list(shard_paths))
+    if not validation:
+        dataset = dataset.shuffle(len(shard_paths))
+    dataset = dataset.interleave(
+        lambda path: tf.data.Dataset.from_generator(generate, output_signature=signature, args=(path,)),
+        cycle_length=parallel_shards,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=validation
+    ).unbatch()
+
+    if not validation:
+        dataset = dataset.shuffle(shuffle_buffer)
+    dataset = bucket_dataset(dataset, bucket_boundaries(max_sequence_length), batch_size)
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def train_streaming(shard_pattern, epochs=20, batch_size=64, validation_percent=20,
+                    max_words=10000, max_sequence_length=100, shuffle_buffer=10000):
+    """
+    Train the validator on sharded JSONL/CSV files of {"text", "label"} rows
+
+    Nothing is held in memory beyond the vocabulary, the shuffle buffer
+    and a few prefetched batches, so the corpus can exceed RAM.
+    """
+    shard_paths = sorted(glob.glob(shard_pattern))
+    if not shard_paths:
+        raise ValueError(f"No training shards match {shard_pattern}")
+
+    print(f"Fitting vocabulary on {len(shard_paths)} shards...")
+    tokenizer = fit_tokenizer_streaming(shard_paths, max_words)
+    compact_tokenizer = save_tokenizer(tokenizer)
+
+    def split(validation):
+        return make_shard_dataset(shard_paths, compact_tokenizer, validation, validation_percent,
+                                  max_sequence_length, batch_size, shuffle_buffer=shuffle_buffer)
+
+    train_dataset = split(False)
+    validation_dataset = split(True)
+
+    # Embedding rows beyond num_words would never be used
+    vocab_size = min(len(tokenizer.word_index) + 1, max_words)
+    model = build_model(vocab_size)
+
+    history = model.fit(train_dataset, epochs=epochs, validation_data=validation_dataset, verbose=1)
+
+    loss, accuracy = model.evaluate(validation_dataset)
+    print(f"Validation Accuracy: {accuracy:.4f}")
+
+    model.save('ai-models/dream-validator/dream_validator_model.h5')
+
+    return model, history
+
+class _ServingState:
+    """Everything a request needs from one load, published as a unit"""
+
+    __slots__ = ('tokenizer', 'model', 'tflite_model', 'bucketed', 'boundaries', 'serving_fns')
 
-    # Load model
-    model = tf.keras.models.load_model('ai-models/dream-validator/dream_validator_model.h5')
+    def __init__(self, tokenizer, model, tflite_model, bucketed, boundaries):
+        self.tokenizer = tokenizer
+        self.model = model
+        self.tflite_model = tflite_model
+        self.bucketed = bucketed
+        self.boundaries = boundaries
+        # Sequence length -> compiled serving function
+        self.serving_fns = {}
 
-    # Preprocess input
-    sequence = tokenizer.texts_to_sequences([dream_text])
-    padded = pad_sequences(sequence, maxlen=100, padding='post')
+class DreamValidator:
+    """Resident dream validator that loads the model and tokenizer once"""
 
-    # Make prediction
-    prediction = model.predict(padded)[0][0]
+    def __init__(self,
+                 model_path='ai-models/dream-validator/dream_validator_model.h5',
+                 tokenizer_path='ai-models/dream-validator/tokenizer.pickle',
+                 vocab_path='ai-models/dream-validator/tokenizer.vocab',
+                 max_sequence_length=100,
+                 threshold=0.7,
+                 inference_mode='compiled',
+                 jit_compile=False,
+                 tflite_path=None,
+                 length_buckets=DEFAULT_BUCKETS):
+        self.model_path = model_path
+        self.tokenizer_path = tokenizer_path
+        self.vocab_path = vocab_path
+        self.max_sequence_length = max_sequence_length
+        self.threshold = threshold
 
-    # Return result
-    authenticity_score = float(prediction)
-    is_authentic = authenticity_score > 0.7
+        # 'compiled' serves through a fixed-signature tf.function,
+        # 'predict' through Keras Model.predict and 'tflite' through an
+        # exported (optionally quantized) TFLite model at tflite_path
+        if inference_mode not in ('compiled', 'predict', 'tflite'):
+            raise ValueError(f"Unknown inference mode: {inference_mode}")
+        if inference_mode == 'tflite' and not tflite_path:
+            raise ValueError("inference_mode='tflite' needs a tflite_path")
+        self.inference_mode = inference_mode
+        self.jit_compile = jit_compile
+        self.tflite_path = tflite_path
 
-    return {
-        'is_authentic': is_authentic,
-        'authenticity_score': authenticity_score,
-        'dream_text': dream_text
-    }
+        # Texts are run at the shortest of these lengths that fits them when
+        # the model masks padding (TFLite models keep the full length)
+        self.length_buckets = length_buckets
+
+        # The loaded tokenizer, model and buckets. A request reads this once
+        # and uses that state throughout, so a reload that swaps it in never
+        # mixes an old tokenizer with a new model
+        self._state = None
+        self._load_lock = threading.RLock()
+
+        # Optional Instrumentation from ai-models/instrumentation.py
+        self.metrics = None
+
+        # Modification times of the loaded files, used by reload_if_changed
+        self._loaded_mtimes = None
+
+        # Latency measurements (seconds)
+        self.stats = {
+            'load_seconds': None,
+            'warmup_seconds': None,
+            'cold_start_seconds': None,
+            'last_call_seconds': None,
+            'calls': 0
+        }
+
+    def _file_mtimes(self):
+        # The TFLite backend serves from tflite_path and never reads model_path
+        model_path = self.tflite_path if self.inference_mode == 'tflite' else self.model_path
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                     for path in (model_path, self.tokenizer_path, self.vocab_path))
+
+    @property
+    def loaded(self):
+        return self._state is not None
+
+    @property
+    def tokenizer(self):
+        return self._state.tokenizer if self._state is not None else None
+
+    @property
+    def model(self):
+        return self._keras_model() if self._state is not None else None
+
+    @property
+    def bucketed(self):
+        return self._state is not None and self._state.bucketed
+
+    def load(self, warmup=True):
+        """
+        Load the tokenizer and model from disk and optionally warm them up
+
+        The new state is built and warmed up before it replaces the current
+        one, so requests keep being served from the old model meanwhile.
+        """
+        with self._load_lock:
+            start = time.perf_counter()
+            state = self._load_state()
+            self.stats['load_seconds'] = time.perf_counter() - start
+            self.stats['warmup_seconds'] = None
+            if warmup:
+                self._warmup(state)
+            self._state = state
+            self._loaded_mtimes = self._file_mtimes()
+            self.stats['cold_start_seconds'] = time.perf_counter() - start
+
+        return self
+
+    def _ensure_loaded(self):
+        state = self._state
+        if state is None:
+            with self._load_lock:
+                if self._state is None:
+                    self.load()
+                state = self._state
+        return state
+
+    def _load_state(self):
+        # Load the compact tokenizer (converted from the pickle on first use)
+        tokenizer = load_tokenizer(self.vocab_path, self.tokenizer_path)
+
+        # Load model. The TFLite backend serves from the flatbuffer alone, so
+        # the float32 Keras model is not kept in memory next to it
+        model = None
+        tflite_model = None
+        if self.inference_mode == 'tflite':
+            from quantization import TFLiteModel
+            tflite_model = TFLiteModel(self.tflite_path)
+            # Variable-length exports (-1) accept any length
+            exported_length = tflite_model.input_signature[1]
+            if exported_length != -1 and exported_length != self.max_sequence_length:
+                raise ValueError(f"{self.tflite_path} takes {exported_length} tokens, "
+                                 f"not max_sequence_length={self.max_sequence_length}")
+        else:
+            model = tf.keras.models.load_model(self.model_path)
+
+        # TFLite models run at the full exported length
+        bucketed = bool(self.length_buckets) and model is not None and any(
+            getattr(layer, 'mask_zero', False) for layer in model.layers
+        )
+        boundaries = (bucket_boundaries(self.max_sequence_length, self.length_buckets)
+                      if bucketed else [self.max_sequence_length])
+        return _ServingState(tokenizer, model, tflite_model, bucketed, boundaries)
+
+    def warmup(self):
+        """Run one dummy prediction per bucket so the first real request doesn't build a graph"""
+        self._warmup(self._ensure_loaded())
+
+    def _warmup(self, state):
+        start = time.perf_counter()
+        for length in state.boundaries:
+            self._predict_padded(np.ones((1, length), dtype='int32'), state=state)
+        self.stats['warmup_seconds'] = time.perf_counter() - start
+
+    def _keras_model(self, state=None):
+        """The float32 Keras model, loaded on first use when serving TFLite"""
+        state = state or self._ensure_loaded()
+        if state.model is None:
+            with self._load_lock:
+                if state.model is None:
+                    state.model = tf.keras.models.load_model(self.model_path)
+        return state.model
+
+    def _build_serving_fn(self, model, length=None):
+        """Trace the model once into a concrete function with a fixed sequence length"""
+
+        @tf.function(
+            input_signature=[tf.TensorSpec([None, length or self.max_sequence_length], tf.int32)],
+            jit_compile=self.jit_compile
+        )
+        def serve(tokens):
+            return model(tokens, training=False)
+
+        return serve.get_concrete_function()
+
+    def _serving_fn(self, length, state=None):
+        state = state or self._ensure_loaded()
+        serving_fn = state.serving_fns.get(length)
+        if serving_fn is None:
+            serving_fn = state.serving_fns[length] = self._build_serving_fn(self._keras_model(state), length)
+        return serving_fn
+
+    def _predict(self, padded, inference_mode=None, state=None):
+        """Authenticity scores for a padded int batch, shape (n,)"""
+        inference_mode = inference_mode or self.inference_mode
+        state = state or self._ensure_loaded()
+        if state.bucketed and inference_mode != 'tflite':
+            return run_bucketed(padded, state.boundaries,
+                                lambda batch: self._predict_padded(batch, inference_mode, state))
+        return self._predict_padded(padded, inference_mode, state)
+
+    def _predict_padded(self, padded, inference_mode=None, state=None):
+        inference_mode = inference_mode or self.inference_mode
+        state = state or self._ensure_loaded()
+        if inference_mode == 'tflite':
+            return state.tflite_model(padded)[:, 0]
+        if inference_mode == 'compiled':
+            serving_fn = self._serving_fn(padded.shape[1], state)
+            return serving_fn(tf.constant(padded, dtype=tf.int32)).numpy()[:, 0]
+        return self._keras_model(state).predict(padded, batch_size=len(padded), verbose=0)[:, 0]
+
+    def export_saved_model(self, export_dir):
+        """Export the validator as a SavedModel with a fixed serving signature"""
+        state = self._ensure_loaded()
+        tf.saved_model.save(self._keras_model(state), export_dir,
+                            signatures={'serving_default': self._serving_fn(self.max_sequence_length, state)})
+
+    def measure_latency(self, dream_text, runs=50):
+        """Median per-call latency (ms) of the compiled and Model.predict paths"""
+        state = self._ensure_loaded()
+
+        padded = state.tokenizer.texts_to_padded([dream_text], self.max_sequence_length)
+
+        report = {}
+        for mode in ('predict', 'compiled'):
+            self._predict(padded, mode, state)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                self._predict(padded, mode, state)
+                timings.append(time.perf_counter() - start)
+            report[f'{mode}_ms'] = sorted(timings)[len(timings) // 2] * 1000
+        report['speedup'] = report['predict_ms'] / report['compiled_ms']
+        return report
+
+    def reload(self, warmup=True):
+        """Reload the model and tokenizer, e.g. after retraining
+
+        Requests keep using the current model until the new one is ready.
+        """
+        return self.load(warmup=warmup)
+
+    def reload_if_changed(self, warmup=True):
+        """Reload only if the model or tokenizer file changed on disk
+
+        Returns:
+            bool: True if the files were reloaded
+        """
+        with self._load_lock:
+            if self.loaded and self._file_mtimes() == self._loaded_mtimes:
+                return False
+            self.reload(warmup=warmup)
+        return True
+
+    def _result(self, dream_text, prediction):
+        authenticity_score = float(prediction)
+        return {
+            'is_authentic': authenticity_score > self.threshold,
+            'authenticity_score': authenticity_score,
+            'dream_text': dream_text
+        }
+
+    def _stage(self, stage):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.stage('validate', stage)
+
+    def validate(self, dream_text):
+        """Score a single dream description"""
+        return self.validate_batch([dream_text])[0]
+
+    def validate_batch(self, dream_texts):
+        """Score many dream descriptions with a single forward pass
+
+        Args:
+            dream_texts (list): Dream description strings
+
+        Returns:
+            list: One result dict per text, in input order
+        """
+        # One state for the whole call, even if a reload swaps it meanwhile
+        state = self._ensure_loaded()
+
+        dream_texts = list(dream_texts)
+        if not dream_texts:
+            return []
+
+        start = time.perf_counter()
+
+        # Preprocess input
+        with self._stage('tokenize'):
+            padded = state.tokenizer.texts_to_padded(dream_texts, self.max_sequence_length)
+
+        # Make prediction
+        with self._stage('model'):
+            predictions = self._predict(padded, state=state)
+
+        results = [self._result(text, prediction)
+                   for text, prediction in zip(dream_texts, predictions)]
+
+        self.stats['last_call_seconds'] = time.perf_counter() - start
+        self.stats['calls'] += 1
+
+        return results
+
+# Shared validator used by validate_dream
+_default_validator = None
+
+def get_validator():
+    """Return the process-wide validator, loading it on first use"""
+    global _default_validator
+    if _default_validator is None:
+        _default_validator = DreamValidator().load()
+    return _default_validator
+
+# Function to use model for inference
+def validate_dream(dream_text):
+    return get_validator().validate(dream_text)
 
 if __name__ == "__main__":
     print("Starting Dream Validator Model Training...")
-    model, history = build_and_train_model()
+    if len(sys.argv) > 1:
+        # e.g. python ai-models/dream-validator/model.py 'data/labelled-dreams-*.jsonl'
+        model, history = train_streaming(sys.argv[1])
+    else:
+        model, history = build_and_train_model()
     print("Training completed and model saved!")
 
     # Test with a sample dream
     test_dream = "I was flying over a beautiful ocean, and suddenly my arms turned into wings."
-    result = validate_dream(test_dream)
+    validator = get_validator()
+    result = validator.validate(test_dream)
     print(f"Test Dream: {test_dream}")
     print(f"Authenticity: {result['authenticity_score']:.2f}")
-    print(f"Is Authentic: {result['is_authentic']}")
\ No newline at end of file
+    print(f"Is Authentic: {result['is_authentic']}")
+
+    # Report cold-start vs warm-path latency
+    warm_times = []
+    for _ in range(20):
+        validator.validate(test_dream)
+        warm_times.append(validator.stats['last_call_seconds'])
+    print(f"Cold start (load + warmup): {validator.stats['cold_start_seconds'] * 1000:.1f} ms")
+    print(f"Warm call (median of 20): {sorted(warm_times)[len(warm_times) // 2] * 1000:.1f} ms")
+
+    # Compare the compiled serving function against Model.predict
+    latency = validator.measure_latency(test_dream)
+    print(f"Model.predict: {latency['predict_ms']:.2f} ms/call, "
+          f"compiled: {latency['compiled_ms']:.2f} ms/call ({latency['speedup']:.1f}x)")
\ No newline at end of file
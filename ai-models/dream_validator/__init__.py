@@ -0,0 +1,10 @@
+# ai-models/dream_validator/__init__.py
+"""
+Importable name for ai-models/dream-validator.
+
+The model directory's name has a hyphen, so `dream_validator.model`
+resolves to dream-validator/model.py through this package's path.
+"""
+import os
+
+__path__ = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dream-validator')]
@@ -2,17 +2,47 @@
 import tensorflow as tf
 from tensorflow.keras import layers
 import numpy as np
-import matplotlib.pyplot as plt
 from tensorflow.keras.preprocessing.text import Tokenizer
-from tensorflow.keras.preprocessing.sequence import pad_sequences
+from PIL import Image
+import base64
+import io
 import time
 import os
+import sys
+import uuid
+from contextlib import nullcontext
+
+# Add parent directory to path for the shared ai-models helpers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vocab import CompactTokenizer, load_tokenizer
+from length_buckets import DEFAULT_BUCKETS, bucket_boundaries, bucket_dataset, run_bucketed
+from training_writer import BackgroundWriter
+from pair_dataset import PairDataset, normalize_images
+
+MODEL_DIR = 'ai-models/image-generator'
+SAMPLE_DIR = 'ai-models/image-generator/samples'
+CHECKPOINT_DIR = 'ai-models/image-generator/checkpoints'
+
+# Dream descriptions rendered in the training previews
+SAMPLE_TEXTS = [
+    "I was flying over a beautiful landscape",
+    "My teeth were falling out one by one",
+    "I was running but couldn't move forward",
+    "I was back in my childhood home",
+    "I could breathe underwater like a fish",
+    "I was trapped in a maze with no exit",
+    "I had a conversation with a deceased relative",
+    "I was performing on stage in front of thousands",
+    "I discovered a hidden room in my house"
+]
 
 # This is a simplified implementation of a text-to-image generator
 # In a production environment, you would use more advanced models like DALL-E or Stable Diffusion
 
 class DreamImageGenerator:
-    def __init__(self):
+    def __init__(self, inference_mode='compiled', jit_compile=False, tflite_paths=None,
+                 length_buckets=DEFAULT_BUCKETS, build_models=True):
         self.latent_dim = 128
         self.text_embedding_dim = 256
         self.image_size = 64
@@ -22,25 +52,128 @@ class DreamImageGenerator:
         self.tokenizer = None
         self.vocab_size = 10000
 
+        # The text encoder masks padding, so texts are encoded at the
+        # shortest of these lengths that fits them (TFLite keeps the full length)
+        self.length_buckets = length_buckets
+
+        # Identifies the weights for result caching; freshly initialized
+        # weights are random, so they get a version unique to this instance
+        self.model_version = f'untrained-{uuid.uuid4().hex}'
+
+        # Scale of the seeded latent noise used for image variations
+        self.seed_noise_scale = 0.1
+
+        # 'compiled' serves through fixed-signature tf.functions,
+        # 'predict' through Keras Model.predict and 'tflite' through exported
+        # (optionally quantized) TFLite models given as
+        # tflite_paths=(text_encoder_path, generator_path)
+        if inference_mode not in ('compiled', 'predict', 'tflite'):
+            raise ValueError(f"Unknown inference mode: {inference_mode}")
+        if inference_mode == 'tflite' and not tflite_paths:
+            raise ValueError("inference_mode='tflite' needs tflite_paths")
+        self.inference_mode = inference_mode
+        self.jit_compile = jit_compile
+        self.tflite_paths = tflite_paths
+        # Sequence length -> compiled text encoder function
+        self._encode_fns = {}
+        self._generate_fn = None
+        self._tflite_encoder = None
+        self._tflite_generator = None
+        if inference_mode == 'tflite':
+            from quantization import TFLiteModel
+            self._tflite_encoder = TFLiteModel(tflite_paths[0])
+            self._tflite_generator = TFLiteModel(tflite_paths[1])
+            self.model_version = 'tflite-' + '-'.join(
+                f'{os.path.basename(path)}:{os.path.getmtime(path):.0f}' for path in tflite_paths
+            )
+
+        # Optional Instrumentation from ai-models/instrumentation.py
+        self.metrics = None
+
         # Models
         self.text_encoder = None
         self.generator = None
         self.discriminator = None
         self.gan = None
 
-        # Build models
+        # Graph training state, created on first train_graph call
+        self._train_step = None
+        self.d_optimizer = None
+        self.g_optimizer = None
+
+        # Checkpointed training progress (epochs completed) and the
+        # generator copy that renders previews on the background writer
+        self._epoch = None
+        # Cleared if this TensorFlow cannot write checkpoints asynchronously
+        self._async_checkpoint = True
+        self._sample_generator = None
+        self._sample_latents = None
+
+        # Build models (for_inference skips this and loads only what serving needs)
+        self.inference_only = not build_models
+        if build_models:
+            self._build_text_encoder()
+            self._build_generator()
+            self._build_discriminator()
+            self._build_gan()
+
+    @classmethod
+    def for_inference(cls, model_dir=MODEL_DIR, **kwargs):
+        """
+        Serving-only generator that never builds the discriminator, GAN or optimizers
+
+        The text encoder and generator are loaded from model_dir without
+        their training configuration; TFLite mode loads no Keras model at
+        all. If no trained weights exist yet, fresh encoder and generator
+        weights are used as before.
+        """
+        generator = cls(build_models=False, **kwargs)
+        if generator.inference_mode != 'tflite':
+            generator.load_models(model_dir)
+        return generator
+
+    def load_models(self, model_dir=MODEL_DIR):
+        """Load the saved text encoder and generator for inference
+
+        The architectures are rebuilt and only the weights are read from the
+        h5 files, since Keras 3 cannot deserialize the masked text encoder.
+        """
+        paths = [os.path.join(model_dir, 'text_encoder.h5'), os.path.join(model_dir, 'generator.h5')]
         self._build_text_encoder()
         self._build_generator()
-        self._build_discriminator()
-        self._build_gan()
+        if all(os.path.exists(path) for path in paths):
+            self.text_encoder.load_weights(paths[0])
+            self.generator.load_weights(paths[1])
+            self.model_version = 'keras-' + '-'.join(
+                f'{os.path.basename(path)}:{os.path.getmtime(path):.0f}' for path in paths
+            )
+        else:
+            print(f"No trained image generator in {model_dir}; using untrained weights")
+
+        self._encode_fns = {}
+        self._generate_fn = None
+
+    def warmup(self):
+        """Trace every serving path once so the first request doesn't build a graph"""
+        if self.inference_mode != 'tflite':
+            for length in self._bucket_boundaries():
+                self._encode_padded(np.ones((1, length), dtype='int32'), self.inference_mode)
+        self._generate(self._encode(np.ones((1, self.max_text_length), dtype='int32')))
+
+    def _require_training_models(self):
+        if self.inference_only:
+            raise RuntimeError("This DreamImageGenerator was created for inference only; "
+                               "construct DreamImageGenerator() to train")
 
     def _build_text_encoder(self):
         """Build model to encode text descriptions"""
-        input_text = layers.Input(shape=(self.max_text_length,))
+        # Variable length input; padding is masked so shorter buckets give the same result
+        input_text = layers.Input(shape=(None,))
 
         embedding = layers.Embedding(
             input_dim=self.vocab_size,
-            output_dim=self.text_embedding_dim
+            output_dim=self.text_embedding_dim,
+            mask_zero=True
         )(input_text)
 
         lstm = layers.Bidirectional(
@@ -122,31 +255,50 @@ class DreamImageGenerator:
         self.gan = tf.keras.Model([latent_input, text_input], validity, name='gan')
         self.gan.compile(loss='binary_crossentropy', optimizer=tf.keras.optimizers.Adam())
 
-    def train(self, dream_texts, dream_images, epochs=1000, batch_size=32):
-        """Train the model on dream texts and corresponding images"""
+    def _fit_tokenizer(self, dream_texts):
+        """Fit and save the tokenizer, returning the padded training sequences"""
         # Initialize tokenizer
-        self.tokenizer = Tokenizer(num_words=self.vocab_size, oov_token="<OOV>")
-        self.tokenizer.fit_on_texts(dream_texts)
+        tokenizer = Tokenizer(num_words=self.vocab_size, oov_token="<OOV>")
+        tokenizer.fit_on_texts(dream_texts)
 
         # Save tokenizer
         import pickle
         with open('ai-models/image-generator/tokenizer.pickle', 'wb') as handle:
-            pickle.dump(self.tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(tokenizer, handle, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Compact copy holding only the words the model can see
+        self.tokenizer = CompactTokenizer.from_keras(tokenizer)
+        self.tokenizer.save('ai-models/image-generator/tokenizer.vocab')
 
         # Process text
-        sequences = self.tokenizer.texts_to_sequences(dream_texts)
-        padded_texts = pad_sequences(sequences, maxlen=self.max_text_length, padding='post')
+        return self.tokenizer.texts_to_padded(dream_texts, self.max_text_length)
+
+    def save_models(self):
+        """Save the trained models"""
+        self.text_encoder.save('ai-models/image-generator/text_encoder.h5')
+        self.generator.save('ai-models/image-generator/generator.h5')
+        self.discriminator.save('ai-models/image-generator/discriminator.h5')
 
-        # Normalize images
-        normalized_images = (dream_images / 127.5) - 1.0
+    def train(self, dream_texts, dream_images, epochs=1000, batch_size=32,
+              checkpoint_interval=100, checkpoint_dir=CHECKPOINT_DIR, resume=True):
+        """Train the model on dream texts and corresponding images"""
+        self._require_training_models()
+        padded_texts = self._fit_tokenizer(dream_texts)
 
         # Create directory for saving samples
-        os.makedirs('ai-models/image-generator/samples', exist_ok=True)
+        os.makedirs(SAMPLE_DIR, exist_ok=True)
+
+        checkpoint, manager = self._training_checkpoint(
+            checkpoint_dir, gan_optimizer=self.gan.optimizer,
+            discriminator_optimizer=self.discriminator.optimizer
+        )
+        start_epoch = self._restore_checkpoint(checkpoint, manager) if resume else 0
+        writer = BackgroundWriter()
 
         valid = np.ones((batch_size, 1))
         fake = np.zeros((batch_size, 1))
 
-        for epoch in range(epochs):
+        for epoch in range(start_epoch, epochs):
             # ---------------------
             #  Train Discriminator
             # ---------------------
@@ -154,7 +306,8 @@ class DreamImageGenerator:
             # Select a random batch of dream descriptions
             idx = np.random.randint(0, padded_texts.shape[0], batch_size)
             texts = padded_texts[idx]
-            images = normalized_images[idx]
+            # Normalize only the batch, in float32
+            images = normalize_images(np.asarray(dream_images[idx]))
 
             # Encode text descriptions
             encoded_texts = self.text_encoder.predict(texts)
@@ -180,84 +333,539 @@ class DreamImageGenerator:
             # Print progress
             if epoch % 100 == 0:
                 print(f"{epoch} [D loss: {d_loss}] [G loss: {g_loss}]")
-                self.save_samples(epoch)
+                self.queue_samples(writer, epoch)
+
+            if checkpoint_interval and (epoch + 1) % checkpoint_interval == 0:
+                self._save_checkpoint(manager, epoch + 1)
+
+        self._finish_background_work(writer, checkpoint)
 
         # Save models after training
-        self.text_encoder.save('ai-models/image-generator/text_encoder.h5')
-        self.generator.save('ai-models/image-generator/generator.h5')
-        self.discriminator.save('ai-models/image-generator/discriminator.h5')
+        self.save_models()
+
+    def _build_train_step(self, learning_rate=2e-4):
+        """Compile one discriminator + generator update into a single graph"""
+        # The discriminator was frozen for the Keras GAN model; the graph
+        # step computes its own gradients, so it needs the variables back
+        self.discriminator.trainable = True
+
+        self.d_optimizer = tf.keras.optimizers.Adam(learning_rate, beta_1=0.5)
+        self.g_optimizer = tf.keras.optimizers.Adam(learning_rate, beta_1=0.5)
+        cross_entropy = tf.keras.losses.BinaryCrossentropy(from_logits=True)
+
+        text_encoder = self.text_encoder
+        generator = self.generator
+        discriminator = self.discriminator
+        d_optimizer = self.d_optimizer
+        g_optimizer = self.g_optimizer
+        latent_dim = self.latent_dim
+
+        # Token length varies with the bucket; one trace covers them all
+        @tf.function(input_signature=[
+            tf.TensorSpec([None, None], tf.int32),
+            tf.TensorSpec([None, self.image_size, self.image_size, 3], tf.float32)
+        ])
+        def train_step(texts, images):
+            batch_size = tf.shape(texts)[0]
+
+            # Encode text descriptions
+            encoded_texts = text_encoder(texts, training=False)
+
+            # Sample noise for generator input
+            noise = tf.random.normal([batch_size, latent_dim])
+
+            with tf.GradientTape() as d_tape, tf.GradientTape() as g_tape:
+                gen_images = generator(noise, training=True)
+                real_logits = discriminator([images, encoded_texts], training=True)
+                fake_logits = discriminator([gen_images, encoded_texts], training=True)
+
+                d_loss = 0.5 * (cross_entropy(tf.ones_like(real_logits), real_logits) +
+                                cross_entropy(tf.zeros_like(fake_logits), fake_logits))
+                g_loss = cross_entropy(tf.ones_like(fake_logits), fake_logits)
+
+            d_gradients = d_tape.gradient(d_loss, discriminator.trainable_variables)
+            g_gradients = g_tape.gradient(g_loss, generator.trainable_variables)
+            d_optimizer.apply_gradients(zip(d_gradients, discriminator.trainable_variables))
+            g_optimizer.apply_gradients(zip(g_gradients, generator.trainable_variables))
+
+            return d_loss, g_loss
+
+        self._train_step = train_step
+
+    def make_dataset(self, padded_texts, dream_images, batch_size=32, shuffle_buffer=10000):
+        """Shuffled, length-bucketed and prefetched tf.data pipeline of (tokens, images)
+
+        Texts are batched with others of similar length and padded only to
+        the longest in the batch. Images are normalized to [-1, 1] in
+        float32 per batch, so no normalized copy of the whole image array
+        is ever made.
+        """
+        dataset = tf.data.Dataset.from_tensor_slices((padded_texts, dream_images))
+        dataset = dataset.shuffle(min(shuffle_buffer, len(padded_texts)), reshuffle_each_iteration=True)
+        return self._batch_pairs(dataset, batch_size)
+
+    def make_pair_dataset(self, pairs, batch_size=32, chunk_size=1024, shuffle_buffer=10000):
+        """The make_dataset pipeline over a memory-mapped PairDataset
+
+        Shards are read a block of rows at a time in random order and mixed
+        in a bounded shuffle buffer, so memory use does not depend on the
+        dataset size. Images stay uint8 until their batch is normalized.
+        """
+        dataset = tf.data.Dataset.from_generator(
+            lambda: pairs.iter_chunks(chunk_size),
+            output_signature=(
+                tf.TensorSpec([None, pairs.max_length], tf.int32),
+                tf.TensorSpec([None, pairs.image_size, pairs.image_size, 3], tf.uint8)
+            )
+        )
+        dataset = dataset.unbatch().shuffle(min(shuffle_buffer, len(pairs)), reshuffle_each_iteration=True)
+        return self._batch_pairs(dataset, batch_size)
+
+    def _batch_pairs(self, dataset, batch_size):
+        # Remainders are kept: with several length buckets, dropping each
+        # bucket's partial batch can leave an epoch with no batches at all
+        dataset = bucket_dataset(dataset, self._bucket_boundaries(), batch_size, drop_remainder=False)
+        dataset = dataset.map(
+            lambda texts, images: (tf.cast(texts, tf.int32),
+                                   tf.cast(images, tf.float32) / 127.5 - 1.0),
+            num_parallel_calls=tf.data.AUTOTUNE
+        )
+        return dataset.prefetch(tf.data.AUTOTUNE)
+
+    def train_graph(self, dream_texts, dream_images, epochs=10, batch_size=32,
+                    sample_interval=1, learning_rate=2e-4, checkpoint_interval=1,
+                    checkpoint_dir=CHECKPOINT_DIR, resume=True):
+        """Train with a tf.data pipeline and a single compiled train step
+
+        Unlike train(), an epoch here is a full pass over the dataset.
+        Preview images are rendered on a background thread and checkpoints
+        (weights, optimizer state and epoch) are written every
+        checkpoint_interval epochs; with resume, training continues from
+        the latest checkpoint in checkpoint_dir.
+
+        Returns:
+            list: Per-epoch dicts with losses and samples/sec
+        """
+        self._require_training_models()
+        if len(dream_texts) < batch_size:
+            raise ValueError("Need at least one full batch of training samples")
+
+        padded_texts = self._fit_tokenizer(dream_texts)
+        dataset = self.make_dataset(padded_texts, dream_images, batch_size)
+
+        return self._train_loop(dataset, epochs, sample_interval, learning_rate,
+                                checkpoint_interval, checkpoint_dir, resume)
+
+    def train_from_dataset(self, dataset_dir, epochs=10, batch_size=32, **kwargs):
+        """train_graph over a dataset built by pair_dataset.py
+
+        The dataset's vocabulary becomes the model's tokenizer, so nothing
+        is tokenized again; keyword arguments are as for train_graph.
+        """
+        self._require_training_models()
+        pairs = PairDataset(dataset_dir)
+        if pairs.image_size != self.image_size or pairs.max_length != self.max_text_length:
+            raise ValueError(f"{dataset_dir} holds {pairs.image_size}px images and {pairs.max_length} "
+                             f"tokens; the model needs {self.image_size} and {self.max_text_length}")
+        if (pairs.tokenizer.num_words or len(pairs.tokenizer.words) + 1) > self.vocab_size:
+            raise ValueError(f"{dataset_dir} was tokenized with more than {self.vocab_size} words")
+        if len(pairs) < batch_size:
+            raise ValueError("Need at least one full batch of training samples")
+
+        # Serving must tokenize with the vocabulary the model was trained on
+        self.tokenizer = pairs.tokenizer
+        self.tokenizer.save('ai-models/image-generator/tokenizer.vocab')
+
+        dataset = self.make_pair_dataset(pairs, batch_size)
+        return self._train_loop(dataset, epochs, **kwargs)
+
+    def _train_loop(self, dataset, epochs, sample_interval=1, learning_rate=2e-4,
+                    checkpoint_interval=1, checkpoint_dir=CHECKPOINT_DIR, resume=True):
+        if self._train_step is None:
+            self._build_train_step(learning_rate)
+
+        # Create directory for saving samples
+        os.makedirs(SAMPLE_DIR, exist_ok=True)
+
+        checkpoint, manager = self._training_checkpoint(
+            checkpoint_dir, d_optimizer=self.d_optimizer, g_optimizer=self.g_optimizer
+        )
+        start_epoch = self._restore_checkpoint(checkpoint, manager) if resume else 0
+        writer = BackgroundWriter()
+
+        history = []
+        for epoch in range(start_epoch, epochs):
+            start = time.perf_counter()
+            steps = 0
+            samples = 0
+            for texts, images in dataset:
+                d_loss, g_loss = self._train_step(texts, images)
+                steps += 1
+                samples += int(texts.shape[0])
+            elapsed = time.perf_counter() - start
+            if not steps:
+                writer.close()
+                raise ValueError("The training dataset produced no batches")
+
+            stats = {
+                'epoch': epoch,
+                'd_loss': float(d_loss),
+                'g_loss': float(g_loss),
+                'samples_per_second': samples / elapsed if elapsed else 0.0
+            }
+            history.append(stats)
+
+            # Print progress
+            print(f"{epoch} [D loss: {stats['d_loss']:.4f}] [G loss: {stats['g_loss']:.4f}] "
+                  f"[{stats['samples_per_second']:.1f} samples/sec]")
+            if sample_interval and epoch % sample_interval == 0:
+                self.queue_samples(writer, epoch)
+
+            if checkpoint_interval and (epoch + 1) % checkpoint_interval == 0:
+                self._save_checkpoint(manager, epoch + 1)
+
+        self._finish_background_work(writer, checkpoint)
+
+        # Save models after training
+        self.save_models()
+
+        return history
+
+    def _training_checkpoint(self, checkpoint_dir, **optimizers):
+        """Checkpoint of the models, the given optimizers and the epoch counter"""
+        if self._epoch is None:
+            self._epoch = tf.Variable(0, dtype=tf.int64, trainable=False, name='epoch')
+
+        # Uncompiled models have no optimizer to track
+        optimizers = {name: optimizer for name, optimizer in optimizers.items() if optimizer is not None}
+        checkpoint = tf.train.Checkpoint(
+            text_encoder=self.text_encoder,
+            generator=self.generator,
+            discriminator=self.discriminator,
+            epoch=self._epoch,
+            **optimizers
+        )
+        manager = tf.train.CheckpointManager(checkpoint, checkpoint_dir, max_to_keep=3)
+        return checkpoint, manager
+
+    def _restore_checkpoint(self, checkpoint, manager):
+        """Restore the latest checkpoint, returning the epoch to continue from"""
+        if manager.latest_checkpoint is None:
+            self._epoch.assign(0)
+            return 0
+
+        # Optimizer slots are created lazily, so their values are restored
+        # on the first train step
+        checkpoint.restore(manager.latest_checkpoint)
+        epoch = int(self._epoch.numpy())
+        print(f"Resuming from {manager.latest_checkpoint} at epoch {epoch}")
+        return epoch
+
+    def _save_checkpoint(self, manager, epochs_done):
+        self._epoch.assign(epochs_done)
+        if self._async_checkpoint:
+            try:
+                # The variables are copied to host memory here; the files are
+                # written on a TensorFlow thread while training continues
+                options = tf.train.CheckpointOptions(experimental_enable_async_checkpoint=True)
+                manager.save(checkpoint_number=epochs_done, options=options)
+                return
+            except (TypeError, ValueError) as e:
+                # Older TensorFlow has no async option, and Keras 3 variables
+                # cannot be copied by the async checkpointer
+                print(f"Asynchronous checkpoints unavailable ({type(e).__name__}), writing synchronously")
+                self._async_checkpoint = False
+        manager.save(checkpoint_number=epochs_done)
+
+    def _finish_background_work(self, writer, checkpoint):
+        """Wait for pending previews and asynchronous checkpoint writes"""
+        writer.close()
+        if hasattr(checkpoint, 'sync'):
+            checkpoint.sync()
+        if writer.stats['dropped']:
+            print(f"Skipped {writer.stats['dropped']} previews while the writer was busy")
+
+    def queue_samples(self, writer, epoch):
+        """Snapshot the generator weights and render previews from them on writer
+
+        The training thread only copies the weights; generating and drawing
+        the images happen on the writer's thread, against a separate copy of
+        the generator, so later train steps cannot change a preview midway.
+        A preview is skipped while the writer is still busy with earlier ones.
+        """
+        if not writer.has_room():
+            writer.stats['dropped'] += 1
+            return
+
+        if self._sample_generator is None:
+            self._sample_generator = tf.keras.models.clone_model(self.generator)
+        if self._sample_latents is None:
+            # The text encoder is not trained by the GAN, so the sample
+            # encodings stay valid for the whole run
+            padded_texts = self.tokenizer.texts_to_padded(SAMPLE_TEXTS, self.max_text_length)
+            self._sample_latents = self._encode(padded_texts)
+
+        writer.submit(self._render_snapshot, epoch, self.generator.get_weights(), optional=True)
+
+    def _render_snapshot(self, epoch, weights):
+        self._sample_generator.set_weights(weights)
+        gen_imgs = self._sample_generator(self._sample_latents, training=False).numpy()
+        render_samples(gen_imgs, SAMPLE_TEXTS, f"{SAMPLE_DIR}/dream_{epoch}.png")
 
     def save_samples(self, epoch):
-        """Save sample generated images during training"""
-        r, c = 3, 3
-        noise = np.random.normal(0, 1, (r * c, self.latent_dim))
-
-        # Sample random dream descriptions and encode them
-        sample_texts = [
-            "I was flying over a beautiful landscape",
-            "My teeth were falling out one by one",
-            "I was running but couldn't move forward",
-            "I was back in my childhood home",
-            "I could breathe underwater like a fish",
-            "I was trapped in a maze with no exit",
-            "I had a conversation with a deceased relative",
-            "I was performing on stage in front of thousands",
-            "I discovered a hidden room in my house"
-        ]
-
-        sequences = self.tokenizer.texts_to_sequences(sample_texts)
-        padded_texts = pad_sequences(sequences, maxlen=self.max_text_length, padding='post')
-        encoded_texts = self.text_encoder.predict(padded_texts)
-
-        gen_imgs = self.generator.predict(encoded_texts)
-
-        # Rescale images 0 - 1
-        gen_imgs = 0.5 * gen_imgs + 0.5
-
-        fig, axs = plt.subplots(r, c, figsize=(15, 15))
-        cnt = 0
-        for i in range(r):
-            for j in range(c):
-                axs[i, j].imshow(gen_imgs[cnt])
-                axs[i, j].set_title(sample_texts[cnt][:20] + "...")
-                axs[i, j].axis('off')
-                cnt += 1
-
-        fig.savefig(f"ai-models/image-generator/samples/dream_{epoch}.png")
-        plt.close()
-
-    def generate_dream_image(self, dream_text):
-        """Generate an image from a dream description"""
-        # Load models if not already loaded
+        """Save sample generated images now, on the calling thread"""
+        os.makedirs(SAMPLE_DIR, exist_ok=True)
+
+        padded_texts = self.tokenizer.texts_to_padded(SAMPLE_TEXTS, self.max_text_length)
+        encoded_texts = self._encode(padded_texts)
+
+        gen_imgs = self._generate(encoded_texts)
+
+        render_samples(gen_imgs, SAMPLE_TEXTS, f"{SAMPLE_DIR}/dream_{epoch}.png")
+
+    def _build_serving_fns(self):
+        """Trace the generator into a fixed-signature concrete function"""
+        generator = self.generator
+
+        @tf.function(
+            input_signature=[tf.TensorSpec([None, self.latent_dim], tf.float32)],
+            jit_compile=self.jit_compile
+        )
+        def generate_image(latents):
+            return generator(latents, training=False)
+
+        self._generate_fn = generate_image.get_concrete_function()
+
+    def _encode_fn(self, length):
+        """Text encoder traced for one sequence length, built on first use"""
+        encode_fn = self._encode_fns.get(length)
+        if encode_fn is None:
+            text_encoder = self.text_encoder
+
+            @tf.function(
+                input_signature=[tf.TensorSpec([None, length], tf.int32)],
+                jit_compile=self.jit_compile
+            )
+            def encode_text(tokens):
+                return text_encoder(tokens, training=False)
+
+            encode_fn = self._encode_fns[length] = encode_text.get_concrete_function()
+        return encode_fn
+
+    def _bucket_boundaries(self):
+        masked = any(getattr(layer, 'mask_zero', False) for layer in self.text_encoder.layers)
+        if not self.length_buckets or not masked:
+            return [self.max_text_length]
+        return bucket_boundaries(self.max_text_length, self.length_buckets)
+
+    def _encode(self, padded_texts, inference_mode=None):
+        """Encode a padded token batch into latent vectors"""
+        inference_mode = inference_mode or self.inference_mode
+        if inference_mode == 'tflite':
+            return self._tflite_encoder(padded_texts)
+        return run_bucketed(padded_texts, self._bucket_boundaries(),
+                            lambda batch: self._encode_padded(batch, inference_mode))
+
+    def _encode_padded(self, padded_texts, inference_mode):
+        if inference_mode == 'compiled':
+            encode_fn = self._encode_fn(padded_texts.shape[1])
+            return encode_fn(tf.constant(padded_texts, dtype=tf.int32)).numpy()
+        return self.text_encoder.predict(padded_texts, batch_size=len(padded_texts), verbose=0)
+
+    def _generate(self, latents, inference_mode=None):
+        """Generate images in [-1, 1] from a batch of latent vectors"""
+        inference_mode = inference_mode or self.inference_mode
+        if inference_mode == 'tflite':
+            return self._tflite_generator(latents)
+        if inference_mode == 'compiled':
+            if self._generate_fn is None:
+                self._build_serving_fns()
+            return self._generate_fn(tf.constant(latents, dtype=tf.float32)).numpy()
+        return self.generator.predict(latents, batch_size=len(latents), verbose=0)
+
+    def export_saved_model(self, export_dir):
+        """Export the encoder and generator as one SavedModel with fixed signatures"""
+        if self._generate_fn is None:
+            self._build_serving_fns()
+
+        module = tf.Module()
+        module.text_encoder = self.text_encoder
+        module.generator = self.generator
+        tf.saved_model.save(module, export_dir, signatures={
+            'encode_text': self._encode_fn(self.max_text_length),
+            'generate_image': self._generate_fn
+        })
+
+    def measure_latency(self, dream_text, runs=50):
+        """Median single-image latency (ms) of the compiled and Model.predict paths"""
+        self._load_tokenizer()
+        padded_text = self.tokenizer.texts_to_padded([dream_text], self.max_text_length)
+
+        report = {}
+        for mode in ('predict', 'compiled'):
+            self._generate(self._encode(padded_text, mode), mode)
+            timings = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                self._generate(self._encode(padded_text, mode), mode)
+                timings.append(time.perf_counter() - start)
+            report[f'{mode}_ms'] = sorted(timings)[len(timings) // 2] * 1000
+        report['speedup'] = report['predict_ms'] / report['compiled_ms']
+        return report
+
+    def _stage(self, stage):
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.stage('generate', stage)
+
+    def _load_tokenizer(self):
+        """Load the tokenizer saved by train() if not already loaded"""
         if self.tokenizer is None:
-            import pickle
-            with open('ai-models/image-generator/tokenizer.pickle', 'rb') as handle:
-                self.tokenizer = pickle.load(handle)
+            self.tokenizer = load_tokenizer('ai-models/image-generator/tokenizer.vocab',
+                                            'ai-models/image-generator/tokenizer.pickle')
+
+    def generate_dream_images(self, dream_texts, per_prompt=1, seeds=None, image_format=None):
+        """Generate several images in one batched encoder + generator pass
+
+        Args:
+            dream_texts (list): Dream descriptions
+            per_prompt (int): Number of images per description
+            seeds (list, optional): One seed (or None) per output image, ordered
+                prompt by prompt. Defaults to no noise for a prompt's first
+                image and seeds 1..per_prompt-1 for its variations.
+            image_format (str, optional): Also encode each image, e.g. 'PNG'
+
+        Returns:
+            dict: 'images' as a uint8 array of shape (n, size, size, 3), the
+                matching 'dream_texts' and 'seeds', and 'image_bytes' when
+                image_format is given
+        """
+        self._load_tokenizer()
+
+        dream_texts = list(dream_texts)
+        prompts = [text for text in dream_texts for _ in range(per_prompt)]
+        if seeds is None:
+            seeds = [None if i == 0 else i for _ in dream_texts for i in range(per_prompt)]
+        elif len(seeds) != len(prompts):
+            raise ValueError("seeds must have one entry per generated image")
+
+        if not prompts:
+            images = np.zeros((0, self.image_size, self.image_size, 3), dtype=np.uint8)
+        else:
+            # Process and encode each distinct prompt once
+            with self._stage('tokenize'):
+                padded_texts = self.tokenizer.texts_to_padded(dream_texts, self.max_text_length)
+            with self._stage('text_encoder'):
+                encoded_texts = self._encode(padded_texts)
+            latents = np.repeat(encoded_texts, per_prompt, axis=0)
+
+            # Seeded variations get reproducible latent noise
+            for i, seed in enumerate(seeds):
+                if seed is not None:
+                    noise = np.random.default_rng(seed).standard_normal(self.latent_dim)
+                    latents[i] += self.seed_noise_scale * noise
+
+            # Generate and rescale images
+            with self._stage('generator'):
+                generated_images = self._generate(latents)
+            with self._stage('postprocess'):
+                images = to_uint8_image(0.5 * generated_images + 0.5)
+
+        result = {
+            'images': images,
+            'dream_texts': prompts,
+            'seeds': seeds
+        }
+        if image_format:
+            with self._stage('encode_image'):
+                result['image_bytes'] = [encode_image(image, image_format) for image in images]
 
-        # Process text
-        sequence = self.tokenizer.texts_to_sequences([dream_text])
-        padded_text = pad_sequences(sequence, maxlen=self.max_text_length, padding='post')
+        return result
 
-        # Encode text
-        encoded_text = self.text_encoder.predict(padded_text)
+    def generate_dream_image(self, dream_text, in_memory=False, image_format='PNG',
+                             include_base64=False, save=None,
+                             output_dir='ai-models/image-generator/output', seed=None):
+        """Generate an image from a dream description
 
-        # Generate image
-        generated_image = self.generator.predict(encoded_text)
+        With in_memory=True the image is encoded straight to PNG/WebP bytes and
+        returned as a memoryview under 'image_bytes'. It is only written to disk
+        when save=True (the default when in_memory is False), under a
+        collision-free file name. A seed adds reproducible latent noise so the
+        same text can yield different variations.
+        """
+        generated_image = self.generate_dream_images([dream_text], seeds=[seed])['images'][0]
 
-        # Rescale image
-        generated_image = 0.5 * generated_image[0] + 0.5
+        # Encode image
+        image_bytes = encode_image(generated_image, image_format)
 
-        # Save image
-        timestamp = int(time.time())
-        filename = f'ai-models/image-generator/output/dream_{timestamp}.png'
-        os.makedirs('ai-models/image-generator/output', exist_ok=True)
-        plt.imsave(filename, generated_image)
+        if save is None:
+            save = not in_memory
 
-        return {
-            'image_path': filename,
+        result = {
+            'image_path': save_image_bytes(image_bytes, image_format, output_dir) if save else None,
             'dream_text': dream_text
         }
 
+        if in_memory:
+            result['image_bytes'] = image_bytes
+            result['image_format'] = image_format.lower()
+        if include_base64:
+            result['image_base64'] = base64.b64encode(image_bytes).decode('utf-8')
+
+        return result
+
+def render_samples(gen_imgs, titles, path, rows=3, cols=3):
+    """Draw a grid of generated images in [-1, 1] to an image file"""
+    # matplotlib is only needed for training previews. The figure is drawn
+    # through the Agg canvas directly, without pyplot's global state, so
+    # this is safe on the background writer thread.
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # Rescale images 0 - 1
+    gen_imgs = 0.5 * gen_imgs + 0.5
+
+    fig = Figure(figsize=(15, 15))
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(rows, cols)
+    cnt = 0
+    for i in range(rows):
+        for j in range(cols):
+            axs[i, j].imshow(gen_imgs[cnt])
+            axs[i, j].set_title(titles[cnt][:20] + "...")
+            axs[i, j].axis('off')
+            cnt += 1
+
+    fig.savefig(path)
+
+def to_uint8_image(image):
+    """Convert an image with values in [0, 1] to uint8 RGB"""
+    image = np.asarray(image)
+    if image.dtype == np.uint8:
+        return image
+    return (np.clip(image, 0.0, 1.0) * 255.0 + 0.5).astype(np.uint8)
+
+def encode_image(image, image_format='PNG'):
+    """Encode an HxWx3 image array as PNG or WebP bytes without touching disk
+
+    Returns:
+        memoryview: The encoded image
+    """
+    buffer = io.BytesIO()
+    Image.fromarray(to_uint8_image(image)).save(buffer, format=image_format.upper())
+    return buffer.getbuffer()
+
+def save_image_bytes(image_bytes, image_format='PNG', output_dir='ai-models/image-generator/output'):
+    """Write encoded image bytes to a new, uniquely named file and return its path"""
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = int(time.time())
+    filename = os.path.join(
+        output_dir, f'dream_{timestamp}_{uuid.uuid4().hex[:12]}.{image_format.lower()}'
+    )
+    with open(filename, 'xb') as handle:
+        handle.write(image_bytes)
+    return filename
+
 def download_dream_dataset():
     """
     In a real implementation, this would download or access a dataset of paired
@@ -268,8 +876,8 @@ def download_dream_dataset():
     # Create synthetic data
     num_samples = 1000
 
-    # Generate random images (64x64x3)
-    images = np.random.rand(num_samples, 64, 64, 3)
+    # Generate random images (64x64x3), as 0-255 pixels like decoded image files
+    images = np.random.randint(0, 256, (num_samples, 64, 64, 3), dtype=np.uint8)
 
     # Sample dream descriptions
     dream_descriptions = [
@@ -293,12 +901,13 @@ def download_dream_dataset():
 if __name__ == "__main__":
     print("Starting Dream Image Generator Model Training...")
 
-    # Get dataset
-    dream_texts, dream_images = download_dream_dataset()
-
-    # Initialize and train model
+    # Initialize and train model, on a dataset built by pair_dataset.py when given one
     dream_generator = DreamImageGenerator()
-    dream_generator.train(dream_texts, dream_images, epochs=200, batch_size=32)
+    if len(sys.argv) > 1:
+        dream_generator.train_from_dataset(sys.argv[1], epochs=10, batch_size=32)
+    else:
+        dream_texts, dream_images = download_dream_dataset()
+        dream_generator.train_graph(dream_texts, dream_images, epochs=10, batch_size=32)
 
     print("Training completed and model saved!")
 
@@ -306,4 +915,9 @@ if __name__ == "__main__":
     test_dream = "I was flying over a city with rainbow-colored buildings"
     result = dream_generator.generate_dream_image(test_dream)
     print(f"Test Dream: {test_dream}")
-    print(f"Image saved to: {result['image_path']}")
\ No newline at end of file
+    print(f"Image saved to: {result['image_path']}")
+
+    # Compare the compiled serving functions against Model.predict
+    latency = dream_generator.measure_latency(test_dream)
+    print(f"Model.predict: {latency['predict_ms']:.2f} ms/image, "
+          f"compiled: {latency['compiled_ms']:.2f} ms/image ({latency['speedup']:.1f}x)")
\ No newline at end of file
@@ -0,0 +1,10 @@
+# ai-models/image_generator/__init__.py
+"""
+Importable name for ai-models/image-generator.
+
+The model directory's name has a hyphen, so `image_generator.model`
+resolves to image-generator/model.py through this package's path.
+"""
+import os
+
+__path__ = [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'image-generator')]
@@ -1,49 +1,181 @@
 # ai-models/inference.py
 import os
 import sys
-import numpy as np
-import tensorflow as tf
-from PIL import Image
-import io
+import threading
+import time
 import base64
 
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import models
-from dream_validator.model import validate_dream
-from image_generator.model import DreamImageGenerator
+# Only lightweight modules are imported here. TensorFlow, NumPy, Pillow and
+# the models are imported on first use of validation or image generation,
+# so theme analysis and health checks start without them.
+from batching import MicroBatcher
+from themes import default_matcher, THEME_SIGNIFICANCE
+from result_cache import ImageResultCache, cache_key
+from instrumentation import NULL_INSTRUMENTATION
 
 class DreamAIService:
-    def __init__(self):
+    def __init__(self, micro_batching=False, max_batch_size=32, max_wait_ms=5.0,
+                 theme_lexicons=None, theme_significance=None,
+                 image_format='PNG', save_images=False, image_cache=None,
+                 instrumentation=None, backend='keras', dedup_index=None,
+                 cascade=None, journal_analytics=None):
         self.dream_validator = None
         self.image_generator = None
         self.initialized = False
 
+        # Serializes model loading when the first requests arrive concurrently
+        self._init_lock = threading.RLock()
+
+        # 'keras' serves the float32 Keras models; 'tflite-<mode>' serves the
+        # TFLite files exported by quantization.py, e.g. 'tflite-int8'
+        if backend != 'keras' and not backend.startswith('tflite-'):
+            raise ValueError(f"Unknown inference backend: {backend}")
+        self.backend = backend
+
+        # Per-stage timings and counters; disabled (near-zero cost) by default
+        self.metrics = instrumentation or NULL_INSTRUMENTATION
+
+        # Generated images are encoded in memory; set save_images to also keep a copy on disk
+        self.image_format = image_format
+        self.save_images = save_images
+
+        # Encoded images keyed by (styled prompt, style, model version, seed, format)
+        self.image_cache = image_cache if image_cache is not None else ImageResultCache()
+
+        # Optional DedupIndex: near-duplicates of earlier dreams reuse their
+        # validation result and generate images from the earlier text
+        self.dedup_index = dedup_index
+
+        # Optional ValidationCascade: a fast hashed n-gram model answers the
+        # texts it is confident about and only the rest reach the LSTM
+        self.cascade = cascade
+        if cascade is not None:
+            cascade.metrics = self.metrics
+
+        # Optional JournalAnalytics: analyses of dreams with a user id are
+        # folded into that user's theme/emotion history for trend queries
+        self.journal_analytics = journal_analytics
+
+        # Theme/emotion lexicons are compiled once into a single matcher;
+        # theme_lexicons maps group ('themes', 'emotions') -> category -> keywords
+        # and extends the built-in lexicons
+        self.theme_matcher = default_matcher()
+        for group, categories in (theme_lexicons or {}).items():
+            for category, keywords in categories.items():
+                self.theme_matcher.add_keywords(group, category, keywords)
+        self.theme_significance = dict(THEME_SIGNIFICANCE, **(theme_significance or {}))
+
+        # Optional micro-batching of concurrent validate_dream_text calls
+        self.micro_batching = micro_batching
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.validation_batcher = None
+
     def initialize(self):
         if self.initialized:
             return
 
-        print("Initializing Dream AI services...")
+        with self._init_lock:
+            if self.initialized:
+                return
+
+            print("Initializing Dream AI services...")
+
+            try:
+                self._load_validator()
+                self._load_image_generator()
+
+                self.initialized = True
+                print("Dream AI services initialized successfully")
+            except Exception as e:
+                print(f"Error initializing AI services: {str(e)}")
+                raise
 
-        try:
-            # Load dream validator
-            print("Loading Dream Validator model...")
-            # In a real implementation, this would load the actual model
-            self.dream_validator = {
-                "loaded": True,
-                "validate": validate_dream
-            }
+    def _load_validator(self):
+        if self.dream_validator is not None:
+            return
+
+        with self._init_lock:
+            if self.dream_validator is None:
+                self._create_validator()
 
-            # Load image generator
-            print("Loading Dream Image Generator model...")
-            self.image_generator = DreamImageGenerator()
+    def _create_validator(self):
+        from dream_validator.model import DreamValidator
 
-            self.initialized = True
-            print("Dream AI services initialized successfully")
-        except Exception as e:
-            print(f"Error initializing AI services: {str(e)}")
-            raise
+        # Load dream validator once and keep it resident
+        print(f"Loading Dream Validator model ({self.backend})...")
+        if self.backend == 'keras':
+            validator = DreamValidator()
+        else:
+            from quantization import tflite_path, VALIDATOR_DIR
+            mode = self.backend[len('tflite-'):]
+            validator = DreamValidator(
+                inference_mode='tflite',
+                tflite_path=tflite_path(VALIDATOR_DIR, 'dream_validator', mode)
+            )
+        validator.load(warmup=True)
+        validator.metrics = self.metrics
+        stats = validator.stats
+        self.metrics.observe('model_load_seconds', stats['cold_start_seconds'], model='validator')
+        print(f"Dream Validator ready (load {stats['load_seconds']:.2f}s, "
+              f"warmup {stats['warmup_seconds']:.2f}s)")
+
+        if self.micro_batching:
+            self.validation_batcher = MicroBatcher(
+                self._validate_batch,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.max_wait_ms,
+                name='dream-validation-batcher'
+            )
+
+        # Published last: other threads skip the lock once this is set
+        self.dream_validator = validator
+
+    def _load_image_generator(self):
+        if self.image_generator is not None:
+            return
+
+        with self._init_lock:
+            if self.image_generator is None:
+                self._create_image_generator()
+
+    def _create_image_generator(self):
+        from image_generator.model import DreamImageGenerator
+
+        # Load image generator
+        print(f"Loading Dream Image Generator model ({self.backend})...")
+        start = time.perf_counter()
+        # Serving only needs the encoder and generator, never the GAN training graph
+        if self.backend == 'keras':
+            generator = DreamImageGenerator.for_inference()
+        else:
+            from quantization import tflite_path, GENERATOR_DIR
+            mode = self.backend[len('tflite-'):]
+            generator = DreamImageGenerator.for_inference(
+                inference_mode='tflite',
+                tflite_paths=(tflite_path(GENERATOR_DIR, 'text_encoder', mode),
+                              tflite_path(GENERATOR_DIR, 'generator', mode))
+            )
+        generator.warmup()
+        generator.metrics = self.metrics
+        self.metrics.observe('model_load_seconds', time.perf_counter() - start, model='generator')
+        self.image_generator = generator
+
+    def reload_models(self):
+        """
+        Reload model files from disk, e.g. after retraining
+
+        Returns:
+            bool: True if the validator files had changed and were reloaded
+        """
+        if self.dream_validator is None:
+            self._load_validator()
+            return True
+
+        return self.dream_validator.reload_if_changed()
 
     def validate_dream_text(self, dream_text, audio_url=None):
         """
@@ -56,12 +188,80 @@ class DreamAIService:
         Returns:
             dict: Result with authenticity score and classification
         """
-        if not self.initialized:
-            self.initialize()
+        self._load_validator()
+        self.metrics.count('requests', operation='validate')
 
         # Process the dream text
-        result = self.dream_validator["validate"](dream_text)
+        if self.validation_batcher is not None:
+            result = self.validation_batcher(dream_text)
+        else:
+            result = self._validate_batch([dream_text])[0]
+
+        return self._apply_audio_boost(result, audio_url)
+
+    def validate_dreams_batch(self, dream_texts, audio_urls=None):
+        """
+        Validate many dream descriptions in a single forward pass
+
+        Args:
+            dream_texts (list): Dream description texts
+            audio_urls (list, optional): Audio URL (or None) for each text
 
+        Returns:
+            list: One validation result per text, in input order
+        """
+        self._load_validator()
+
+        dream_texts = list(dream_texts)
+        if audio_urls is None:
+            audio_urls = [None] * len(dream_texts)
+        elif len(audio_urls) != len(dream_texts):
+            raise ValueError("audio_urls must have one entry per dream text")
+
+        self.metrics.count('requests', len(dream_texts), operation='validate')
+        results = self._validate_batch(dream_texts)
+        return [self._apply_audio_boost(result, audio_url)
+                for result, audio_url in zip(results, audio_urls)]
+
+    def _validate_batch(self, dream_texts):
+        if self.dedup_index is None:
+            return self._score_batch(dream_texts)
+
+        # Near-duplicates of dreams already scored skip the model
+        results = [None] * len(dream_texts)
+        missing = []
+        with self.metrics.stage('validate', 'dedup_lookup'):
+            for i, dream_text in enumerate(dream_texts):
+                entry = self.dedup_index.lookup(dream_text)
+                if entry is not None:
+                    results[i] = dict(entry['validation'], dream_text=dream_text)
+                else:
+                    missing.append(i)
+        self.metrics.count('dedup_hits', len(dream_texts) - len(missing), operation='validate')
+
+        if missing:
+            scored = self._score_batch([dream_texts[i] for i in missing])
+            for i, result in zip(missing, scored):
+                validation = {key: value for key, value in result.items() if key != 'dream_text'}
+                self.dedup_index.add(dream_texts[i], {'text': dream_texts[i], 'validation': validation})
+                results[i] = result
+
+        return results
+
+    def _score_batch(self, dream_texts):
+        self.metrics.observe('batch_size', len(dream_texts), operation='validate')
+        if self.cascade is not None:
+            return self.cascade.validate_batch(dream_texts, self.dream_validator)
+        return self.dream_validator.validate_batch(dream_texts)
+
+    def _canonical_text(self, dream_text):
+        # The earlier text of a near-duplicate, so both share cached images
+        if self.dedup_index is None:
+            return dream_text
+        entry = self.dedup_index.lookup(dream_text)
+        return entry['text'] if entry is not None else dream_text
+
+    def _apply_audio_boost(self, result, audio_url):
         # If audio is available, incorporate it into the validation
         if audio_url:
             # In a real implementation, this would analyze audio features
@@ -71,108 +271,150 @@ class DreamAIService:
 
         return result
 
-    def generate_dream_image(self, dream_text, style=None):
+    def generate_dream_image(self, dream_text, style=None, seed=None):
         """
         Generate an image based on a dream description
 
         Args:
             dream_text (str): The dream description text
             style (str, optional): Style for the generated image (e.g., 'surreal', 'fantasy')
+            seed (int, optional): Seed for a reproducible image variation
 
         Returns:
             dict: Result with image data and metadata
         """
-        if not self.initialized:
-            self.initialize()
+        return self.generate_dream_images([dream_text], styles=[style], seeds=[seed])[0]
 
-        # Modify prompt based on style
-        if style:
-            if style == 'surreal':
-                styled_text = f"A surreal dream scene: {dream_text}, in the style of Salvador Dali"
-            elif style == 'fantasy':
-                styled_text = f"A fantasy dream world: {dream_text}, in the style of ethereal fantasy art"
-            elif style == 'abstract':
-                styled_text = f"An abstract representation of: {dream_text}, with dreamlike colors and shapes"
-            else:
-                styled_text = dream_text
-        else:
-            styled_text = dream_text
-
-        # Generate image
-        result = self.image_generator.generate_dream_image(styled_text)
+    def generate_dream_images(self, dream_texts, styles=None, per_prompt=1, seeds=None):
+        """
+        Generate images for many dreams and styles in one batched model pass
 
-        # Read image file and convert to base64
-        with open(result['image_path'], 'rb') as img_file:
-            img_data = img_file.read()
-            img_base64 = base64.b64encode(img_data).decode('utf-8')
+        Args:
+            dream_texts (list): Dream description texts
+            styles (list, optional): Styles to render each dream in (default: [None])
+            per_prompt (int): Number of variations per dream and style
+            seeds (list, optional): One seed per variation, shared by every
+                dream and style (default: None for the first, then 1, 2, ...)
 
+        Returns:
+            list: One result per (dream, style, seed), in that order, with the
+                same fields as generate_dream_image
+        """
+        self._load_image_generator()
+
+        styles = list(styles) if styles is not None else [None]
+        if seeds is None:
+            seeds = [None] + list(range(1, per_prompt))
+        elif len(seeds) != per_prompt:
+            raise ValueError("seeds must have one entry per variation")
+
+        requests = [(dream_text, style, seed)
+                    for dream_text in dream_texts for style in styles for seed in seeds]
+        results = [None] * len(requests)
+        missing = []
+        self.metrics.count('requests', len(requests), operation='generate')
+
+        # Repeat requests are answered from the cache
+        with self.metrics.stage('generate', 'cache_lookup'):
+            for i, (dream_text, style, seed) in enumerate(requests):
+                styled_text = self._style_prompt(self._canonical_text(dream_text), style)
+                key = cache_key(styled_text, style or 'default', self.image_generator.model_version,
+                                seed, self.image_format)
+                image_bytes = self.image_cache.get(key)
+                if image_bytes is None:
+                    missing.append((i, styled_text, key))
+                else:
+                    results[i] = self._image_result(requests[i], image_bytes, None)
+
+        self.metrics.count('cache_hits', len(requests) - len(missing), operation='generate')
+        self.metrics.count('cache_misses', len(missing), operation='generate')
+
+        if missing:
+            from image_generator.model import save_image_bytes
+
+            # Each styled prompt is encoded once for all of its missing seeds.
+            # Prompts missing the same number of seeds share a pass, which is
+            # a single pass unless some variations were cached
+            by_prompt = {}
+            for i, styled_text, key in missing:
+                by_prompt.setdefault(styled_text, []).append((i, key))
+            passes = {}
+            for styled_text, entries in by_prompt.items():
+                passes.setdefault(len(entries), []).append((styled_text, entries))
+
+            self.metrics.observe('batch_size', len(missing), operation='generate')
+            for count, prompts in passes.items():
+                entries = [entry for _, prompt_entries in prompts for entry in prompt_entries]
+                generated = self.image_generator.generate_dream_images(
+                    [styled_text for styled_text, _ in prompts],
+                    per_prompt=count,
+                    seeds=[requests[i][2] for i, _ in entries],
+                    image_format=self.image_format
+                )
+                for (i, key), image_bytes in zip(entries, generated['image_bytes']):
+                    self.image_cache.put(key, image_bytes)
+                    # Persist only if configured
+                    image_path = None
+                    if self.save_images:
+                        with self.metrics.stage('generate', 'save'):
+                            image_path = save_image_bytes(image_bytes, self.image_format)
+                    results[i] = self._image_result(requests[i], image_bytes, image_path)
+
+        return results
+
+    def _style_prompt(self, dream_text, style):
+        # Modify prompt based on style
+        if style == 'surreal':
+            return f"A surreal dream scene: {dream_text}, in the style of Salvador Dali"
+        elif style == 'fantasy':
+            return f"A fantasy dream world: {dream_text}, in the style of ethereal fantasy art"
+        elif style == 'abstract':
+            return f"An abstract representation of: {dream_text}, with dreamlike colors and shapes"
+        return dream_text
+
+    def _image_result(self, request, image_bytes, image_path):
+        dream_text, style, seed = request
+        with self.metrics.stage('generate', 'base64'):
+            image_base64 = base64.b64encode(image_bytes).decode('utf-8')
         return {
-            'image_base64': img_base64,
+            'image_base64': image_base64,
+            'image_format': self.image_format.lower(),
             'dream_text': dream_text,
             'style': style or 'default',
-            'image_path': result['image_path']
+            'seed': seed,
+            'image_path': image_path
         }
 
-    def analyze_dream_themes(self, dream_text):
+    def analyze_dream_themes(self, dream_text, user_id=None, timestamp=None):
         """
         Analyze dream content to identify themes and emotions
 
         Args:
             dream_text (str): The dream description text
+            user_id (str): Optional owner of the dream; with journal analytics
+                enabled the result is added to their history
+            timestamp (float): When the dream was recorded, Unix seconds
+                (default: now)
 
         Returns:
             dict: Analysis results with themes, emotions, and significance
         """
-        if not self.initialized:
-            self.initialize()
+        self.metrics.count('requests', operation='analyze')
 
         # This is a simplified implementation
         # In a real application, this would use NLP models for theme extraction
-
-        # Define theme keywords
-        themes = {
-            'flying': ['fly', 'flying', 'float', 'levitate', 'air'],
-            'falling': ['fall', 'falling', 'drop', 'plummet'],
-            'chase': ['chase', 'run', 'pursue', 'follow', 'escape'],
-            'water': ['water', 'ocean', 'sea', 'swim', 'drown', 'river', 'lake'],
-            'death': ['death', 'die', 'dead', 'funeral', 'grave'],
-            'family': ['family', 'mother', 'father', 'parent', 'brother', 'sister', 'child'],
-            'school': ['school', 'class', 'exam', 'test', 'teacher', 'student'],
-            'work': ['work', 'job', 'office', 'boss', 'colleague']
-        }
-
-        # Define emotion keywords
-        emotions = {
-            'joy': ['happy', 'joy', 'excited', 'laugh', 'pleasure'],
-            'fear': ['fear', 'scared', 'terrified', 'afraid', 'horror'],
-            'sadness': ['sad', 'unhappy', 'depressed', 'cry', 'tears'],
-            'anger': ['angry', 'mad', 'furious', 'rage', 'upset'],
-            'surprise': ['surprise', 'shocked', 'unexpected', 'astonish'],
-            'anxiety': ['anxious', 'worry', 'stress', 'tension', 'nervous']
-        }
-
-        # Initialize results
-        dream_text_lower = dream_text.lower()
-        theme_results = []
-        emotion_results = []
-
-        # Check for themes
-        for theme, keywords in themes.items():
-            score = sum(1 for keyword in keywords if keyword in dream_text_lower)
-            if score > 0:
-                theme_results.append({
-                    'theme': theme,
-                    'relevance': min(score / 2, 1.0)  # Normalize score between 0 and 1
-                })
-
-        # Check for emotions
-        for emotion, keywords in emotions.items():
-            score = sum(1 for keyword in keywords if keyword in dream_text_lower)
-            if score > 0:
-                emotion_results.append({
-                    'emotion': emotion,
-                    'intensity': min(score / 2, 1.0)  # Normalize score between 0 and 1
-                })
+        with self.metrics.stage('analyze', 'match'):
+            matches = self.theme_matcher.match(dream_text)
+
+        # Normalize scores between 0 and 1
+        theme_results = [
+            {'theme': theme, 'relevance': min(score / 2, 1.0)}
+            for theme, score in matches.get('themes', {}).items()
+        ]
+        emotion_results = [
+            {'emotion': emotion, 'intensity': min(score / 2, 1.0)}
+            for emotion, score in matches.get('emotions', {}).items()
+        ]
 
         # Sort results by relevance/intensity
         theme_results.sort(key=lambda x: x['relevance'], reverse=True)
@@ -183,31 +425,59 @@ class DreamAIService:
         if theme_results:
             top_theme = theme_results[0]['theme']
             significance += f" The presence of {top_theme} suggests you may be dealing with "
+            significance += self.theme_significance.get(
+                top_theme, "something that matters to you in waking life."
+            )
 
-            if top_theme == 'flying':
-                significance += "a desire for freedom or escape from constraints."
-            elif top_theme == 'falling':
-                significance += "a lack of control or insecurity in some aspect of your life."
-            elif top_theme == 'chase':
-                significance += "avoidance of a problem or fear that needs to be confronted."
-            elif top_theme == 'water':
-                significance += "emotions or the unconscious mind."
-            elif top_theme == 'death':
-                significance += "transformation, endings, or significant life changes."
-            elif top_theme == 'family':
-                significance += "your relationships and connections to others."
-            elif top_theme == 'school':
-                significance += "feelings of being tested or evaluated in your life."
-            elif top_theme == 'work':
-                significance += "your ambitions, responsibilities, or sense of purpose."
-
-        return {
+        result = {
             'themes': theme_results,
             'emotions': emotion_results,
             'significance': significance,
             'dream_text': dream_text
         }
 
+        if user_id is not None and self.journal_analytics is not None:
+            with self.metrics.stage('analyze', 'journal'):
+                self.journal_analytics.record(user_id, result,
+                                              time.time() if timestamp is None else timestamp)
+
+        return result
+
+    def _require_journal_analytics(self):
+        if self.journal_analytics is None:
+            raise ValueError("Journal analytics are not enabled")
+        return self.journal_analytics
+
+    def dream_trends(self, user_id, start=None, end=None, interval_days=7):
+        """
+        Theme and emotion counts of a user's dreams per time window
+
+        Args:
+            user_id (str): Whose journal to summarize
+            start (float): First moment included, Unix seconds (default: first dream)
+            end (float): Exclusive end, Unix seconds (default: last dream)
+            interval_days (int): Days per window
+
+        Returns:
+            dict: Columnar series of window starts, dream counts and
+                per-theme / per-emotion counts
+        """
+        self.metrics.count('requests', operation='trends')
+        return self._require_journal_analytics().trends(user_id, start, end, interval_days or 7)
+
+    def top_dream_themes(self, user_id, start=None, end=None, limit=5, group='themes'):
+        """
+        A user's most frequent themes (or emotions, with group='emotions')
+
+        Returns:
+            list: Dicts with the name, dream count, share of dreams and mean
+                relevance/intensity, most frequent first
+        """
+        self.metrics.count('requests', operation='top_themes')
+        if group not in ('themes', 'emotions'):
+            raise ValueError(f"Unknown analytics group: {group}")
+        return self._require_journal_analytics().top_themes(user_id, start, end, limit or 5, group)
+
 # Create singleton instance
 dream_ai_service = DreamAIService()
 
@@ -215,8 +485,14 @@ dream_ai_service = DreamAIService()
 def validate_dream_api(dream_text, audio_url=None):
     return dream_ai_service.validate_dream_text(dream_text, audio_url)
 
-def generate_dream_image_api(dream_text, style=None):
-    return dream_ai_service.generate_dream_image(dream_text, style)
+def validate_dreams_batch_api(dream_texts, audio_urls=None):
+    return dream_ai_service.validate_dreams_batch(dream_texts, audio_urls)
+
+def generate_dream_image_api(dream_text, style=None, seed=None):
+    return dream_ai_service.generate_dream_image(dream_text, style, seed)
+
+def generate_dream_images_api(dream_texts, styles=None, per_prompt=1, seeds=None):
+    return dream_ai_service.generate_dream_images(dream_texts, styles, per_prompt, seeds)
 
 def analyze_dream_themes_api(dream_text):
     return dream_ai_service.analyze_dream_themes(dream_text)
@@ -232,7 +508,8 @@ if __name__ == "__main__":
 
     print("\nTesting Dream Image Generation:")
     image_result = generate_dream_image_api(dream_text, style="surreal")
-    print(f"Image generated at: {image_result['image_path']}")
+    print(f"Image generated ({image_result['image_format']}, "
+          f"{len(image_result['image_base64'])} base64 characters)")
 
     print("\nTesting Dream Theme Analysis:")
     analysis_result = analyze_dream_themes_api(dream_text)
@@ -0,0 +1,155 @@
+# ai-models/instrumentation.py
+import json
+import logging
+import threading
+import time
+
+class _NullStage:
+    """Shared no-op stage used when instrumentation is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class _Stage:
+    def __init__(self, instrumentation, operation, stage):
+        self.instrumentation = instrumentation
+        self.operation = operation
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.instrumentation.observe('stage_seconds', time.perf_counter() - self.start,
+                                     operation=self.operation, stage=self.stage)
+        return False
+
+class Instrumentation:
+    """
+    Hot-path metrics for DreamAIService with pluggable sinks
+
+    Records counters (requests, cache hits) and observations (stage
+    durations, batch sizes, model load times) and forwards them to every
+    sink. With no sinks attached it is disabled: stage() returns a shared
+    no-op context manager and count()/observe() return immediately.
+    """
+
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks or [])
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def stage(self, operation, stage):
+        """Context manager timing one pipeline stage of an operation"""
+        if not self.sinks:
+            return _NULL_STAGE
+        return _Stage(self, operation, stage)
+
+    def count(self, name, value=1, **labels):
+        if not self.sinks:
+            return
+        for sink in self.sinks:
+            sink.record('counter', name, value, labels)
+
+    def observe(self, name, value, **labels):
+        if not self.sinks:
+            return
+        for sink in self.sinks:
+            sink.record('observation', name, value, labels)
+
+# Shared disabled instance
+NULL_INSTRUMENTATION = Instrumentation()
+
+class CounterSink:
+    """In-process aggregation of counters and observations"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.observations = {}
+
+    def record(self, kind, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if kind == 'counter':
+                self.counters[key] = self.counters.get(key, 0) + value
+                return
+
+            summary = self.observations.get(key)
+            if summary is None:
+                self.observations[key] = {'count': 1, 'sum': value, 'min': value, 'max': value}
+            else:
+                summary['count'] += 1
+                summary['sum'] += value
+                summary['min'] = min(summary['min'], value)
+                summary['max'] = max(summary['max'], value)
+
+    def snapshot(self):
+        """Plain-dict copy of everything recorded so far"""
+        with self._lock:
+            return {
+                'counters': [dict(name=name, labels=dict(labels), value=value)
+                             for (name, labels), value in self.counters.items()],
+                'observations': [dict(name=name, labels=dict(labels), **summary)
+                                 for (name, labels), summary in self.observations.items()]
+            }
+
+class PrometheusSink(CounterSink):
+    """CounterSink that can dump its state in the Prometheus text format"""
+
+    def __init__(self, prefix='dream_ai'):
+        super().__init__()
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels):
+        if not labels:
+            return ''
+        escaped = ((key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' '))
+                   for key, value in labels)
+        pairs = ','.join(f'{key}="{value}"' for key, value in escaped)
+        return '{' + pairs + '}'
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                metric = f'{self.prefix}_{name}_total'
+                lines.append(f'# TYPE {metric} counter')
+                for (key_name, labels), value in sorted(self.counters.items()):
+                    if key_name == name:
+                        lines.append(f'{metric}{self._labels(labels)} {value}')
+
+            for name in sorted({name for name, _ in self.observations}):
+                metric = f'{self.prefix}_{name}'
+                lines.append(f'# TYPE {metric} summary')
+                for (key_name, labels), summary in sorted(self.observations.items()):
+                    if key_name == name:
+                        lines.append(f'{metric}_count{self._labels(labels)} {summary["count"]}')
+                        lines.append(f'{metric}_sum{self._labels(labels)} {summary["sum"]}')
+        return '\n'.join(lines) + '\n'
+
+class LogSink:
+    """Emit every metric as a structured JSON log record"""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('dream_ai.metrics')
+        self.level = level
+
+    def record(self, kind, name, value, labels):
+        if self.logger.isEnabledFor(self.level):
+            self.logger.log(self.level, json.dumps(
+                {'kind': kind, 'metric': name, 'value': value, 'labels': labels}
+            ))
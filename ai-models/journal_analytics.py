@@ -0,0 +1,357 @@
+# ai-models/journal_analytics.py
+"""
+Incremental per-user theme and emotion analytics over a dream journal.
+
+Every analyzed dream is folded into its user's history: a day-by-category
+array of how many dreams mentioned each theme/emotion and the summed
+relevance/intensity, plus dreams per day. Recording a dream touches one
+row; trend and top-theme queries slice a day range and reduce it with
+NumPy, so nothing is re-analyzed when a user opens their journal.
+
+Histories are derived data: they can be saved to an .npz file (on demand
+or periodically with start_autosave()) and, if lost, rebuilt from past
+analyses with backfill().
+"""
+import os
+import threading
+
+import numpy as np
+
+from themes import THEME_KEYWORDS, EMOTION_KEYWORDS
+
+SECONDS_PER_DAY = 86400
+
+# Most windows one trends() call returns; longer ranges keep the latest
+MAX_TREND_WINDOWS = 520
+
+def _day(timestamp):
+    # UTC day number of a Unix timestamp in seconds
+    return int(timestamp // SECONDS_PER_DAY)
+
+class _UserHistory:
+    """Day-indexed arrays for one user, growing in either direction"""
+
+    __slots__ = ('first_day', 'days', 'dreams', 'counts', 'scores')
+
+    def __init__(self, first_day, num_categories, capacity=32):
+        self.first_day = first_day
+        # Days in use, counted from first_day
+        self.days = 0
+        self.dreams = np.zeros(capacity, dtype=np.int32)
+        self.counts = np.zeros((capacity, num_categories), dtype=np.int32)
+        self.scores = np.zeros((capacity, num_categories), dtype=np.float32)
+
+    def _resize(self, first_day, last_day):
+        # Reallocate so [first_day, last_day] fits, doubling the capacity
+        days = last_day - first_day + 1
+        capacity = max(len(self.dreams), 32)
+        while capacity < days:
+            capacity *= 2
+        shift = self.first_day - first_day
+
+        dreams = np.zeros(capacity, dtype=np.int32)
+        counts = np.zeros((capacity, self.counts.shape[1]), dtype=np.int32)
+        scores = np.zeros((capacity, self.scores.shape[1]), dtype=np.float32)
+        dreams[shift:shift + self.days] = self.dreams[:self.days]
+        counts[shift:shift + self.days] = self.counts[:self.days]
+        scores[shift:shift + self.days] = self.scores[:self.days]
+
+        self.first_day = first_day
+        self.days += shift
+        self.dreams, self.counts, self.scores = dreams, counts, scores
+
+    def rows(self, first_day, last_day):
+        """Row indices for days first_day..last_day, making room if needed"""
+        if first_day < self.first_day or last_day - self.first_day >= len(self.dreams):
+            self._resize(min(first_day, self.first_day),
+                         max(last_day, self.first_day + self.days - 1))
+        self.days = max(self.days, last_day - self.first_day + 1)
+        return first_day - self.first_day, last_day - self.first_day
+
+class JournalAnalytics:
+    """Per-user theme/emotion counts by day, updated as dreams are analyzed"""
+
+    def __init__(self, themes=None, emotions=None, path=None, max_windows=MAX_TREND_WINDOWS):
+        self.themes = list(themes or THEME_KEYWORDS)
+        self.emotions = list(emotions or EMOTION_KEYWORDS)
+        self.path = path
+        self.max_windows = max_windows
+
+        # Themes first, then emotions, as one category axis
+        self._columns = {('themes', name): i for i, name in enumerate(self.themes)}
+        self._columns.update({('emotions', name): len(self.themes) + i
+                              for i, name in enumerate(self.emotions)})
+
+        self._lock = threading.Lock()
+        self._users = {}
+
+        # Bumped on every change; autosave skips saves when nothing changed
+        self._changes = 0
+        self._saved_changes = 0
+        self._autosave_stop = None
+        self._autosave_thread = None
+
+        self.stats = {
+            'recorded': 0,
+            'queries': 0
+        }
+
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def _vector(self, analysis):
+        # Category columns and scores present in an analyze_dream_themes result
+        columns, scores = [], []
+        for group, key, score_key in (('themes', 'theme', 'relevance'),
+                                      ('emotions', 'emotion', 'intensity')):
+            for entry in analysis.get(group, ()):
+                column = self._columns.get((group, entry[key]))
+                if column is not None:
+                    columns.append(column)
+                    scores.append(entry[score_key])
+        return columns, scores
+
+    # Updates
+
+    def record(self, user_id, analysis, timestamp, sign=1):
+        """
+        Fold one analyze_dream_themes result into a user's history
+
+        Args:
+            user_id (str): Owner of the dream
+            analysis (dict): Result with 'themes' and 'emotions' lists
+            timestamp (float): When the dream was recorded, Unix seconds
+            sign (int): -1 removes a previously recorded dream
+        """
+        day = _day(timestamp)
+        columns, scores = self._vector(analysis)
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is None:
+                history = self._users[user_id] = _UserHistory(day, len(self._columns))
+            row, _ = history.rows(day, day)
+            history.dreams[row] += sign
+            history.counts[row, columns] += sign
+            history.scores[row, columns] += sign * np.asarray(scores, dtype=np.float32)
+            self.stats['recorded'] += sign
+            self._changes += 1
+
+    def forget(self, user_id, analysis, timestamp):
+        """Remove a dream recorded earlier, e.g. when the user deletes it"""
+        self.record(user_id, analysis, timestamp, sign=-1)
+
+    def backfill(self, user_id, analyses, timestamps):
+        """Record many past dreams of one user with a few scatter-adds"""
+        if not len(analyses):
+            return
+        days = np.floor_divide(np.asarray(timestamps, dtype=np.float64), SECONDS_PER_DAY).astype(np.int64)
+        vectors = [self._vector(analysis) for analysis in analyses]
+        lengths = [len(columns) for columns, _ in vectors]
+        columns = np.fromiter((c for cs, _ in vectors for c in cs), dtype=np.int64, count=sum(lengths))
+        scores = np.fromiter((s for _, ss in vectors for s in ss), dtype=np.float32, count=sum(lengths))
+
+        with self._lock:
+            history = self._users.get(user_id)
+            if history is None:
+                history = self._users[user_id] = _UserHistory(int(days.min()), len(self._columns))
+            history.rows(int(days.min()), int(days.max()))
+            rows = days - history.first_day
+            np.add.at(history.dreams, rows, 1)
+            entry_rows = np.repeat(rows, lengths)
+            np.add.at(history.counts, (entry_rows, columns), 1)
+            np.add.at(history.scores, (entry_rows, columns), scores)
+            self.stats['recorded'] += len(analyses)
+            self._changes += 1
+
+    # Queries
+
+    def _window(self, history, start, end):
+        # Row slice of the history inside [start, end) in Unix seconds
+        first = 0 if start is None else max(_day(start) - history.first_day, 0)
+        last = history.days if end is None else min(_day(end - 1) - history.first_day + 1, history.days)
+        return first, max(first, last)
+
+    def _named(self, values):
+        # Split category columns of values into theme and emotion series
+        themes = {name: values[:, self._columns[('themes', name)]].tolist() for name in self.themes}
+        emotions = {name: values[:, self._columns[('emotions', name)]].tolist() for name in self.emotions}
+        return themes, emotions
+
+    def trends(self, user_id, start=None, end=None, interval_days=7):
+        """
+        Dream and theme/emotion counts per interval_days window
+
+        Windows are aligned to the day of start and cover [start, end),
+        clamped to the windows that overlap the user's history; days without
+        recorded dreams count as zero. At most max_windows windows are
+        returned, the latest ones if the range holds more. The last window
+        may run past end.
+
+        Args:
+            user_id (str): Whose journal to summarize
+            start (float): Start of the first window, Unix seconds (default: day of the first dream)
+            end (float): Exclusive end, Unix seconds (default: day after the last dream)
+            interval_days (int): Days per window, at least 1
+
+        Returns:
+            dict: Columnar series; window_starts are Unix seconds and each
+                theme/emotion maps to its count in every window
+        """
+        if isinstance(interval_days, bool) or not isinstance(interval_days, (int, np.integer)) \
+                or interval_days < 1:
+            raise ValueError(f"interval_days must be a positive integer, got {interval_days!r}")
+        interval_days = int(interval_days)
+
+        with self._lock:
+            self.stats['queries'] += 1
+            history = self._users.get(user_id)
+            if history is None:
+                first_day = last_day = 0
+            else:
+                first_day, last_day = history.first_day, history.first_day + history.days
+            start_day = first_day if start is None else _day(start)
+            end_day = last_day if end is None else _day(end - 1) + 1
+
+            # Skip whole windows before the first dream and stop after the last
+            if start_day < first_day:
+                start_day += (first_day - start_day) // interval_days * interval_days
+            end_day = min(end_day, last_day)
+            windows = max(-(-(end_day - start_day) // interval_days), 0)
+            if windows > self.max_windows:
+                start_day += (windows - self.max_windows) * interval_days
+                windows = self.max_windows
+
+            # Running totals over the history days inside the range; each
+            # window is the difference of the totals at its two edges
+            low = max(start_day, first_day)
+            high = max(end_day, low)
+            dreams = np.zeros(high - low + 1, dtype=np.int64)
+            counts = np.zeros((high - low + 1, len(self._columns)), dtype=np.int64)
+            if history is not None:
+                np.cumsum(history.dreams[low - first_day:high - first_day], out=dreams[1:])
+                np.cumsum(history.counts[low - first_day:high - first_day], axis=0, out=counts[1:])
+
+        edges = np.clip(start_day + np.arange(windows + 1) * interval_days, low, high) - low
+        themes, emotions = self._named(counts[edges[1:]] - counts[edges[:-1]])
+        return {
+            'user_id': user_id,
+            'interval_days': interval_days,
+            'window_starts': ((start_day + np.arange(windows) * interval_days) * SECONDS_PER_DAY).tolist(),
+            'dreams': (dreams[edges[1:]] - dreams[edges[:-1]]).tolist(),
+            'themes': themes,
+            'emotions': emotions
+        }
+
+    def top_themes(self, user_id, start=None, end=None, limit=5, group='themes'):
+        """
+        Most frequent themes (or emotions) in a time window
+
+        Returns:
+            list: Dicts with the name, number of dreams mentioning it, its
+                share of the window's dreams and its mean relevance/intensity
+        """
+        names = self.themes if group == 'themes' else self.emotions
+        offset = 0 if group == 'themes' else len(self.themes)
+        with self._lock:
+            self.stats['queries'] += 1
+            history = self._users.get(user_id)
+            if history is None:
+                return []
+            first, last = self._window(history, start, end)
+            dreams = int(history.dreams[first:last].sum())
+            counts = history.counts[first:last, offset:offset + len(names)].sum(axis=0)
+            scores = history.scores[first:last, offset:offset + len(names)].sum(axis=0)
+
+        order = np.argsort(-counts, kind='stable')[:limit]
+        order = order[counts[order] > 0]
+        key = 'theme' if group == 'themes' else 'emotion'
+        return [{
+            key: names[i],
+            'dreams': int(counts[i]),
+            'share': float(counts[i] / dreams) if dreams else 0.0,
+            'mean_score': float(scores[i] / counts[i])
+        } for i in order]
+
+    def total_dreams(self, user_id):
+        with self._lock:
+            history = self._users.get(user_id)
+            return int(history.dreams[:history.days].sum()) if history else 0
+
+    # Persistence
+
+    def save(self, path=None):
+        """Write every history into one .npz file"""
+        path = path or self.path
+        with self._lock:
+            changes = self._changes
+            users = list(self._users.items())
+            days = np.asarray([history.days for _, history in users], dtype=np.int64)
+            arrays = {
+                'user_ids': np.asarray([user_id for user_id, _ in users], dtype=str),
+                'first_days': np.asarray([history.first_day for _, history in users], dtype=np.int64),
+                'days': days,
+                'categories': np.asarray([f'{group}:{name}' for group, name in self._columns], dtype=str),
+                'dreams': np.concatenate([h.dreams[:h.days] for _, h in users] or [np.zeros(0, np.int32)]),
+                'counts': np.concatenate([h.counts[:h.days] for _, h in users]
+                                         or [np.zeros((0, len(self._columns)), np.int32)]),
+                'scores': np.concatenate([h.scores[:h.days] for _, h in users]
+                                         or [np.zeros((0, len(self._columns)), np.float32)])
+            }
+
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+        self._saved_changes = changes
+
+    def load(self, path):
+        """Replace all histories with those saved in path"""
+        with np.load(path) as data:
+            categories = [tuple(name.split(':', 1)) for name in data['categories'].tolist()]
+            # Saved columns are mapped onto the current lexicon; dropped categories are ignored
+            source = [i for i, category in enumerate(categories) if category in self._columns]
+            target = [self._columns[categories[i]] for i in source]
+
+            users = {}
+            ends = np.cumsum(data['days'])
+            for user_id, first_day, days, end in zip(data['user_ids'].tolist(), data['first_days'].tolist(),
+                                                     data['days'].tolist(), ends.tolist()):
+                history = _UserHistory(first_day, len(self._columns), capacity=max(days, 32))
+                history.days = days
+                history.dreams[:days] = data['dreams'][end - days:end]
+                history.counts[:days, target] = data['counts'][end - days:end][:, source]
+                history.scores[:days, target] = data['scores'][end - days:end][:, source]
+                users[user_id] = history
+
+        with self._lock:
+            self._users = users
+            self._changes += 1
+            self._saved_changes = self._changes
+
+    def start_autosave(self, interval_seconds, path=None):
+        """Save every interval_seconds from a background thread while histories change"""
+        path = path or self.path
+        if self._autosave_stop is not None:
+            raise RuntimeError("Autosave is already running")
+        stop = self._autosave_stop = threading.Event()
+
+        def autosave():
+            while not stop.wait(interval_seconds):
+                if self._changes == self._saved_changes:
+                    continue
+                try:
+                    self.save(path)
+                except Exception as e:
+                    print(f"Error saving journal analytics to {path}: {str(e)}")
+
+        self._autosave_thread = threading.Thread(target=autosave, name='journal-autosave', daemon=True)
+        self._autosave_thread.start()
+
+    def stop_autosave(self):
+        """Stop the autosave thread, waiting for a save in progress"""
+        if self._autosave_stop is not None:
+            self._autosave_stop.set()
+            self._autosave_thread.join()
+            self._autosave_stop = self._autosave_thread = None
+
+    def __len__(self):
+        return len(self._users)
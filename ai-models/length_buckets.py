@@ -0,0 +1,72 @@
+# ai-models/length_buckets.py
+"""
+Length bucketing for the LSTM text models.
+
+Texts are post-padded to a fixed maxlen, but most dreams are far shorter,
+so a fixed shape makes the recurrent layers step over mostly padding.
+Rows are grouped by their unpadded length into a few buckets, each bucket
+is trimmed to its boundary and run separately, and the outputs are put
+back in input order. This only preserves results for models that mask
+padding (Embedding(mask_zero=True)); callers check that before bucketing.
+"""
+import numpy as np
+
+DEFAULT_BUCKETS = (16, 32, 64)
+
+def bucket_boundaries(max_length, buckets=DEFAULT_BUCKETS):
+    """Sorted bucket lengths, always ending with max_length"""
+    return sorted({length for length in buckets if length < max_length} | {max_length})
+
+def sequence_lengths(padded):
+    """Length of each post-padded row up to and including its last token"""
+    nonzero = padded != 0
+    last = np.argmax(nonzero[:, ::-1], axis=1)
+    return np.where(nonzero.any(axis=1), padded.shape[1] - last, 0)
+
+def group_by_bucket(padded, boundaries):
+    """Yield (bucket length, row indices) for each non-empty bucket"""
+    buckets = np.searchsorted(boundaries, sequence_lengths(padded), side='left')
+    for bucket in np.unique(buckets):
+        yield boundaries[bucket], np.flatnonzero(buckets == bucket)
+
+def run_bucketed(padded, boundaries, fn):
+    """
+    Apply fn to each bucket's rows trimmed to the bucket length
+
+    Returns:
+        np.ndarray: fn's outputs for every row, in input order
+    """
+    if not len(padded):
+        return np.asarray(fn(padded))
+
+    output = None
+    for length, rows in group_by_bucket(padded, boundaries):
+        result = np.asarray(fn(padded[rows, :length]))
+        if output is None:
+            output = np.empty((len(padded),) + result.shape[1:], dtype=result.dtype)
+        output[rows] = result
+    return output
+
+def bucket_dataset(dataset, boundaries, batch_size, drop_remainder=False):
+    """
+    Batch a tf.data dataset of (tokens, ...) examples by token length
+
+    Each example's tokens are trimmed of trailing padding, examples are
+    grouped into the given buckets, and each batch is padded only to its
+    longest sequence.
+    """
+    import tensorflow as tf
+
+    def trim(tokens, *rest):
+        positions = tf.range(1, tf.shape(tokens)[0] + 1)
+        length = tf.reduce_max(tf.where(tokens != 0, positions, tf.zeros_like(positions)))
+        return (tokens[:length],) + rest
+
+    dataset = dataset.map(trim, num_parallel_calls=tf.data.AUTOTUNE)
+    # tf.data buckets are half-open [lower, upper); ours include the boundary
+    return dataset.bucket_by_sequence_length(
+        element_length_func=lambda tokens, *rest: tf.shape(tokens)[0],
+        bucket_boundaries=[length + 1 for length in boundaries[:-1]],
+        bucket_batch_sizes=[batch_size] * len(boundaries),
+        drop_remainder=drop_remainder
+    )
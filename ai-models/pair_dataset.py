@@ -0,0 +1,241 @@
+# ai-models/pair_dataset.py
+"""
+Preprocessed, memory-mapped text-image training datasets.
+
+A dataset directory holds shards of uint8 images (n x size x size x 3)
+and int32 post-padded token ids (n x max_length) as .npy files, the
+vocabulary they were tokenized with, and a manifest.json written last.
+Shards are memory-mapped, so training reads only the rows it is batching
+and normalizes them to float32 per batch; nothing is decoded, resized or
+tokenized again between runs.
+
+Building is a one-time step. Shards are decoded, resized and tokenized in
+worker processes while the parent streams the input, keeping at most a
+few shards of input in flight:
+
+    python ai-models/pair_dataset.py pairs.jsonl ai-models/image-generator/dataset --workers 8
+
+where each JSONL line is {"text": "...", "image": "path/to/image.png"}.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Make sibling modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vocab import CompactTokenizer
+
+MANIFEST = 'manifest.json'
+VOCAB = 'tokenizer.vocab'
+
+def to_uint8_pixels(image, image_size):
+    """
+    A (image_size, image_size, 3) uint8 array from a path or pixel array
+
+    Arrays hold 0-255 pixel values, as the training code expects; other
+    sizes are resized.
+    """
+    if not isinstance(image, (str, os.PathLike)):
+        pixels = np.asarray(image)
+        if pixels.dtype != np.uint8:
+            pixels = np.clip(np.rint(pixels), 0, 255).astype(np.uint8)
+        if pixels.shape == (image_size, image_size, 3):
+            return pixels
+
+    # PIL is only needed to decode files and resize
+    from PIL import Image
+
+    if isinstance(image, (str, os.PathLike)):
+        with Image.open(image) as source:
+            picture = source.convert('RGB')
+    else:
+        picture = Image.fromarray(pixels).convert('RGB')
+
+    if picture.size != (image_size, image_size):
+        picture = picture.resize((image_size, image_size), Image.BILINEAR)
+    return np.asarray(picture, dtype=np.uint8)
+
+def normalize_images(images):
+    """uint8 pixels to float32 in [-1, 1]"""
+    return images.astype(np.float32) / 127.5 - 1.0
+
+# Build step
+
+_worker_tokenizer = None
+
+def _init_worker(vocab_path):
+    global _worker_tokenizer
+    _worker_tokenizer = CompactTokenizer.load(vocab_path)
+
+def _write_npy(path, array):
+    tmp_path = f'{path}.tmp.npy'
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+def _build_shard(output_dir, index, texts, images, image_size, max_length):
+    """Tokenize and decode one shard in a worker process and write its files"""
+    names = {'tokens': f'tokens-{index:05d}.npy', 'images': f'images-{index:05d}.npy'}
+    _write_npy(os.path.join(output_dir, names['tokens']),
+               _worker_tokenizer.texts_to_padded(texts, max_length))
+
+    # Images go straight into the mapped file, one at a time
+    path = os.path.join(output_dir, names['images'])
+    tmp_path = f'{path}.tmp.npy'
+    pixels = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.uint8,
+                                       shape=(len(images), image_size, image_size, 3))
+    for i, image in enumerate(images):
+        pixels[i] = to_uint8_pixels(image, image_size)
+    pixels.flush()
+    del pixels
+    os.replace(tmp_path, path)
+
+    return dict(names, count=len(texts))
+
+def build_pair_dataset(pairs, output_dir, tokenizer, image_size=64, max_length=100,
+                       shard_size=4096, workers=None):
+    """
+    Write (text, image) pairs as a memory-mapped dataset
+
+    Args:
+        pairs: Iterable of (text, image) where image is a file path or an
+            array of 0-255 pixel values; consumed lazily
+        output_dir (str): Dataset directory, created if needed
+        tokenizer (CompactTokenizer): Vocabulary to tokenize with; saved
+            with the dataset
+        image_size (int): Images are resized to image_size x image_size
+        max_length (int): Token arrays are post-padded / pre-truncated to this
+        shard_size (int): Pairs per shard
+        workers (int): Worker processes (default: CPU count)
+
+    Returns:
+        dict: The manifest
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    vocab_path = os.path.join(output_dir, VOCAB)
+    tokenizer.save(vocab_path)
+
+    workers = workers or os.cpu_count() or 1
+    shards = []
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(vocab_path,)) as executor:
+        pending = []
+        iterator = iter(pairs)
+        for index in itertools.count():
+            chunk = list(itertools.islice(iterator, shard_size))
+            if not chunk:
+                break
+            texts = [str(text) for text, _ in chunk]
+            images = [image for _, image in chunk]
+            pending.append(executor.submit(_build_shard, output_dir, index, texts, images,
+                                           image_size, max_length))
+
+            # Bound the input held in memory while workers catch up
+            while len(pending) >= 2 * workers:
+                shards.append(pending.pop(0).result())
+                print(f"Built shard {len(shards)}")
+
+        for future in pending:
+            shards.append(future.result())
+            print(f"Built shard {len(shards)}")
+
+    manifest = {
+        'count': sum(shard['count'] for shard in shards),
+        'image_size': image_size,
+        'max_length': max_length,
+        'vocab': VOCAB,
+        'shards': shards
+    }
+    # The manifest is written last, so a partial build is never loaded
+    tmp_path = os.path.join(output_dir, f'{MANIFEST}.tmp')
+    with open(tmp_path, 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST))
+    return manifest
+
+# Reading
+
+class PairDataset:
+    """Memory-mapped shards of a dataset built by build_pair_dataset"""
+
+    def __init__(self, path):
+        manifest_path = os.path.join(path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            raise FileNotFoundError(f"No dataset manifest at {manifest_path}")
+        with open(manifest_path) as handle:
+            manifest = json.load(handle)
+
+        self.path = path
+        self.image_size = manifest['image_size']
+        self.max_length = manifest['max_length']
+        self.tokenizer = CompactTokenizer.load(os.path.join(path, manifest['vocab']))
+        self.shards = [
+            (np.load(os.path.join(path, shard['tokens']), mmap_mode='r'),
+             np.load(os.path.join(path, shard['images']), mmap_mode='r'))
+            for shard in manifest['shards']
+        ]
+        self._count = manifest['count']
+
+    def __len__(self):
+        return self._count
+
+    def iter_chunks(self, chunk_size=1024, shuffle=True, seed=None):
+        """
+        Yield (tokens, uint8 images) blocks of up to chunk_size rows
+
+        Each block is a contiguous read from one shard; with shuffle the
+        blocks come in random order across all shards, and rows are left
+        for a downstream shuffle buffer to mix.
+        """
+        blocks = [(shard, start) for shard, (tokens, _) in enumerate(self.shards)
+                  for start in range(0, len(tokens), chunk_size)]
+        if shuffle:
+            order = np.random.default_rng(seed).permutation(len(blocks))
+            blocks = [blocks[i] for i in order]
+
+        for shard, start in blocks:
+            tokens, images = self.shards[shard]
+            yield (np.asarray(tokens[start:start + chunk_size]),
+                   np.asarray(images[start:start + chunk_size]))
+
+def read_pairs(path, text_field='text', image_field='image'):
+    """Yield (text, image path) from a JSONL file; relative paths are from the file's directory"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding='utf-8') as handle:
+        for line in handle:
+            if line.strip():
+                row = json.loads(line)
+                yield row[text_field], os.path.join(base, row[image_field])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a memory-mapped text-image training dataset')
+    parser.add_argument('input', help='JSONL file of {"text": ..., "image": path} pairs')
+    parser.add_argument('output', help='Dataset directory')
+    parser.add_argument('--vocab', help='Existing compact vocabulary (default: fit on the input texts)')
+    parser.add_argument('--max-words', type=int, default=10000)
+    parser.add_argument('--image-size', type=int, default=64)
+    parser.add_argument('--max-length', type=int, default=100)
+    parser.add_argument('--shard-size', type=int, default=4096)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--image-field', default='image')
+    args = parser.parse_args(argv)
+
+    def pairs():
+        return read_pairs(args.input, args.text_field, args.image_field)
+
+    if args.vocab:
+        tokenizer = CompactTokenizer.load(args.vocab)
+    else:
+        tokenizer = CompactTokenizer.fit((text for text, _ in pairs()), num_words=args.max_words)
+
+    manifest = build_pair_dataset(pairs(), args.output, tokenizer, args.image_size,
+                                  args.max_length, args.shard_size, args.workers)
+    print(f"Dataset of {manifest['count']} pairs in {len(manifest['shards'])} shards at {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# ai-models/quantization.py
+"""
+TFLite export and serving for the dream validator and image generator.
+
+Models are converted with post-training quantization ('float16', 'dynamic'
+range or full 'int8' with a representative dataset drawn from training
+texts) and served through TFLiteModel, which DreamValidator and
+DreamImageGenerator use when inference_mode='tflite'. Running this module
+exports every variant and writes a report comparing accuracy / image drift,
+latency and memory against the float32 Keras models:
+
+    python ai-models/quantization.py --output quantization_report.json
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+QUANTIZATION_MODES = ('float32', 'float16', 'dynamic', 'int8')
+
+VALIDATOR_DIR = 'ai-models/dream-validator'
+GENERATOR_DIR = 'ai-models/image-generator'
+
+def tflite_path(model_dir, name, mode):
+    """Where the TFLite variant of a model is stored"""
+    return os.path.join(model_dir, f'{name}_{mode}.tflite')
+
+def convert_to_tflite(model, mode='float16', representative_inputs=None, num_samples=100,
+                      input_length=None):
+    """
+    Convert a Keras model to a TFLite flatbuffer
+
+    Args:
+        model: Keras model to convert
+        mode (str): 'float32', 'float16', 'dynamic' or 'int8'
+        representative_inputs (np.ndarray): Sample inputs used to calibrate
+            activation ranges; required for 'int8'
+        num_samples (int): Number of representative rows used
+        input_length (int): Export a variable-length model at this fixed
+            sequence length and a batch of one; TFLite cannot lower its
+            recurrent layers otherwise
+
+    Returns:
+        bytes: The serialized TFLite model
+    """
+    import numpy as np
+    import tensorflow as tf
+
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+    if input_length is None:
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    else:
+        # Recurrent layers only lower to builtin ops with a fully static
+        # input, so the export takes one row at a time (see TFLiteModel)
+        tokens = tf.keras.Input((input_length,), batch_size=1, dtype=model.inputs[0].dtype)
+        converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.Model(tokens, model(tokens)))
+
+    if mode == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == 'dynamic':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    elif mode == 'int8':
+        if representative_inputs is None:
+            raise ValueError("int8 quantization needs representative_inputs")
+
+        samples = np.asarray(representative_inputs)[:num_samples]
+        input_dtype = tf.as_dtype(model.inputs[0].dtype).as_numpy_dtype
+
+        def representative_dataset():
+            for row in samples:
+                yield [np.asarray(row[None], dtype=input_dtype)]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        # Keep float inputs/outputs; ops without an int8 kernel stay in float
+        converter.target_spec.supported_ops = [
+            tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+            tf.lite.OpsSet.TFLITE_BUILTINS
+        ]
+
+    return converter.convert()
+
+class TFLiteModel:
+    """
+    Callable wrapper around a TFLite interpreter for batch inference
+
+    The interpreter memory-maps the model file, so processes serving the
+    same file share its weights through the page cache. Models exported
+    with a fixed batch size are run over larger inputs in chunks of it.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        import tensorflow as tf
+
+        self.model_path = model_path
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._shape = tuple(self._input['shape'])
+        # Exported input shape; dynamic dimensions are -1 (the current
+        # shape reports them as 1)
+        self.input_signature = tuple(int(size) for size in self._input.get('shape_signature', self._shape))
+
+        # A TFLite interpreter must not be invoked concurrently
+        self._lock = threading.Lock()
+
+    def __call__(self, inputs):
+        import numpy as np
+
+        inputs = np.asarray(inputs, dtype=self._input['dtype'])
+        batch = self.input_signature[0]
+        if batch > 0 and len(inputs) != batch:
+            chunks = []
+            for start in range(0, len(inputs), batch):
+                chunk = inputs[start:start + batch]
+                padded = np.zeros((batch,) + chunk.shape[1:], dtype=chunk.dtype)
+                padded[:len(chunk)] = chunk
+                chunks.append(self(padded)[:len(chunk)])
+            return np.concatenate(chunks)
+
+        with self._lock:
+            # Batch size (and sequence length for variable-length models) may change
+            if inputs.shape != self._shape:
+                self.interpreter.resize_tensor_input(self._input['index'], inputs.shape)
+                self.interpreter.allocate_tensors()
+                self._shape = inputs.shape
+
+            self.interpreter.set_tensor(self._input['index'], inputs)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+def _training_sequences(tokenizer, texts, max_length):
+    return tokenizer.texts_to_padded(texts, max_length)
+
+def export_validator(validator, texts, modes=QUANTIZATION_MODES, model_dir=VALIDATOR_DIR):
+    """Write a TFLite file per quantization mode for a loaded DreamValidator"""
+    if not validator.loaded:
+        validator.load()
+
+    samples = _training_sequences(validator.tokenizer, texts, validator.max_sequence_length)
+    paths = {}
+    for mode in modes:
+        path = tflite_path(model_dir, 'dream_validator', mode)
+        # Convert before opening, so a failed conversion leaves no empty file behind
+        flatbuffer = convert_to_tflite(validator.model, mode, samples,
+                                       input_length=validator.max_sequence_length)
+        with open(path, 'wb') as handle:
+            handle.write(flatbuffer)
+        paths[mode] = path
+    return paths
+
+def export_generator(generator, texts, modes=QUANTIZATION_MODES, model_dir=GENERATOR_DIR):
+    """Write TFLite text encoder and generator files per quantization mode"""
+    generator._load_tokenizer()
+
+    samples = _training_sequences(generator.tokenizer, texts, generator.max_text_length)
+    # Calibrate the generator on latents the encoder actually produces
+    latents = generator._encode(samples, 'predict')
+
+    paths = {}
+    for mode in modes:
+        encoder_path = tflite_path(model_dir, 'text_encoder', mode)
+        generator_path = tflite_path(model_dir, 'generator', mode)
+        with open(encoder_path, 'wb') as handle:
+            handle.write(convert_to_tflite(generator.text_encoder, mode, samples))
+        with open(generator_path, 'wb') as handle:
+            handle.write(convert_to_tflite(generator.generator, mode, latents))
+        paths[mode] = (encoder_path, generator_path)
+    return paths
+
+def _rss_mb():
+    # Current resident set size from /proc where available, else peak RSS
+    try:
+        with open('/proc/self/statm') as handle:
+            return int(handle.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _median_ms(fn, runs):
+    fn()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2] * 1000
+
+def validator_report(texts, labels, modes=QUANTIZATION_MODES, runs=50):
+    """Accuracy, score drift, latency and memory of each validator variant"""
+    import numpy as np
+    from dream_validator.model import DreamValidator
+
+    reference = DreamValidator(inference_mode='predict').load()
+    paths = export_validator(reference, texts, modes)
+    samples = _training_sequences(reference.tokenizer, texts, reference.max_sequence_length)
+    reference_scores = reference._predict(samples)
+    single = samples[:1]
+
+    report = {'float32_keras': {
+        'accuracy': float(np.mean((reference_scores > reference.threshold) == labels)),
+        'latency_ms': _median_ms(lambda: reference._predict(single), runs),
+        'size_bytes': os.path.getsize(reference.model_path)
+    }}
+
+    for mode, path in paths.items():
+        rss_before = _rss_mb()
+        model = TFLiteModel(path)
+        scores = model(samples)[:, 0]
+        report[mode] = {
+            'accuracy': float(np.mean((scores > reference.threshold) == labels)),
+            'mean_abs_score_drift': float(np.mean(np.abs(scores - reference_scores))),
+            'decision_agreement': float(np.mean((scores > reference.threshold) ==
+                                                (reference_scores > reference.threshold))),
+            'latency_ms': _median_ms(lambda: model(single), runs),
+            'size_bytes': os.path.getsize(path),
+            'rss_delta_mb': _rss_mb() - rss_before
+        }
+    return report
+
+def generator_report(texts, modes=QUANTIZATION_MODES, runs=20):
+    """Image drift, latency and memory of each text encoder + generator variant"""
+    import numpy as np
+    from image_generator.model import DreamImageGenerator
+
+    reference = DreamImageGenerator.for_inference(inference_mode='predict')
+    paths = export_generator(reference, texts, modes)
+    samples = _training_sequences(reference.tokenizer, texts, reference.max_text_length)
+    reference_images = reference._generate(reference._encode(samples))
+    single = samples[:1]
+
+    report = {'float32_keras': {
+        'latency_ms': _median_ms(lambda: reference._generate(reference._encode(single)), runs)
+    }}
+
+    for mode, (encoder_path, generator_path) in paths.items():
+        rss_before = _rss_mb()
+        encoder = TFLiteModel(encoder_path)
+        generator = TFLiteModel(generator_path)
+        images = generator(encoder(samples))
+
+        # Images are in [-1, 1]; PSNR uses a peak-to-peak range of 2
+        mse = float(np.mean((images - reference_images) ** 2))
+        report[mode] = {
+            'mean_abs_pixel_drift': float(np.mean(np.abs(images - reference_images))),
+            'psnr_db': float(10 * np.log10(4.0 / mse)) if mse > 0 else float('inf'),
+            'latency_ms': _median_ms(lambda: generator(encoder(single)), runs),
+            'size_bytes': os.path.getsize(encoder_path) + os.path.getsize(generator_path),
+            'rss_delta_mb': _rss_mb() - rss_before
+        }
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export quantized TFLite models and compare them')
+    parser.add_argument('--modes', nargs='+', choices=QUANTIZATION_MODES, default=list(QUANTIZATION_MODES))
+    parser.add_argument('--output', default='quantization_report.json')
+    args = parser.parse_args(argv)
+
+    # Make sibling modules and model packages importable when run as a script
+    ai_models_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, ai_models_dir)
+    sys.path.append(os.path.dirname(ai_models_dir))
+
+    import numpy as np
+    from dream_validator.model import load_dream_dataset
+    from image_generator.model import download_dream_dataset
+
+    texts, labels = load_dream_dataset()
+    descriptions, _ = download_dream_dataset()
+
+    report = {
+        'validator': validator_report(texts, np.asarray(labels) > 0.5, args.modes),
+        'generator': generator_report(descriptions[:200], args.modes)
+    }
+
+    with open(args.output, 'w') as handle:
+        json.dump(report, handle, indent=2)
+    print(json.dumps(report, indent=2))
+    print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
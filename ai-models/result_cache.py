@@ -0,0 +1,138 @@
+# ai-models/result_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+def cache_key(*parts):
+    """Content address for a generation request built from its inputs"""
+    payload = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+class ImageResultCache:
+    """
+    Two-tier cache of encoded images keyed by content hash
+
+    The memory tier is an LRU bounded by item count. The optional disk tier
+    stores one file per key and evicts the least recently used files once
+    their total size exceeds max_disk_bytes. Hit, miss and eviction counters
+    are kept in self.stats.
+    """
+
+    def __init__(self, max_items=256, disk_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_items = max_items
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # key -> size in bytes, least recently used first
+        self._disk_index = OrderedDict()
+        self._disk_bytes = 0
+
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.bin'):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, name[:-len('.bin')], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + '.bin')
+
+    def get(self, key):
+        """Return the cached bytes for key, or None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return value
+
+            if self.disk_dir and key in self._disk_index:
+                try:
+                    with open(self._disk_path(key), 'rb') as handle:
+                        value = handle.read()
+                except FileNotFoundError:
+                    self._disk_bytes -= self._disk_index.pop(key)
+                else:
+                    self._disk_index.move_to_end(key)
+                    self.stats['disk_hits'] += 1
+                    self._put_memory(key, value)
+                    return value
+
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value):
+        """Store encoded bytes under key in both tiers"""
+        value = bytes(value)
+        with self._lock:
+            self._put_memory(key, value)
+            if self.disk_dir:
+                self._put_disk(key, value)
+
+    def _put_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+            self.stats['memory_evictions'] += 1
+
+    def _put_disk(self, key, value):
+        if key in self._disk_index:
+            self._disk_index.move_to_end(key)
+            return
+
+        # Write then rename so readers never see a partial file
+        path = self._disk_path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as handle:
+            handle.write(value)
+        os.replace(tmp_path, path)
+
+        self._disk_index[key] = len(value)
+        self._disk_bytes += len(value)
+
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk_index) > 1:
+            old_key, size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= size
+            self.stats['disk_evictions'] += 1
+            try:
+                os.remove(self._disk_path(old_key))
+            except FileNotFoundError:
+                pass
+
+    def hit_rate(self):
+        hits = self.stats['memory_hits'] + self.stats['disk_hits']
+        total = hits + self.stats['misses']
+        return hits / total if total else 0.0
+
+    def summary(self):
+        return dict(
+            self.stats,
+            hit_rate=self.hit_rate(),
+            memory_items=len(self._memory),
+            disk_items=len(self._disk_index),
+            disk_bytes=self._disk_bytes
+        )
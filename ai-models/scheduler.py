@@ -0,0 +1,262 @@
+# ai-models/scheduler.py
+"""
+Priority-aware scheduling of service calls by operation class.
+
+Each class of work (theme analysis, validation, image generation) gets its
+own lane: a bounded priority queue and a fixed budget of worker threads.
+A burst of multi-second generations can fill the generate lane but never
+takes a thread from validation or analysis.
+
+Within a lane lower priority numbers run first, FIFO among equals. Every
+request may carry a deadline. Queued requests whose deadline passes are
+dropped without running, and cancelled futures are skipped. Overload is
+rejected at submit time instead of queueing work that would miss its
+deadline. A request is rejected when its lane is full and nothing of lower
+priority can be shed to make room, or when the estimated queueing delay
+already exceeds its deadline.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+from instrumentation import NULL_INSTRUMENTATION
+
+class Overloaded(RuntimeError):
+    """The request was rejected (or shed from its queue) without running"""
+
+class DeadlineExceeded(TimeoutError):
+    """The request's deadline passed before it could start"""
+
+class OperationClass:
+    """Queue and worker budget for one class of work"""
+
+    def __init__(self, name, workers, max_queue, priority=0, timeout_ms=None):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        # Defaults for requests that do not set their own
+        self.priority = priority
+        self.timeout_ms = timeout_ms
+
+def default_classes(validate_workers=4, analyze_workers=2, generate_workers=2,
+                    generate_queue=16, validate_timeout_ms=2000, generate_timeout_ms=30000):
+    """
+    Lanes for the service's operation classes
+
+    Fast, latency-sensitive work gets short deadlines and its own threads;
+    generation gets a small budget and a short queue so bursts shed early.
+    """
+    return (
+        OperationClass('analyze', workers=analyze_workers, max_queue=1024, timeout_ms=1000),
+        OperationClass('validate', workers=validate_workers, max_queue=max(256, 4 * validate_workers),
+                       timeout_ms=validate_timeout_ms),
+        OperationClass('generate', workers=generate_workers, max_queue=generate_queue,
+                       timeout_ms=generate_timeout_ms),
+    )
+
+class _Lane:
+    def __init__(self, operation_class, metrics):
+        self.operation_class = operation_class
+        self.metrics = metrics
+
+        # (priority, sequence, deadline, enqueued, fn, args, future)
+        self._heap = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        # Moving average of run time, used to estimate queueing delay
+        self._service_time = None
+
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'shed': 0,
+            'expired': 0,
+            'cancelled': 0
+        }
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f'scheduler-{operation_class.name}-{i}', daemon=True)
+            for i in range(operation_class.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _estimated_wait(self):
+        if self._service_time is None:
+            return 0.0
+        return len(self._heap) / self.operation_class.workers * self._service_time
+
+    def _purge(self, now):
+        # Drop cancelled and expired entries so they stop taking queue space
+        kept = []
+        for entry in self._heap:
+            future, deadline = entry[6], entry[2]
+            if future.cancelled():
+                self.stats['cancelled'] += 1
+            elif deadline is not None and deadline <= now:
+                self._expire(future)
+            else:
+                kept.append(entry)
+        if len(kept) != len(self._heap):
+            self._heap = kept
+            heapq.heapify(self._heap)
+
+    def _expire(self, future):
+        self.stats['expired'] += 1
+        self.metrics.count('scheduler_expired', operation=self.operation_class.name)
+        if future.set_running_or_notify_cancel():
+            future.set_exception(DeadlineExceeded(
+                f"{self.operation_class.name} request expired before it could run"))
+
+    def _reject(self, future, message):
+        self.stats['rejected'] += 1
+        self.metrics.count('scheduler_rejected', operation=self.operation_class.name)
+        future.set_exception(Overloaded(message))
+        return future
+
+    def submit(self, fn, args, priority, deadline):
+        future = Future()
+        name = self.operation_class.name
+        now = time.monotonic()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("RequestScheduler is closed")
+            self.stats['submitted'] += 1
+
+            if deadline is not None and now + self._estimated_wait() > deadline:
+                return self._reject(future, f"The {name} queue cannot start this request before its deadline")
+
+            if len(self._heap) >= self.operation_class.max_queue:
+                self._purge(now)
+            if len(self._heap) >= self.operation_class.max_queue:
+                # Shed the least urgent queued request if this one outranks it
+                worst = max(range(len(self._heap)), key=lambda i: self._heap[i][:2])
+                if self._heap[worst][0] <= priority:
+                    return self._reject(future, f"The {name} queue is full")
+                shed = self._heap[worst]
+                self._heap[worst] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self.stats['shed'] += 1
+                self.metrics.count('scheduler_shed', operation=name)
+                if shed[6].set_running_or_notify_cancel():
+                    shed[6].set_exception(Overloaded(f"Shed from the {name} queue by higher-priority work"))
+
+            heapq.heappush(self._heap, (priority, next(self._sequence), deadline, now, fn, args, future))
+            self._cond.notify()
+        return future
+
+    def _next(self):
+        with self._cond:
+            while True:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return None
+
+                entry = heapq.heappop(self._heap)
+                future, deadline = entry[6], entry[2]
+                if deadline is not None and deadline <= time.monotonic():
+                    self._expire(future)
+                    continue
+                if not future.set_running_or_notify_cancel():
+                    self.stats['cancelled'] += 1
+                    continue
+                return entry
+
+    def _run(self):
+        name = self.operation_class.name
+        while True:
+            entry = self._next()
+            if entry is None:
+                return
+
+            _, _, _, enqueued, fn, args, future = entry
+            start = time.monotonic()
+            self.metrics.observe('queue_wait_seconds', start - enqueued, operation=name)
+            try:
+                result = fn(*args)
+            except Exception as e:
+                future.set_exception(e)
+                succeeded = False
+            else:
+                future.set_result(result)
+                succeeded = True
+
+            elapsed = time.monotonic() - start
+            with self._cond:
+                self.stats['completed' if succeeded else 'failed'] += 1
+                self._service_time = elapsed if self._service_time is None else \
+                    0.9 * self._service_time + 0.1 * elapsed
+
+    def status(self):
+        with self._cond:
+            return dict(self.stats,
+                        queued=len(self._heap),
+                        workers=self.operation_class.workers,
+                        estimated_wait_seconds=self._estimated_wait())
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            # Queued work is not started once the scheduler closes
+            for entry in self._heap:
+                entry[6].cancel()
+            self._heap = []
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+class RequestScheduler:
+    """
+    Run calls on per-class worker budgets with priorities and deadlines
+
+    Args:
+        classes (iterable): OperationClass per lane (default: default_classes())
+        instrumentation: Optional Instrumentation for queue waits and rejections
+    """
+
+    def __init__(self, classes=None, instrumentation=None):
+        self.metrics = instrumentation or NULL_INSTRUMENTATION
+        self._lanes = {operation_class.name: _Lane(operation_class, self.metrics)
+                       for operation_class in classes or default_classes()}
+
+    def submit(self, operation, fn, *args, priority=None, timeout_ms=None):
+        """
+        Queue fn(*args) in the lane for an operation class
+
+        Args:
+            operation (str): Operation class name, e.g. 'validate'
+            priority (int): Lower runs first (default: the class priority)
+            timeout_ms (float): Deadline from now; requests still queued at
+                the deadline are dropped (default: the class timeout)
+
+        Returns:
+            Future: Resolves to fn's result, or fails with Overloaded or
+                DeadlineExceeded; cancelling it before it starts skips the call
+        """
+        lane = self._lanes.get(operation)
+        if lane is None:
+            raise ValueError(f"Unknown operation class: {operation}")
+
+        operation_class = lane.operation_class
+        priority = operation_class.priority if priority is None else priority
+        timeout_ms = operation_class.timeout_ms if timeout_ms is None else timeout_ms
+        deadline = time.monotonic() + timeout_ms / 1000.0 if timeout_ms else None
+        return lane.submit(fn, args, priority, deadline)
+
+    def call(self, operation, fn, *args, **kwargs):
+        return self.submit(operation, fn, *args, **kwargs).result()
+
+    def status(self):
+        return {name: lane.status() for name, lane in self._lanes.items()}
+
+    def close(self):
+        for lane in self._lanes.values():
+            lane.close()
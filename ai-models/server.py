@@ -0,0 +1,401 @@
+# ai-models/server.py
+import argparse
+import asyncio
+import json
+import math
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Make sibling modules importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from inference import DreamAIService
+from worker_pool import DreamWorkerPool
+from scheduler import RequestScheduler, Overloaded, DeadlineExceeded, default_classes
+from instrumentation import Instrumentation, PrometheusSink, LogSink
+
+# Request bodies use the same field names as the Firebase callables;
+# the first field of each route is required
+ROUTES = {
+    '/validate': ('validate_dream_text', ('dreamText', 'audioUrl')),
+    '/generate': ('generate_dream_image', ('dreamText', 'style')),
+    '/analyze': ('analyze_dream_themes', ('dreamText', 'userId', 'timestamp')),
+    '/trends': ('dream_trends', ('userId', 'start', 'end', 'intervalDays')),
+    '/top-themes': ('top_dream_themes', ('userId', 'start', 'end', 'limit', 'group')),
+}
+
+REQUIRED_FIELDS = {
+    'dreamText': 'Dream text is required',
+    'userId': 'User id is required',
+}
+
+# Optional fields checked before a request is queued; null keeps the default
+NUMBER_FIELDS = ('timestamp', 'start', 'end')
+COUNT_FIELDS = ('intervalDays', 'limit')
+CHOICE_FIELDS = {
+    'group': ('themes', 'emotions'),
+}
+
+# Routes answered from journal analytics rather than the models
+ANALYTICS_ROUTES = ('/trends', '/top-themes')
+
+# Routes that need no model and are served before (or without) warm-up
+MODEL_FREE_ROUTES = ('/analyze',) + ANALYTICS_ROUTES
+
+# Scheduler lane of each route; cheap lookups share the analyze lane
+ROUTE_CLASSES = {
+    '/validate': 'validate',
+    '/generate': 'generate',
+    '/analyze': 'analyze',
+    '/trends': 'analyze',
+    '/top-themes': 'analyze',
+}
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout',
+}
+
+MAX_BODY_BYTES = 1024 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+def parse_field(field, value):
+    """Check an optional request field, raising a 400 HTTPError for a bad value"""
+    if value is None:
+        return None
+    is_number = isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    if field in NUMBER_FIELDS and not is_number:
+        raise HTTPError(400, f'{field} must be a number')
+    if field in COUNT_FIELDS:
+        if not (is_number and value == int(value) and value >= 1):
+            raise HTTPError(400, f'{field} must be a positive integer')
+        return int(value)
+    if field in CHOICE_FIELDS and value not in CHOICE_FIELDS[field]:
+        raise HTTPError(400, f"{field} must be one of {', '.join(CHOICE_FIELDS[field])}")
+    return value
+
+class DreamInferenceServer:
+    """
+    Long-lived asyncio front end for DreamAIService
+
+    Blocking TensorFlow work runs on a RequestScheduler, with separate
+    worker budgets for analysis, validation and generation so slow image
+    generation cannot hold up the fast paths. Identical requests that are
+    already in flight share one computation, and /health and /ready report
+    liveness and model readiness.
+
+    Clients may send X-Priority (lower runs first) and X-Deadline-Ms
+    headers; requests that cannot start in time get 504, and requests
+    rejected under overload get 503.
+    """
+
+    def __init__(self, service=None, max_workers=4, prometheus_sink=None, scheduler=None):
+        self.service = service or DreamAIService(micro_batching=True)
+        self.prometheus_sink = prometheus_sink
+        if scheduler is None:
+            # Each validation blocks a lane thread until its micro-batch runs,
+            # so fewer threads than max_batch_size would cap every batch
+            if getattr(self.service, 'micro_batching', False):
+                max_workers = max(max_workers, self.service.max_batch_size)
+            scheduler = RequestScheduler(default_classes(validate_workers=max_workers))
+        self.scheduler = scheduler
+        # Only used to load the models at start-up
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dream-inference')
+        self.ready = False
+        self.startup_error = None
+        self.started_at = time.time()
+
+        # (path, canonical body) -> asyncio.Future for requests in flight
+        self._in_flight = {}
+
+        self.stats = {
+            'requests': 0,
+            'coalesced': 0,
+            'errors': 0
+        }
+
+    async def warm_up(self):
+        """Load every model in the background so requests never pay start-up"""
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.service.initialize)
+            self.ready = True
+            print("Dream inference server ready")
+        except Exception as e:
+            self.startup_error = str(e)
+            print(f"Error warming up AI services: {str(e)}")
+
+    async def run_operation(self, path, payload, priority=None, timeout_ms=None):
+        method_name, fields = ROUTES[path]
+        if not isinstance(payload, dict) or not payload.get(fields[0]):
+            raise HTTPError(400, REQUIRED_FIELDS[fields[0]])
+        args = [payload[fields[0]]] + [parse_field(field, payload.get(field)) for field in fields[1:]]
+
+        key = (path, json.dumps(args, sort_keys=True))
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        method = getattr(self.service, method_name)
+        future = asyncio.wrap_future(self.scheduler.submit(
+            ROUTE_CLASSES[path], method, *args, priority=priority, timeout_ms=timeout_ms
+        ))
+        self._in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._in_flight.pop(key, None)
+
+    async def dispatch(self, method, path, body, headers=None):
+        if path == '/health':
+            return 200, {
+                'status': 'ok',
+                'ready': self.ready,
+                'uptime_seconds': time.time() - self.started_at,
+                'stats': self.stats,
+                'scheduler': self.scheduler.status()
+            }
+
+        if path == '/ready':
+            if self.ready:
+                return 200, {'ready': True}
+            return 503, {'ready': False, 'error': self.startup_error}
+
+        if path == '/metrics':
+            if self.prometheus_sink is None:
+                raise HTTPError(404, 'Metrics are not enabled')
+            return 200, self.prometheus_sink.render()
+
+        if path not in ROUTES:
+            raise HTTPError(404, f'Unknown endpoint {path}')
+        if method != 'POST':
+            raise HTTPError(405, 'Use POST')
+        if path in ANALYTICS_ROUTES and getattr(self.service, 'journal_analytics', None) is None:
+            raise HTTPError(404, 'Journal analytics are not enabled')
+        if not self.ready and path not in MODEL_FREE_ROUTES:
+            if self.startup_error:
+                raise HTTPError(503, f'Models failed to load: {self.startup_error}')
+            raise HTTPError(503, 'Models are still loading')
+
+        try:
+            payload = json.loads(body or b'{}')
+        except ValueError:
+            raise HTTPError(400, 'Request body must be JSON')
+
+        headers = headers or {}
+        try:
+            priority = int(headers['x-priority']) if 'x-priority' in headers else None
+            timeout_ms = float(headers['x-deadline-ms']) if 'x-deadline-ms' in headers else None
+        except ValueError:
+            raise HTTPError(400, 'X-Priority and X-Deadline-Ms must be numbers')
+
+        try:
+            return 200, await self.run_operation(path, payload, priority, timeout_ms)
+        except Overloaded as e:
+            raise HTTPError(503, str(e))
+        except DeadlineExceeded as e:
+            raise HTTPError(504, str(e))
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                self.stats['requests'] += 1
+
+                try:
+                    parts = request_line.decode('latin-1').split()
+                    if len(parts) != 3:
+                        raise HTTPError(400, 'Malformed request line')
+                    method, path = parts[0].upper(), parts[1].split('?', 1)[0]
+
+                    length = int(headers.get('content-length', 0) or 0)
+                    if length > MAX_BODY_BYTES:
+                        keep_alive = False
+                        raise HTTPError(413, 'Request body too large')
+                    body = await reader.readexactly(length) if length else b''
+
+                    status, result = await self.dispatch(method, path, body, headers)
+                except HTTPError as e:
+                    status, result = e.status, {'error': e.message}
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    status, result = 500, {'error': str(e)}
+
+                if isinstance(result, str):
+                    content_type = 'text/plain; version=0.0.4'
+                    payload = result.encode('utf-8')
+                else:
+                    content_type = 'application/json'
+                    payload = json.dumps(result).encode('utf-8')
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    f"\r\n".encode('latin-1') + payload
+                )
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, unix_socket=None):
+        if unix_socket:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            server = await asyncio.start_unix_server(self.handle_connection, path=unix_socket)
+            print(f"Dream inference server listening on {unix_socket}")
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port)
+            print(f"Dream inference server listening on http://{host}:{port}")
+
+        asyncio.get_running_loop().create_task(self.warm_up())
+
+        async with server:
+            await server.serve_forever()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Persistent Dream AI inference server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix-socket', help='Listen on a Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Threads for validation calls (raised to fill a --max-batch-size batch)')
+    parser.add_argument('--analyze-workers', type=int, default=2, help='Threads for theme analysis and analytics')
+    parser.add_argument('--generate-workers', type=int, default=2, help='Threads for image generation')
+    parser.add_argument('--generate-queue', type=int, default=16,
+                        help='Queued generations beyond which new ones are rejected with 503')
+    parser.add_argument('--validate-timeout-ms', type=float, default=2000,
+                        help='Default deadline for a validation to start')
+    parser.add_argument('--generate-timeout-ms', type=float, default=30000,
+                        help='Default deadline for a generation to start')
+    parser.add_argument('--processes', type=int, default=0,
+                        help='Serve from this many worker processes instead of in-process models')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--backend', default='keras',
+                        help="'keras' or a quantized TFLite backend such as 'tflite-int8'")
+    parser.add_argument('--dedup-index',
+                        help='Directory of a near-duplicate index; repeat dreams reuse earlier results')
+    parser.add_argument('--cascade', metavar='MODEL',
+                        help='Fast cascade model (cascade.py); confident texts skip the LSTM')
+    parser.add_argument('--journal-analytics', metavar='PATH',
+                        help='Keep per-user theme/emotion histories (saved to this .npz periodically '
+                             'and on exit) and serve /trends and /top-themes')
+    parser.add_argument('--journal-save-interval', type=float, default=300,
+                        help='Seconds between saves of changed journal histories (0 saves only on exit)')
+    parser.add_argument('--cascade-low', type=float, default=0.1)
+    parser.add_argument('--cascade-high', type=float, default=0.9)
+    parser.add_argument('--metrics', action='store_true',
+                        help='Record per-stage metrics and serve them on GET /metrics')
+    parser.add_argument('--metrics-log', action='store_true',
+                        help='Also log every metric as a structured JSON record')
+    args = parser.parse_args(argv)
+
+    instrumentation = Instrumentation()
+    prometheus_sink = instrumentation.add_sink(PrometheusSink()) if args.metrics else None
+    if args.metrics_log:
+        instrumentation.add_sink(LogSink())
+
+    dedup_index = None
+    if args.dedup_index:
+        if args.processes:
+            parser.error('--dedup-index cannot be shared between worker processes')
+        from dedup_index import DedupIndex
+        dedup_index = DedupIndex(args.dedup_index)
+
+    journal_analytics = None
+    if args.journal_analytics:
+        from journal_analytics import JournalAnalytics
+        journal_analytics = JournalAnalytics(path=args.journal_analytics)
+        if args.journal_save_interval > 0:
+            journal_analytics.start_autosave(args.journal_save_interval)
+
+    cascade = None
+    if args.cascade:
+        from cascade import ValidationCascade
+        cascade = ValidationCascade.load(args.cascade, args.cascade_low, args.cascade_high)
+
+    workers = args.workers
+    generate_workers = args.generate_workers
+    if args.processes:
+        # Workers record no stage metrics; the pool counts requests and restarts
+        service = DreamWorkerPool(num_workers=args.processes,
+                                  instrumentation=instrumentation,
+                                  micro_batching=True,
+                                  max_batch_size=args.max_batch_size,
+                                  max_wait_ms=args.max_wait_ms,
+                                  backend=args.backend,
+                                  cascade=cascade,
+                                  journal_analytics=journal_analytics)
+        # Scheduler threads only wait on workers; keep enough to fill every process
+        workers = max(workers, args.processes * args.max_batch_size)
+        generate_workers = max(generate_workers, args.processes)
+    else:
+        # A validation holds its lane thread until its micro-batch runs;
+        # keep enough threads to fill a whole batch
+        workers = max(workers, args.max_batch_size)
+        service = DreamAIService(micro_batching=True,
+                                 max_batch_size=args.max_batch_size,
+                                 max_wait_ms=args.max_wait_ms,
+                                 instrumentation=instrumentation,
+                                 backend=args.backend,
+                                 dedup_index=dedup_index,
+                                 cascade=cascade,
+                                 journal_analytics=journal_analytics)
+    scheduler = RequestScheduler(default_classes(workers, args.analyze_workers, generate_workers,
+                                                 args.generate_queue, args.validate_timeout_ms,
+                                                 args.generate_timeout_ms),
+                                 instrumentation=instrumentation)
+    server = DreamInferenceServer(service, prometheus_sink=prometheus_sink, scheduler=scheduler)
+
+    # Stop on SIGTERM the same way as on Ctrl-C, so state is saved on exit
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix_socket))
+    except KeyboardInterrupt:
+        print("Dream inference server stopped")
+    finally:
+        scheduler.close()
+        if args.processes:
+            service.close()
+        if journal_analytics is not None:
+            journal_analytics.stop_autosave()
+            journal_analytics.save()
+
+if __name__ == "__main__":
+    main()
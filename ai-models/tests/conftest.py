@@ -0,0 +1,6 @@
+# ai-models/tests/conftest.py
+import os
+import sys
+
+# The ai-models helpers are imported as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,59 @@
+import pytest
+
+from batching import MicroBatcher
+
+def test_concurrent_items_share_one_batch():
+    seen = []
+
+    def double(items):
+        seen.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(double, max_batch_size=4, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(4)]
+    assert [future.result(timeout=5) for future in futures] == [0, 2, 4, 6]
+    batcher.close()
+
+    assert seen == [[0, 1, 2, 3]]
+    assert batcher.stats == {'batches': 1, 'items': 4, 'largest_batch': 4}
+
+def test_batches_are_capped_at_max_size():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=2, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=5) for future in futures] == list(range(5))
+    batcher.close()
+
+    assert batcher.stats['largest_batch'] == 2
+    assert batcher.stats['batches'] == 3
+
+def test_short_result_list_fails_every_item():
+    batcher = MicroBatcher(lambda items: items[:-1], max_batch_size=3, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="2 results for 3 items"):
+            future.result(timeout=5)
+    batcher.close()
+
+def test_error_midway_through_results_fails_every_item():
+    def explode_midway(items):
+        for item in items:
+            if item == 1:
+                raise KeyError(item)
+            yield item
+
+    batcher = MicroBatcher(explode_midway, max_batch_size=3, max_wait_ms=500)
+    futures = [batcher.submit(i) for i in range(3)]
+    for future in futures:
+        with pytest.raises(KeyError):
+            future.result(timeout=5)
+
+    # The worker thread survives a failing batch
+    batcher.batch_fn = lambda items: items
+    assert batcher.submit('next').result(timeout=5) == 'next'
+    batcher.close()
+
+def test_submit_after_close_raises():
+    batcher = MicroBatcher(lambda items: items)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(1)
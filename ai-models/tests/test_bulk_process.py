@@ -0,0 +1,101 @@
+import argparse
+import csv
+import json
+
+import pytest
+
+from bulk_process import run
+
+class FakeService:
+    """Scores each text by its length and fails on the call numbered fail_on"""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.seen = []
+
+    def validate_dreams_batch(self, texts, audio_urls=None):
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise RuntimeError("worker crashed")
+        self.seen.extend(texts)
+        return [{'authenticity_score': len(text) / 100} for text in texts]
+
+    def analyze_dream_themes(self, text):
+        return {'themes': [], 'emotions': [], 'significance': '', 'dream_text': text}
+
+DREAMS = [f"I dreamed about door number {i}" for i in range(7)]
+
+def make_args(tmp_path, input_path, **overrides):
+    args = dict(input=str(input_path), output=str(tmp_path / 'results.jsonl'), format=None,
+                operations=['validate', 'analyze'], batch_size=3, text_field='dreamText',
+                audio_field='audioUrl', id_field='id', backend='keras', checkpoint=None, restart=False)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+def write_jsonl(path):
+    with open(path, 'w') as handle:
+        for i, text in enumerate(DREAMS):
+            handle.write(json.dumps({'id': f'd{i}', 'dreamText': text}) + '\n')
+            if i == 3:
+                handle.write('\n')
+    return path
+
+def write_csv(path):
+    with open(path, 'w', newline='') as handle:
+        writer = csv.DictWriter(handle, fieldnames=['id', 'dreamText'])
+        writer.writeheader()
+        for i, text in enumerate(DREAMS):
+            # A quoted newline inside a field
+            writer.writerow({'id': f'd{i}', 'dreamText': text.replace('about', 'about\n')})
+    return path
+
+def read_results(path):
+    with open(path) as handle:
+        return [json.loads(line) for line in handle]
+
+@pytest.mark.parametrize('writer, name', [(write_jsonl, 'dreams.jsonl'), (write_csv, 'dreams.csv')])
+def test_resume_after_a_crash_matches_an_uninterrupted_run(tmp_path, writer, name):
+    input_path = writer(tmp_path / name)
+
+    expected_dir = tmp_path / 'clean'
+    expected_dir.mkdir()
+    run(make_args(expected_dir, input_path), FakeService())
+    expected = read_results(expected_dir / 'results.jsonl')
+    assert [record['id'] for record in expected] == [f'd{i}' for i in range(7)]
+
+    args = make_args(tmp_path, input_path)
+    with pytest.raises(RuntimeError):
+        run(args, FakeService(fail_on=2))
+    # Simulate a crash part-way through writing the next batch
+    with open(args.output, 'a') as handle:
+        handle.write('{"id": "d3", "valid')
+
+    service = FakeService()
+    state = run(args, service)
+
+    assert read_results(args.output) == expected
+    assert len(service.seen) == 4
+    assert state['rows'] == 7 and state['completed']
+
+def test_checkpoint_for_another_input_is_refused(tmp_path):
+    first = write_jsonl(tmp_path / 'first.jsonl')
+    second = write_jsonl(tmp_path / 'second.jsonl')
+    run(make_args(tmp_path, first), FakeService())
+
+    with pytest.raises(ValueError):
+        run(make_args(tmp_path, second), FakeService())
+    state = run(make_args(tmp_path, second, restart=True), FakeService())
+    assert state['rows'] == 7
+
+def test_rows_without_text_are_reported(tmp_path):
+    input_path = tmp_path / 'dreams.jsonl'
+    input_path.write_text(json.dumps({'id': 'a', 'dreamText': '  '}) + '\n' +
+                          json.dumps({'id': 'b', 'dreamText': 'I was flying'}) + '\n')
+    service = FakeService()
+    run(make_args(tmp_path, input_path), service)
+
+    first, second = read_results(tmp_path / 'results.jsonl')
+    assert first == {'id': 'a', 'error': 'Dream text is required'}
+    assert second['validation'] == {'authenticity_score': 0.12}
+    assert service.seen == ['I was flying']
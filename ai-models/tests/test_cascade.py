@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from cascade import HashedNgramClassifier, ValidationCascade, evaluate_cascade
+
+class FakeFastModel:
+    def __init__(self, scores):
+        self.scores = scores
+
+    def predict_proba(self, texts):
+        return np.asarray([self.scores[text] for text in texts])
+
+class FakeValidator:
+    threshold = 0.5
+
+    def __init__(self, scores=None):
+        self.scores = scores or {}
+        self.batches = []
+
+    def _result(self, text, score):
+        return {'dream_text': text, 'authenticity_score': float(score), 'model': 'fast'}
+
+    def validate_batch(self, texts):
+        self.batches.append(list(texts))
+        return [{'dream_text': text, 'authenticity_score': self.scores.get(text, 0.5), 'model': 'full'}
+                for text in texts]
+
+SCORES = {'fake': 0.02, 'low edge': 0.1, 'unsure': 0.5, 'just inside': 0.89, 'high edge': 0.9, 'real': 0.99}
+
+def test_confident_scores_exit_early_and_the_rest_reach_the_validator():
+    cascade = ValidationCascade(FakeFastModel(SCORES), low=0.1, high=0.9)
+    validator = FakeValidator()
+    texts = list(SCORES)
+    results = cascade.validate_batch(texts, validator)
+
+    # Thresholds are inclusive; results keep the input order
+    assert validator.batches == [['unsure', 'just inside']]
+    assert [result['dream_text'] for result in results] == texts
+    assert [result['model'] for result in results] == ['fast', 'fast', 'full', 'full', 'fast', 'fast']
+    assert results[0]['authenticity_score'] == pytest.approx(0.02)
+    assert cascade.stats == {'requests': 6, 'early_exits': 4}
+    assert cascade.early_exit_rate() == pytest.approx(4 / 6)
+
+def test_all_confident_batch_never_calls_the_validator():
+    cascade = ValidationCascade(FakeFastModel(SCORES))
+    validator = FakeValidator()
+    cascade.validate_batch(['fake', 'real'], validator)
+
+    assert validator.batches == []
+
+def test_equal_thresholds_send_only_that_exact_score_early():
+    cascade = ValidationCascade(FakeFastModel(SCORES), low=0.5, high=0.5)
+    _, early = cascade.score(list(SCORES))
+
+    assert early.all()
+
+def test_thresholds_must_be_ordered():
+    with pytest.raises(ValueError):
+        ValidationCascade(FakeFastModel(SCORES), low=0.9, high=0.1)
+
+def test_evaluate_cascade_compares_against_the_full_validator():
+    validator = FakeValidator({'unsure': 0.8, 'just inside': 0.3})
+    texts = ['fake', 'unsure', 'just inside', 'real']
+    labels = [0, 1, 0, 1]
+    report = evaluate_cascade(FakeFastModel(SCORES), validator, texts, labels, [(0.1, 0.9), (0.0, 1.0)])
+
+    strict, none_early = report['cascades']
+    assert strict['early_exit_rate'] == 0.5
+    assert strict['accuracy'] == 1.0
+    assert strict['early_exit_accuracy'] == 1.0
+    assert none_early['early_exit_rate'] == 0.0
+    assert none_early['early_exit_accuracy'] is None
+    assert none_early['agreement_with_full_model'] == 1.0
+
+def test_hashed_classifier_learns_and_scores_empty_texts():
+    texts = ['I dreamed I was flying', 'I dreamed of the sea', 'Buy 100 shares now', 'Call 555 today']
+    model = HashedNgramClassifier(n_features=2 ** 12).fit(texts, [1, 1, 0, 0])
+    scores = model.predict_proba(texts + [''])
+
+    assert (scores[:2] > 0.5).all()
+    assert (scores[2:4] < 0.5).all()
+    assert 0.0 < scores[4] < 1.0
@@ -0,0 +1,93 @@
+import pytest
+
+from dedup_index import DedupIndex
+
+DREAMS = [
+    "I was lost in a maze and I could not find the exit.",
+    "I was swimming in a lake and I could breathe underwater.",
+    "I was flying over the ocean and I could see whales below me.",
+    "My teeth started falling out one by one while I was giving a presentation at work.",
+    "I was back in high school and realized I had forgotten to study for the final exam.",
+    "A huge black dog chased me through an empty parking garage until I woke up.",
+    "My grandmother was cooking in her old kitchen and told me to fix the broken clock.",
+    "I missed my train and the station kept changing into a shopping mall full of strangers.",
+    "The house was flooding slowly and my cat was floating on a wooden door.",
+    "I found a hidden room behind the bookshelf filled with paintings of my childhood friends.",
+    "I was driving a car with no brakes down a steep mountain road at night.",
+    "My brother and I were building a treehouse that kept growing into the clouds.",
+    "Snow fell inside the library while everyone kept reading as if nothing had happened.",
+    "I could talk to birds and they warned me about a storm coming over the hills.",
+    "I was on stage to sing but forgot every lyric and the audience started laughing.",
+]
+
+# One word of each dream changed
+EDITED = [
+    "I was lost in a maze and I could not find the door.",
+    "I was swimming in a river and I could breathe underwater.",
+    "I was flying over the sea and I could see whales below me.",
+    "My teeth started falling out one by one while I was giving a speech at work.",
+    "I was back in middle school and realized I had forgotten to study for the final exam.",
+    "A huge black wolf chased me through an empty parking garage until I woke up.",
+    "My grandmother was baking in her old kitchen and told me to fix the broken clock.",
+    "I missed my bus and the station kept changing into a shopping mall full of strangers.",
+    "The house was flooding slowly and my dog was floating on a wooden door.",
+    "I found a secret room behind the bookshelf filled with paintings of my childhood friends.",
+    "I was driving a truck with no brakes down a steep mountain road at night.",
+    "My sister and I were building a treehouse that kept growing into the clouds.",
+    "Snow fell inside the museum while everyone kept reading as if nothing had happened.",
+    "I could talk to crows and they warned me about a storm coming over the hills.",
+    "I was on stage to dance but forgot every lyric and the audience started laughing.",
+]
+
+# Journal entries of two sentences, and the same with one word changed
+ENTRIES = [DREAMS[i] + ' ' + DREAMS[(i + 7) % len(DREAMS)] for i in range(len(DREAMS))]
+EDITED_ENTRIES = [EDITED[i] + ' ' + DREAMS[(i + 7) % len(DREAMS)] for i in range(len(DREAMS))]
+
+def _index(dreams, **kwargs):
+    index = DedupIndex(**kwargs)
+    for i, dream in enumerate(dreams):
+        index.add(dream, {'id': i})
+    return index
+
+def test_lookup_finds_entries_with_one_word_changed():
+    index = _index(ENTRIES)
+    found = [(index.lookup(edited) or {}).get('id') for edited in EDITED_ENTRIES]
+    assert all(entry_id in (i, None) for i, entry_id in enumerate(found))
+    assert sum(entry_id is not None for entry_id in found) >= 0.7 * len(ENTRIES)
+
+def test_edited_short_dreams_never_match_another_dream():
+    index = _index(DREAMS)
+    found = [(index.lookup(edited) or {}).get('id') for edited in EDITED]
+    assert all(entry_id in (i, None) for i, entry_id in enumerate(found))
+
+def test_exact_resubmissions_match():
+    index = _index(DREAMS)
+    assert [index.lookup(dream.upper()) for dream in DREAMS] == [{'id': i} for i in range(len(DREAMS))]
+
+def test_unrelated_short_dreams_are_not_reused():
+    index = _index(DREAMS[:1])
+    assert index.lookup(DREAMS[1]) is None
+    assert index.lookup(DREAMS[2]) is None
+
+def test_no_dream_matches_another():
+    for i, dream in enumerate(DREAMS):
+        index = _index(DREAMS[:i] + DREAMS[i + 1:])
+        assert index.lookup(dream) is None
+
+def test_unmerged_inserts_are_found():
+    index = _index(ENTRIES, merge_every=4)
+    assert index.lookup(EDITED_ENTRIES[-1]) == {'id': len(ENTRIES) - 1}
+
+def test_persisted_index_is_reopened(tmp_path):
+    index = _index(ENTRIES, path=str(tmp_path))
+    index.close()
+    reopened = DedupIndex(str(tmp_path))
+    assert len(reopened) == len(ENTRIES)
+    assert reopened.lookup(EDITED_ENTRIES[0]) == {'id': 0}
+    reopened.close()
+
+def test_max_distance_is_bounded():
+    with pytest.raises(ValueError):
+        DedupIndex(max_distance=16)
+    with pytest.raises(ValueError):
+        DedupIndex().lookup('a dream', max_distance=64)
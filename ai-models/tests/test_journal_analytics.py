@@ -0,0 +1,86 @@
+# ai-models/tests/test_journal_analytics.py
+import os
+import time
+
+import pytest
+
+from journal_analytics import JournalAnalytics, SECONDS_PER_DAY
+
+def analysis(*themes):
+    return {'themes': [{'theme': theme, 'relevance': 1.0} for theme in themes], 'emotions': []}
+
+def make_journal():
+    journal = JournalAnalytics()
+    journal.record('user', analysis('flying'), 3 * SECONDS_PER_DAY + 60)
+    journal.record('user', analysis('water'), 9 * SECONDS_PER_DAY)
+    return journal
+
+def test_windows_align_to_requested_start():
+    trends = make_journal().trends('user', start=0, end=21 * SECONDS_PER_DAY, interval_days=7)
+
+    # The window after the last dream is dropped
+    assert trends['window_starts'] == [0, 7 * SECONDS_PER_DAY]
+    assert trends['dreams'] == [1, 1]
+    assert trends['themes']['flying'] == [1, 0]
+    assert trends['themes']['water'] == [0, 1]
+
+def test_windows_default_to_history_range():
+    trends = make_journal().trends('user', interval_days=7)
+
+    assert trends['window_starts'] == [3 * SECONDS_PER_DAY]
+    assert trends['dreams'] == [2]
+
+def test_range_is_clamped_to_history_on_the_start_grid():
+    trends = make_journal().trends('user', start=-70 * SECONDS_PER_DAY, end=1e15, interval_days=5)
+
+    assert trends['window_starts'] == [0, 5 * SECONDS_PER_DAY]
+    assert trends['dreams'] == [1, 1]
+
+def test_long_ranges_keep_the_latest_windows():
+    journal = JournalAnalytics(max_windows=3)
+    for day in range(10):
+        journal.record('user', analysis('flying'), day * SECONDS_PER_DAY)
+    trends = journal.trends('user', start=0, interval_days=2)
+
+    assert trends['window_starts'] == [4 * SECONDS_PER_DAY, 6 * SECONDS_PER_DAY, 8 * SECONDS_PER_DAY]
+    assert trends['dreams'] == [2, 2, 2]
+
+def test_unknown_user_gets_no_windows():
+    trends = JournalAnalytics().trends('nobody', start=0, end=14 * SECONDS_PER_DAY, interval_days=7)
+
+    assert trends['window_starts'] == []
+    assert trends['dreams'] == []
+    assert trends['themes']['flying'] == []
+
+def test_interval_must_be_a_positive_integer():
+    journal = make_journal()
+    for interval_days in (0, -7, 1.5, '7', True):
+        with pytest.raises(ValueError):
+            journal.trends('user', interval_days=interval_days)
+
+def test_backfill_matches_incremental_records():
+    timestamps = [day * SECONDS_PER_DAY for day in (40, 2, 17, 2, 90)]
+    analyses = [analysis('flying'), analysis('water', 'chase'), analysis('flying'),
+                analysis('work'), analysis('death')]
+
+    incremental = JournalAnalytics()
+    for item, timestamp in zip(analyses, timestamps):
+        incremental.record('user', item, timestamp)
+    bulk = JournalAnalytics()
+    bulk.backfill('user', analyses, timestamps)
+
+    assert bulk.trends('user', interval_days=30) == incremental.trends('user', interval_days=30)
+    assert bulk.top_themes('user') == incremental.top_themes('user')
+
+def test_autosave_writes_changed_histories(tmp_path):
+    path = str(tmp_path / 'journal.npz')
+    journal = make_journal()
+    journal.start_autosave(0.01, path)
+    try:
+        deadline = time.monotonic() + 5
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        journal.stop_autosave()
+
+    assert JournalAnalytics(path=path).trends('user', interval_days=7)['dreams'] == [2]
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from length_buckets import bucket_boundaries, group_by_bucket, run_bucketed, sequence_lengths
+
+def padded_rows(lengths, width=8):
+    padded = np.zeros((len(lengths), width), dtype=np.int32)
+    for i, length in enumerate(lengths):
+        padded[i, :length] = np.arange(1, length + 1) + 10 * i
+    return padded
+
+def test_boundaries_end_with_the_padded_length():
+    assert bucket_boundaries(100) == [16, 32, 64, 100]
+    assert bucket_boundaries(20) == [16, 20]
+    assert bucket_boundaries(16) == [16]
+
+def test_lengths_count_up_to_the_last_token():
+    padded = np.array([[3, 0, 5, 0], [0, 0, 0, 0], [1, 2, 3, 4]])
+    assert sequence_lengths(padded).tolist() == [3, 0, 4]
+
+def test_rows_are_grouped_into_the_smallest_bucket_that_fits():
+    padded = padded_rows([1, 7, 2, 4, 8, 0])
+    groups = {length: rows.tolist() for length, rows in group_by_bucket(padded, [2, 4, 8])}
+    assert groups == {2: [0, 2, 5], 4: [3], 8: [1, 4]}
+
+def test_outputs_come_back_in_input_order():
+    padded = padded_rows([5, 1, 8, 2, 3, 7, 0])
+    widths = []
+
+    def row_sums(batch):
+        widths.append(batch.shape[1])
+        # Two outputs per row, so the trailing output shape is kept too
+        return np.stack([batch.sum(axis=1), np.full(len(batch), batch.shape[1])], axis=1)
+
+    output = run_bucketed(padded, [2, 4, 8], row_sums)
+
+    assert sorted(widths) == [2, 4, 8]
+    np.testing.assert_array_equal(output[:, 0], padded.sum(axis=1))
+    assert output[:, 1].tolist() == [8, 2, 8, 2, 4, 8, 2]
+
+def test_empty_batch_is_passed_through():
+    output = run_bucketed(np.zeros((0, 8), dtype=np.int32), [4, 8], lambda batch: batch.sum(axis=1))
+    assert output.shape == (0,)
+
+def test_dataset_batches_are_padded_to_their_longest_row():
+    tf = pytest.importorskip('tensorflow')
+    from length_buckets import bucket_dataset
+
+    padded = padded_rows([1, 2, 7, 3, 8, 2])
+    dataset = tf.data.Dataset.from_tensor_slices((padded, np.arange(len(padded))))
+    batches = [(tokens.numpy(), ids.numpy()) for tokens, ids in
+               bucket_dataset(dataset, [2, 4, 8], batch_size=8)]
+
+    assert sorted(ids for _, batch_ids in batches for ids in batch_ids.tolist()) == list(range(6))
+    for tokens, ids in batches:
+        np.testing.assert_array_equal(tokens, padded[ids, :tokens.shape[1]])
+        assert sequence_lengths(padded[ids]).max() == tokens.shape[1]
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from pair_dataset import PairDataset, build_pair_dataset, normalize_images
+from vocab import CompactTokenizer
+
+TEXTS = [f"a {color} door in the sea" for color in
+         ('red', 'blue', 'green', 'gold', 'grey', 'white', 'black')]
+
+def pairs():
+    # Each image is filled with its row number so rows can be matched up
+    return [(text, np.full((8, 8, 3), i, dtype=np.uint8)) for i, text in enumerate(TEXTS)]
+
+@pytest.fixture
+def dataset(tmp_path):
+    tokenizer = CompactTokenizer.fit(TEXTS)
+    manifest = build_pair_dataset(pairs(), str(tmp_path), tokenizer, image_size=8, max_length=6,
+                                  shard_size=3, workers=2)
+    assert manifest['count'] == 7
+    assert [shard['count'] for shard in manifest['shards']] == [3, 3, 1]
+    return PairDataset(str(tmp_path)), tokenizer
+
+def test_every_pair_is_read_back_once(dataset):
+    data, tokenizer = dataset
+    tokens, images = zip(*data.iter_chunks(chunk_size=2, seed=0))
+    tokens, images = np.concatenate(tokens), np.concatenate(images)
+
+    rows = images[:, 0, 0, 0]
+    assert sorted(rows.tolist()) == list(range(7))
+    expected = tokenizer.texts_to_padded(TEXTS, 6)
+    np.testing.assert_array_equal(tokens, expected[rows])
+
+def test_shuffled_block_order_depends_only_on_the_seed(dataset):
+    data, _ = dataset
+
+    def order(seed):
+        return [int(images[0, 0, 0, 0]) for _, images in data.iter_chunks(chunk_size=2, seed=seed)]
+
+    assert order(1) == order(1)
+    assert sorted(order(1)) == [0, 2, 3, 5, 6]
+    assert [int(images[0, 0, 0, 0]) for _, images in data.iter_chunks(2, shuffle=False)] == [0, 2, 3, 5, 6]
+
+def test_images_of_another_size_are_resized(tmp_path):
+    images = [(text, np.zeros((16, 12, 3), dtype=np.uint8)) for text in TEXTS[:2]]
+    build_pair_dataset(images, str(tmp_path), CompactTokenizer.fit(TEXTS), image_size=8,
+                       max_length=6, workers=1)
+    _, pixels = next(PairDataset(str(tmp_path)).iter_chunks(shuffle=False))
+
+    assert pixels.shape == (2, 8, 8, 3)
+    assert normalize_images(pixels).min() == -1.0
+
+def test_a_build_without_a_manifest_is_not_loaded(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        PairDataset(str(tmp_path))
@@ -0,0 +1,60 @@
+import os
+
+from result_cache import ImageResultCache, cache_key
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ImageResultCache(max_items=2)
+    cache.put('a', b'A')
+    cache.put('b', b'B')
+    assert cache.get('a') == b'A'
+    cache.put('c', b'C')
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'A'
+    assert cache.get('c') == b'C'
+    assert cache.stats['memory_evictions'] == 1
+    assert cache.stats['misses'] == 1
+
+def test_disk_tier_serves_items_evicted_from_memory(tmp_path):
+    cache = ImageResultCache(max_items=1, disk_dir=str(tmp_path))
+    cache.put('a', b'A')
+    cache.put('b', b'B')
+
+    assert cache.get('a') == b'A'
+    assert cache.stats['disk_hits'] == 1
+    # The disk hit was promoted back into memory
+    assert cache.get('a') == b'A'
+    assert cache.stats['memory_hits'] == 1
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    ImageResultCache(disk_dir=str(tmp_path)).put('a', b'image bytes')
+    reopened = ImageResultCache(disk_dir=str(tmp_path))
+
+    assert reopened.get('a') == b'image bytes'
+    assert reopened.summary()['disk_bytes'] == len(b'image bytes')
+
+def test_disk_tier_evicts_least_recently_used_past_its_budget(tmp_path):
+    cache = ImageResultCache(max_items=0, disk_dir=str(tmp_path), max_disk_bytes=20)
+    cache.put('a', b'x' * 8)
+    cache.put('b', b'y' * 8)
+    assert cache.get('a') == b'x' * 8
+    cache.put('c', b'z' * 8)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == b'x' * 8
+    assert sorted(os.listdir(tmp_path)) == ['a.bin', 'c.bin']
+    assert cache.stats['disk_evictions'] == 1
+
+def test_missing_disk_file_counts_as_a_miss(tmp_path):
+    cache = ImageResultCache(max_items=0, disk_dir=str(tmp_path))
+    cache.put('a', b'A')
+    os.remove(tmp_path / 'a.bin')
+
+    assert cache.get('a') is None
+    assert cache.summary()['disk_items'] == 0
+
+def test_cache_key_depends_on_every_part():
+    key = cache_key('a dream', 'surreal', 'v1', 7, 'PNG')
+    assert key == cache_key('a dream', 'surreal', 'v1', 7, 'PNG')
+    assert key != cache_key('a dream', 'surreal', 'v2', 7, 'PNG')
+    assert key != cache_key('a dream', 'surreal', 'v1', 8, 'PNG')
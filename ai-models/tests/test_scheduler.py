@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from scheduler import DeadlineExceeded, OperationClass, Overloaded, RequestScheduler
+
+@pytest.fixture
+def blocked():
+    """A one-thread lane whose worker is held until release() is called"""
+    scheduler = RequestScheduler([OperationClass('work', workers=1, max_queue=3)])
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait(5)
+
+    scheduler.submit('work', hold)
+    started.wait(5)
+    yield scheduler, gate.set
+    gate.set()
+    scheduler.close()
+
+def test_lower_priority_numbers_run_first(blocked):
+    scheduler, release = blocked
+    ran = []
+    futures = [scheduler.submit('work', ran.append, name, priority=priority)
+               for name, priority in (('low', 5), ('high', 1), ('middle', 3))]
+    release()
+
+    for future in futures:
+        future.result(timeout=5)
+    assert ran == ['high', 'middle', 'low']
+
+def test_equal_priorities_run_in_submission_order(blocked):
+    scheduler, release = blocked
+    ran = []
+    futures = [scheduler.submit('work', ran.append, i) for i in range(3)]
+    release()
+
+    for future in futures:
+        future.result(timeout=5)
+    assert ran == [0, 1, 2]
+
+def test_full_queue_sheds_less_urgent_work(blocked):
+    scheduler, release = blocked
+    queued = [scheduler.submit('work', str, i, priority=5) for i in range(3)]
+
+    urgent = scheduler.submit('work', str, 'urgent', priority=1)
+    with pytest.raises(Overloaded, match='Shed'):
+        queued[-1].result(timeout=5)
+
+    # Nothing queued is less urgent than this one, so it is rejected itself
+    rejected = scheduler.submit('work', str, 'late', priority=5)
+    with pytest.raises(Overloaded, match='full'):
+        rejected.result(timeout=5)
+
+    release()
+    assert urgent.result(timeout=5) == 'urgent'
+    assert [future.result(timeout=5) for future in queued[:2]] == ['0', '1']
+
+    status = scheduler.status()['work']
+    assert status['shed'] == 1
+    assert status['rejected'] == 1
+
+def test_queued_requests_expire_at_their_deadline(blocked):
+    scheduler, release = blocked
+    calls = []
+    expiring = scheduler.submit('work', calls.append, 'expired', timeout_ms=20)
+    patient = scheduler.submit('work', calls.append, 'patient', timeout_ms=5000)
+    time.sleep(0.05)
+    release()
+
+    with pytest.raises(DeadlineExceeded):
+        expiring.result(timeout=5)
+    patient.result(timeout=5)
+    assert calls == ['patient']
+    assert scheduler.status()['work']['expired'] == 1
+
+def test_cancelled_requests_are_skipped(blocked):
+    scheduler, release = blocked
+    calls = []
+    cancelled = scheduler.submit('work', calls.append, 'cancelled')
+    kept = scheduler.submit('work', calls.append, 'kept')
+    assert cancelled.cancel()
+    release()
+
+    kept.result(timeout=5)
+    assert calls == ['kept']
+
+def test_unknown_operation_class():
+    scheduler = RequestScheduler([OperationClass('work', workers=1, max_queue=1)])
+    try:
+        with pytest.raises(ValueError):
+            scheduler.submit('other', str)
+    finally:
+        scheduler.close()
@@ -0,0 +1,46 @@
+import asyncio
+import json
+
+import pytest
+
+from journal_analytics import JournalAnalytics, SECONDS_PER_DAY
+from server import DreamInferenceServer, HTTPError
+from worker_pool import DreamWorkerPool
+
+@pytest.fixture
+def server():
+    # A pool that is never initialized answers analysis without any model
+    journal = JournalAnalytics()
+    pool = DreamWorkerPool(num_workers=1, journal_analytics=journal)
+    pool.analyze_dream_themes("I was flying", user_id='u1', timestamp=3 * SECONDS_PER_DAY)
+    server = DreamInferenceServer(pool)
+    yield server
+    server.scheduler.close()
+
+def post(server, path, payload):
+    return asyncio.run(server.dispatch('POST', path, json.dumps(payload).encode('utf-8')))
+
+def test_trends_accepts_whole_number_intervals(server):
+    status, result = post(server, '/trends', {'userId': 'u1', 'intervalDays': 7.0})
+
+    assert status == 200
+    assert result['interval_days'] == 7
+    assert result['dreams'] == [1]
+
+@pytest.mark.parametrize('payload', [
+    {'intervalDays': 'seven'},
+    {'intervalDays': 0},
+    {'intervalDays': 2.5},
+    {'intervalDays': True},
+    {'start': 'yesterday'},
+    {'end': [1]},
+])
+def test_trends_rejects_bad_fields(server, payload):
+    with pytest.raises(HTTPError) as error:
+        post(server, '/trends', dict(payload, userId='u1'))
+    assert error.value.status == 400
+
+def test_top_themes_rejects_unknown_group(server):
+    with pytest.raises(HTTPError) as error:
+        post(server, '/top-themes', {'userId': 'u1', 'group': 'colors'})
+    assert error.value.status == 400
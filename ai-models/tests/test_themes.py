@@ -0,0 +1,14 @@
+from themes import KeywordMatcher, default_matcher
+
+def test_possessives_match_their_noun():
+    matches = default_matcher().match("My mother's house stood by the ocean's edge")
+    assert matches['themes'] == {'water': 1, 'family': 1}
+
+def test_possessive_keywords_and_phrases():
+    matcher = KeywordMatcher({'places': {'home': ["grandmother's house"]}})
+    assert matcher.match("I was back at my grandmother's house") == {'places': {'home': 1}}
+    assert matcher.match("I was back at my grandmother house") == {'places': {'home': 1}}
+    assert matcher.match("Grandmother was in a house") == {'places': {}}
+
+def test_keywords_match_whole_words_only():
+    assert default_matcher().match("I sat on a chair")['themes'] == {}
@@ -0,0 +1,96 @@
+import queue
+import threading
+
+import worker_pool
+from journal_analytics import JournalAnalytics
+from worker_pool import DreamWorkerPool, _expected_cost
+
+def test_analysis_runs_without_starting_workers():
+    pool = DreamWorkerPool(num_workers=2, journal_analytics=JournalAnalytics())
+    result = pool.analyze_dream_themes("I was flying over the ocean", user_id='u1', timestamp=0)
+
+    assert {theme['theme'] for theme in result['themes']} >= {'flying', 'water'}
+    assert pool.top_dream_themes('u1')[0]['theme'] == 'flying'
+    assert not pool.initialized
+    assert pool._workers == {}
+
+def test_expected_cost_scales_with_batch_and_variations():
+    assert _expected_cost('validate_dream_text', ("a dream",)) == 1.0
+    assert _expected_cost('validate_dreams_batch', (["a", "b", "c"],)) == 3.0
+    assert _expected_cost('generate_dream_images', (["a", "b"], ['surreal', 'vivid'], 2)) == 200.0
+
+class FakeService:
+    """Validations meet at a barrier, so they only finish if run concurrently"""
+
+    barrier = threading.Barrier(2, timeout=5)
+    validated = threading.Event()
+
+    def __init__(self, **kwargs):
+        pass
+
+    def initialize(self):
+        pass
+
+    def validate_dream_text(self, dream_text, audio_url=None):
+        self.barrier.wait()
+        self.validated.set()
+        return dream_text
+
+    def generate_dream_image(self, dream_text, style=None, seed=None):
+        # Finishes only once a validation queued after it has run
+        if not self.validated.wait(5):
+            raise TimeoutError("generation blocked the validations")
+        return 'image'
+
+def test_worker_runs_requests_concurrently(monkeypatch):
+    monkeypatch.setattr(worker_pool, 'DreamAIService', FakeService)
+    tasks, results = queue.Queue(), queue.Queue()
+    worker = threading.Thread(target=worker_pool._worker_main,
+                              args=(0, {}, None, 4, tasks, results))
+    worker.start()
+    tasks.put((1, 'generate_dream_image', ("a dream",), {}))
+    tasks.put((2, 'validate_dream_text', ("first",), {}))
+    tasks.put((3, 'validate_dream_text', ("second",), {}))
+    tasks.put(None)
+    worker.join(10)
+
+    messages = [results.get(timeout=1) for _ in range(4)]
+    assert messages[0][0] == 'ready'
+    assert sorted((request_id, value) for kind, _, request_id, value in messages[1:]) == [
+        (1, 'image'), (2, 'first'), (3, 'second')]
+
+def iter_tasks(worker):
+    tasks = []
+    while not worker.tasks.empty():
+        tasks.append(worker.tasks.get_nowait())
+    return tasks
+
+def fake_pool(num_workers=2):
+    pool = DreamWorkerPool(num_workers=num_workers)
+    pool._workers = {i: worker_pool._Worker(i, None, queue.Queue()) for i in range(num_workers)}
+    for worker in pool._workers.values():
+        worker.ready = True
+    pool.initialized = True
+    return pool
+
+def test_requests_go_to_the_worker_with_the_least_expected_work():
+    pool = fake_pool()
+    pool.submit('generate_dream_image', "a dream")
+    for i in range(3):
+        pool.submit('validate_dream_text', f"dream {i}")
+
+    first, second = pool._workers.values()
+    assert [task[1] for task in iter_tasks(first)] == ['generate_dream_image']
+    assert [task[1] for task in iter_tasks(second)] == ['validate_dream_text'] * 3
+    assert (first.load, second.load) == (25.0, 3.0)
+
+def test_ready_workers_are_preferred_and_results_release_load():
+    pool = fake_pool()
+    pool._workers[0].ready = False
+    future = pool.submit('validate_dream_text', "a dream")
+    request_id = iter_tasks(pool._workers[1])[0][0]
+
+    request, ok, result = pool._handle('result', 1, request_id, {'is_authentic': True})
+    request.future.set_result(result)
+    assert future.result(timeout=1) == {'is_authentic': True}
+    assert pool._workers[1].load == 0.0
@@ -0,0 +1,154 @@
+# ai-models/themes.py
+import re
+
+# Define theme keywords
+THEME_KEYWORDS = {
+    'flying': ['fly', 'flying', 'float', 'levitate', 'air'],
+    'falling': ['fall', 'falling', 'drop', 'plummet'],
+    'chase': ['chase', 'run', 'pursue', 'follow', 'escape'],
+    'water': ['water', 'ocean', 'sea', 'swim', 'drown', 'river', 'lake'],
+    'death': ['death', 'die', 'dead', 'funeral', 'grave'],
+    'family': ['family', 'mother', 'father', 'parent', 'brother', 'sister', 'child'],
+    'school': ['school', 'class', 'exam', 'test', 'teacher', 'student'],
+    'work': ['work', 'job', 'office', 'boss', 'colleague']
+}
+
+# Define emotion keywords
+EMOTION_KEYWORDS = {
+    'joy': ['happy', 'joy', 'excited', 'laugh', 'pleasure'],
+    'fear': ['fear', 'scared', 'terrified', 'afraid', 'horror'],
+    'sadness': ['sad', 'unhappy', 'depressed', 'cry', 'tears'],
+    'anger': ['angry', 'mad', 'furious', 'rage', 'upset'],
+    'surprise': ['surprise', 'shocked', 'unexpected', 'astonish'],
+    'anxiety': ['anxious', 'worry', 'stress', 'tension', 'nervous']
+}
+
+# What the most relevant theme may point to
+THEME_SIGNIFICANCE = {
+    'flying': "a desire for freedom or escape from constraints.",
+    'falling': "a lack of control or insecurity in some aspect of your life.",
+    'chase': "avoidance of a problem or fear that needs to be confronted.",
+    'water': "emotions or the unconscious mind.",
+    'death': "transformation, endings, or significant life changes.",
+    'family': "your relationships and connections to others.",
+    'school': "feelings of being tested or evaluated in your life.",
+    'work': "your ambitions, responsibilities, or sense of purpose."
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# Inflections stripped so that e.g. "chased" also matches "chase"
+_SUFFIXES = ('ing', 'ed', 'es', 'er', 's', 'd')
+
+def tokenize(text):
+    """Lowercase and split text into word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+def _keyword_tokens(text):
+    # Possessives match their noun: "mother's" -> "mother"
+    return [token[:-2] if token.endswith("'s") else token for token in tokenize(text)]
+
+class KeywordMatcher:
+    """
+    Word-boundary-aware multi-lexicon keyword matcher
+
+    All lexicons are compiled into a single token -> entries hash map, so a
+    text is tokenized once and each token costs one lookup (plus a few for
+    inflected forms) no matter how many keywords are registered. Keywords
+    only match whole words: "air" matches "air" but not "chair".
+    """
+
+    def __init__(self, lexicons=None):
+        # group -> category -> number of keywords, in registration order
+        self.categories = {}
+
+        # token -> list of (group, category, keyword)
+        self._words = {}
+
+        # first token -> list of (tokens, group, category, keyword) for phrases
+        self._phrases = {}
+
+        for group, categories in (lexicons or {}).items():
+            for category, keywords in categories.items():
+                self.add_keywords(group, category, keywords)
+
+    def add_keywords(self, group, category, keywords):
+        """Register extra keywords (single words or phrases) for a category"""
+        self.categories.setdefault(group, {}).setdefault(category, 0)
+
+        for keyword in keywords:
+            tokens = tuple(_keyword_tokens(keyword))
+            if not tokens:
+                continue
+
+            entry = (group, category, keyword)
+            if len(tokens) == 1:
+                entries = self._words.setdefault(tokens[0], [])
+            else:
+                entries = self._phrases.setdefault(tokens[0], [])
+                entry = (tokens,) + entry
+
+            if entry not in entries:
+                entries.append(entry)
+                self.categories[group][category] += 1
+
+        return self
+
+    def _lookup(self, token):
+        """Entries for a token and for its uninflected stems"""
+        entries = list(self._words.get(token, ()))
+
+        for suffix in _SUFFIXES:
+            if not token.endswith(suffix) or len(token) - len(suffix) < 3:
+                continue
+            stem = token[:-len(suffix)]
+
+            candidates = [stem, stem + 'e']
+            # Doubled final consonant: "running" -> "run", "dropped" -> "drop"
+            if len(stem) > 3 and stem[-1] == stem[-2]:
+                candidates.append(stem[:-1])
+
+            for candidate in candidates:
+                entries.extend(self._words.get(candidate, ()))
+
+        return entries
+
+    def match(self, text):
+        """
+        Count distinct keyword hits per category in a single pass
+
+        Returns:
+            dict: group -> {category: number of distinct keywords found},
+                only categories with at least one hit are included
+        """
+        tokens = _keyword_tokens(text)
+        found = set()
+
+        for i, token in enumerate(tokens):
+            entries = self._lookup(token)
+            if entries:
+                found.update(entries)
+
+            for phrase in self._phrases.get(token, ()):
+                phrase_tokens = phrase[0]
+                if tuple(tokens[i:i + len(phrase_tokens)]) == phrase_tokens:
+                    found.add(phrase[1:])
+
+        counts = {}
+        for group, category, _ in found:
+            group_counts = counts.setdefault(group, {})
+            group_counts[category] = group_counts.get(category, 0) + 1
+
+        # Report categories in registration order
+        return {
+            group: {category: counts[group][category]
+                    for category in categories if category in counts.get(group, {})}
+            for group, categories in self.categories.items()
+        }
+
+def default_matcher():
+    """Build a matcher for the built-in theme and emotion lexicons"""
+    return KeywordMatcher({
+        'themes': THEME_KEYWORDS,
+        'emotions': EMOTION_KEYWORDS
+    })
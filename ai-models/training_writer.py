@@ -0,0 +1,71 @@
+# ai-models/training_writer.py
+"""
+Background side-work for long training runs.
+
+Rendering preview images and writing files are slow next to a compiled
+train step. BackgroundWriter runs such jobs on a single daemon thread, so
+the training loop only pays for snapshotting what a job needs. At most
+max_pending jobs wait; optional jobs (previews) are dropped rather than
+stalling training when the writer falls behind, while required jobs wait
+for room.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+
+class BackgroundWriter:
+    """One background thread running queued training side jobs in order"""
+
+    def __init__(self, max_pending=2, name='training-writer'):
+        self._queue = queue.Queue(maxsize=max_pending)
+
+        self.stats = {
+            'completed': 0,
+            'dropped': 0,
+            'failed': 0
+        }
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def has_room(self):
+        """Whether an optional job would be accepted right now"""
+        return not self._queue.full()
+
+    def submit(self, fn, *args, optional=False):
+        """
+        Queue fn(*args) for the writer thread
+
+        Returns:
+            Future: Resolves to fn's result; cancelled if an optional job was dropped
+        """
+        future = Future()
+        try:
+            self._queue.put((fn, args, future), block=not optional)
+        except queue.Full:
+            self.stats['dropped'] += 1
+            future.cancel()
+        return future
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            fn, args, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+                self.stats['completed'] += 1
+            except Exception as e:
+                # A failed preview must not take the training run down with it
+                self.stats['failed'] += 1
+                print(f"Background training job failed: {str(e)}")
+                future.set_exception(e)
+
+    def close(self):
+        """Finish every queued job and stop the thread"""
+        self._queue.put(None)
+        self._thread.join()
@@ -0,0 +1,171 @@
+# ai-models/vocab.py
+"""
+Compact vocabulary format shared by the validator and generator.
+
+A pickled Keras Tokenizer carries word_index and word_counts for every word
+ever seen. CompactTokenizer keeps only the num_words - 1 entries that
+texts_to_sequences can actually emit, stored as one newline-joined UTF-8
+blob behind a small header, so loading is one read and one split. Each
+process still builds its own word -> id dict from the blob, since dict
+lookups are the fastest way to map tokens in Python (benchmark.py
+--tokenizer measures them against np.searchsorted over a sorted word
+array, which is about 2x slower). Tokenization matches
+the Keras Tokenizer (same filters, lowercasing, OOV handling and pre-
+truncation) but pads a whole batch into an int32 array in one step.
+"""
+import itertools
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'DRMVOCAB1'
+
+# Keras Tokenizer defaults
+DEFAULT_FILTERS = '!"#$%&()*+,-./:;<=>?@[\\]^_`{|}~\t\n'
+
+class CompactTokenizer:
+    """Truncated word index with a batch tokenizer"""
+
+    def __init__(self, words, num_words=None, oov_index=None,
+                 lower=True, filters=DEFAULT_FILTERS, split=' '):
+        # words[i] has id i + 1, as in a Keras word_index
+        self.words = words
+        self.num_words = num_words
+        self.oov_index = oov_index
+        self.lower = lower
+        self.filters = filters
+        self.split = split
+
+        self._translate = str.maketrans({c: split for c in filters})
+        self.word_index = {word: i + 1 for i, word in enumerate(words)}
+
+    @classmethod
+    def from_keras(cls, tokenizer):
+        """Build from a fitted Keras Tokenizer, keeping only ids below num_words"""
+        limit = tokenizer.num_words or len(tokenizer.word_index) + 1
+        ordered = sorted(tokenizer.word_index.items(), key=lambda item: item[1])
+        words = [word for word, index in ordered if index < limit]
+
+        oov_index = tokenizer.word_index.get(tokenizer.oov_token) if tokenizer.oov_token else None
+        return cls(words, num_words=tokenizer.num_words, oov_index=oov_index,
+                   lower=tokenizer.lower, filters=tokenizer.filters, split=tokenizer.split)
+
+    @classmethod
+    def fit(cls, texts, num_words=None, oov_token='<OOV>', lower=True,
+            filters=DEFAULT_FILTERS, split=' '):
+        """
+        Fit on an iterable of texts in one pass, without TensorFlow
+
+        Word ids match Keras Tokenizer.fit_on_texts: the OOV token first,
+        then words by descending count with ties in first-seen order.
+        """
+        translate = str.maketrans({c: split for c in filters})
+        counts = {}
+        for text in texts:
+            if lower:
+                text = text.lower()
+            for word in text.translate(translate).split(split):
+                if word:
+                    counts[word] = counts.get(word, 0) + 1
+
+        # sorted is stable, so ties keep first-seen order
+        ranked = sorted(counts, key=counts.get, reverse=True)
+        ordered = ([oov_token] if oov_token else []) + ranked
+        limit = num_words or len(ordered) + 1
+        return cls(ordered[:limit - 1], num_words=num_words,
+                   oov_index=1 if oov_token else None,
+                   lower=lower, filters=filters, split=split)
+
+    def save(self, path):
+        """Write the vocabulary as a header plus one UTF-8 blob"""
+        blob = '\n'.join(self.words).encode('utf-8')
+        header = json.dumps({
+            'count': len(self.words),
+            'num_words': self.num_words,
+            'oov_index': self.oov_index,
+            'lower': self.lower,
+            'filters': self.filters,
+            'split': self.split,
+            'blob_bytes': len(blob)
+        }).encode('utf-8')
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as handle:
+            handle.write(MAGIC)
+            handle.write(struct.pack('<I', len(header)))
+            handle.write(header)
+            handle.write(blob)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as handle:
+            if handle.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compact vocabulary file")
+            (header_size,) = struct.unpack('<I', handle.read(4))
+            header = json.loads(handle.read(header_size))
+            blob = handle.read(header['blob_bytes'])
+
+        words = blob.decode('utf-8').split('\n') if blob else []
+
+        return cls(words, num_words=header['num_words'], oov_index=header['oov_index'],
+                   lower=header['lower'], filters=header['filters'], split=header['split'])
+
+    def text_to_ids(self, text):
+        """Token ids for one text, as Keras texts_to_sequences would produce"""
+        if self.lower:
+            text = text.lower()
+        get = self.word_index.get
+        tokens = text.translate(self._translate).split(self.split)
+        if self.oov_index is None:
+            return [i for i in map(get, tokens) if i is not None]
+        oov = self.oov_index
+        return [get(token, oov) for token in tokens if token]
+
+    def texts_to_sequences(self, texts):
+        return [self.text_to_ids(text) for text in texts]
+
+    def texts_to_padded(self, texts, maxlen, padding='post', truncating='pre'):
+        """
+        Tokenize and pad a batch straight into an int32 array
+
+        Matches pad_sequences(texts_to_sequences(texts), maxlen, padding, truncating).
+        """
+        if truncating == 'pre':
+            sequences = [self.text_to_ids(text)[-maxlen:] for text in texts]
+        else:
+            sequences = [self.text_to_ids(text)[:maxlen] for text in texts]
+
+        lengths = np.fromiter(map(len, sequences), dtype=np.int64, count=len(sequences))
+        total = int(lengths.sum())
+        padded = np.zeros((len(sequences), maxlen), dtype=np.int32)
+        if not total:
+            return padded
+
+        values = np.fromiter(itertools.chain.from_iterable(sequences), dtype=np.int32, count=total)
+        rows = np.repeat(np.arange(len(sequences)), lengths)
+        starts = np.cumsum(lengths) - lengths
+        columns = np.arange(total) - np.repeat(starts, lengths)
+        if padding == 'pre':
+            columns += np.repeat(maxlen - lengths, lengths)
+
+        padded[rows, columns] = values
+        return padded
+
+def load_tokenizer(vocab_path, pickle_path):
+    """
+    Load the compact tokenizer, converting it once from the pickled Keras
+    tokenizer when the compact file is missing or older than the pickle
+    """
+    if os.path.exists(vocab_path) and (
+            not os.path.exists(pickle_path) or
+            os.path.getmtime(vocab_path) >= os.path.getmtime(pickle_path)):
+        return CompactTokenizer.load(vocab_path)
+
+    import pickle
+    with open(pickle_path, 'rb') as handle:
+        tokenizer = CompactTokenizer.from_keras(pickle.load(handle))
+    tokenizer.save(vocab_path)
+    return tokenizer
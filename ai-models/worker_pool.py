@@ -0,0 +1,434 @@
+# ai-models/worker_pool.py
+"""
+Multi-process pool of warm DreamAIService workers.
+
+A single Python process cannot keep a many-core machine busy with
+TensorFlow inference plus the Python pre/post-processing around it.
+DreamWorkerPool starts N worker processes, each owning a DreamAIService
+whose models are loaded and warmed once, sends every request to the worker
+with the least expected work in flight and restarts a worker that dies,
+re-running the requests it was holding.
+
+Each worker runs requests on threads rather than one at a time, so its
+micro-batcher sees concurrent validations and can fill a batch, and image
+generation runs on a thread of its own, so a multi-second generation
+never holds up the validations queued behind it.
+
+Workers are spawned rather than forked because TensorFlow is not
+fork-safe, so weights are shared through memory-mapped files instead of
+copy-on-write pages: the TFLite backends ('tflite-<mode>') map the model
+flatbuffers, so every worker reads the same pages from the page cache.
+The 'keras' backend also works but loads a private copy of the weights
+into each worker. Each worker also holds its own small word index built
+from the compact vocabulary file.
+
+    pool = DreamWorkerPool(num_workers=8, backend='tflite-float16')
+    pool.initialize()
+    pool.validate_dream_text("I was flying over the sea")
+"""
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from inference import DreamAIService
+from instrumentation import NULL_INSTRUMENTATION
+
+# DreamAIService methods a worker runs on behalf of the pool
+METHODS = (
+    'validate_dream_text',
+    'validate_dreams_batch',
+    'generate_dream_image',
+    'generate_dream_images',
+)
+
+# Relative cost of one item per method, used to balance work across workers
+METHOD_COSTS = {
+    'validate_dream_text': 1.0,
+    'validate_dreams_batch': 1.0,
+    'generate_dream_image': 25.0,
+    'generate_dream_images': 25.0,
+}
+
+# Methods run on a worker's generation thread
+SLOW_METHODS = ('generate_dream_image', 'generate_dream_images')
+
+class WorkerError(RuntimeError):
+    """A request failed inside a worker process"""
+
+def _expected_cost(method, args):
+    # Batch methods take their texts first; generations also scale with variations
+    cost = METHOD_COSTS.get(method, 1.0)
+    if method in ('validate_dreams_batch', 'generate_dream_images'):
+        cost *= max(1, len(args[0]))
+    if method == 'generate_dream_images':
+        styles = args[1] if len(args) > 1 else None
+        per_prompt = args[2] if len(args) > 2 else 1
+        cost *= len(styles or [None]) * per_prompt
+    return cost
+
+def _run_task(service, worker_id, results, request_id, method, args, kwargs):
+    try:
+        result = getattr(service, method)(*args, **kwargs)
+    except Exception as e:
+        results.put(('error', worker_id, request_id, f"{type(e).__name__}: {e}"))
+    else:
+        results.put(('result', worker_id, request_id, result))
+
+def _worker_main(worker_id, service_kwargs, threads, concurrency, tasks, results):
+    # Limit each worker's TensorFlow thread pools to its share of the cores
+    if threads:
+        for name in ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS', 'TF_NUM_INTEROP_THREADS'):
+            os.environ[name] = str(threads)
+
+    try:
+        service = DreamAIService(**service_kwargs)
+        service.initialize()
+    except Exception as e:
+        results.put(('failed', worker_id, None, str(e)))
+        return
+    results.put(('ready', worker_id, os.getpid(), None))
+
+    # Requests run concurrently so the service's micro-batcher can coalesce them
+    fast = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='dream-worker')
+    slow = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dream-worker-generate')
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+
+            request_id, method, args, kwargs = task
+            executor = slow if method in SLOW_METHODS else fast
+            executor.submit(_run_task, service, worker_id, results, request_id, method, args, kwargs)
+    finally:
+        # Requests already received are finished before the worker exits
+        fast.shutdown(wait=True)
+        slow.shutdown(wait=True)
+
+class _Request:
+    def __init__(self, method, args, kwargs):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.cost = _expected_cost(method, args)
+        self.future = Future()
+        self.attempts = 0
+
+class _Worker:
+    def __init__(self, worker_id, process, tasks):
+        self.worker_id = worker_id
+        self.process = process
+        self.tasks = tasks
+        self.pid = None
+        self.ready = False
+
+        # request_id -> _Request sent to this worker and not yet answered
+        self.pending = {}
+        # Summed expected cost of pending
+        self.load = 0.0
+
+    def add(self, request_id, request):
+        self.pending[request_id] = request
+        self.load += request.cost
+
+    def pop(self, request_id):
+        request = self.pending.pop(request_id, None)
+        if request is not None:
+            self.load = self.load - request.cost if self.pending else 0.0
+        return request
+
+class DreamWorkerPool:
+    """
+    Least-loaded dispatch of DreamAIService calls over worker processes
+
+    A worker's load is the summed expected cost (METHOD_COSTS per item) of
+    the requests it holds, so one large generation counts for more than a
+    handful of validations. Each worker runs up to concurrency requests at
+    once (default: max_batch_size with micro_batching, else 4) plus one
+    generation.
+
+    Exposes the same request methods as DreamAIService (plus initialize),
+    so it can stand in for the service in DreamInferenceServer. Theme
+    analysis and journal analytics are answered in the calling process
+    and never wait for a worker. Requests
+    held by a worker that crashes are re-run on another worker up to
+    max_retries times before their futures fail with WorkerError.
+    """
+
+    def __init__(self, num_workers=None, threads_per_worker=None, concurrency=None, max_retries=1,
+                 startup_timeout=600.0, instrumentation=None, journal_analytics=None,
+                 **service_kwargs):
+        self.num_workers = num_workers or os.cpu_count() or 1
+        if threads_per_worker is None:
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.threads_per_worker = threads_per_worker
+        if concurrency is None:
+            concurrency = service_kwargs.get('max_batch_size', 32) if service_kwargs.get('micro_batching') else 4
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.startup_timeout = startup_timeout
+
+        # Keyword arguments for each worker's DreamAIService (must be picklable)
+        self.service_kwargs = service_kwargs
+
+        # Parent-side request counts and restarts; workers keep no metrics
+        self.metrics = instrumentation or NULL_INSTRUMENTATION
+
+        # Theme analysis and journal analytics need no model, so they run in
+        # this process instead of waiting for the workers to load TensorFlow
+        self.journal_analytics = journal_analytics
+        self._analyzer = DreamAIService(theme_lexicons=service_kwargs.get('theme_lexicons'),
+                                        theme_significance=service_kwargs.get('theme_significance'),
+                                        instrumentation=instrumentation,
+                                        journal_analytics=journal_analytics)
+
+        self._context = multiprocessing.get_context('spawn')
+        self._results = self._context.Queue()
+        self._lock = threading.Lock()
+        self._all_ready = threading.Condition(self._lock)
+        self._workers = {}
+        self._request_ids = itertools.count()
+        self._collector = None
+        self._closed = False
+
+        self.initialized = False
+        self.startup_error = None
+
+        self.stats = {
+            'requests': 0,
+            'restarts': 0,
+            'retried': 0,
+            'failed': 0
+        }
+
+    def initialize(self):
+        """Start the workers and wait until each has loaded and warmed its models"""
+        if self.initialized:
+            return
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DreamWorkerPool is closed")
+            if self._collector is None:
+                for worker_id in range(self.num_workers):
+                    self._start_worker(worker_id)
+                self._collector = threading.Thread(target=self._collect, daemon=True,
+                                                   name='dream-worker-pool')
+                self._collector.start()
+
+            ready = self._all_ready.wait_for(
+                lambda: self.startup_error or all(w.ready for w in self._workers.values()),
+                timeout=self.startup_timeout
+            )
+            if self.startup_error:
+                raise RuntimeError(f"Worker failed to start: {self.startup_error}")
+            if not ready:
+                raise TimeoutError("Workers did not become ready in time")
+            self.initialized = True
+
+        print(f"Dream worker pool ready ({self.num_workers} workers, "
+              f"{self.threads_per_worker} threads each)")
+
+    def _start_worker(self, worker_id):
+        tasks = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_id, self.service_kwargs, self.threads_per_worker, self.concurrency,
+                  tasks, self._results),
+            name=f'dream-worker-{worker_id}',
+            daemon=True
+        )
+        process.start()
+        self._workers[worker_id] = _Worker(worker_id, process, tasks)
+
+    def submit(self, method, *args, **kwargs):
+        """
+        Queue one DreamAIService call on the least-loaded worker
+
+        Returns:
+            Future: Resolves to the method's return value
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown service method: {method}")
+        if not self.initialized:
+            self.initialize()
+
+        request = _Request(method, args, kwargs)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("DreamWorkerPool is closed")
+            self.stats['requests'] += 1
+            self._dispatch(next(self._request_ids), request)
+        self.metrics.count('pool_requests', method=method)
+        return request.future
+
+    def call(self, method, *args, **kwargs):
+        return self.submit(method, *args, **kwargs).result()
+
+    def _dispatch(self, request_id, request):
+        # Called with the lock held; prefer ready workers, then the least expected work
+        if not self._workers:
+            request.future.set_exception(WorkerError("No live workers"))
+            return
+        worker = min(self._workers.values(), key=lambda w: (not w.ready, w.load))
+        request.attempts += 1
+        worker.add(request_id, request)
+        worker.tasks.put((request_id, request.method, request.args, request.kwargs))
+
+    def _collect(self):
+        while True:
+            try:
+                kind, worker_id, value, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                kind = None
+            except (EOFError, OSError):
+                return
+
+            with self._lock:
+                if self._closed:
+                    return
+                if kind is not None:
+                    resolved = self._handle(kind, worker_id, value, payload)
+                else:
+                    resolved = None
+                self._restart_dead_workers()
+
+            if resolved is not None:
+                request, ok, result = resolved
+                if ok:
+                    request.future.set_result(result)
+                else:
+                    request.future.set_exception(WorkerError(result))
+
+    def _handle(self, kind, worker_id, value, payload):
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            return None
+
+        if kind == 'ready':
+            worker.pid = value
+            worker.ready = True
+            self._all_ready.notify_all()
+            return None
+
+        if kind == 'failed':
+            self.startup_error = payload
+            self._all_ready.notify_all()
+            return None
+
+        request = worker.pop(value)
+        if request is None:
+            return None
+        return request, kind == 'result', payload
+
+    def _restart_dead_workers(self):
+        for worker_id, worker in list(self._workers.items()):
+            if worker.process.is_alive():
+                continue
+
+            print(f"Dream worker {worker_id} (pid {worker.pid}) exited "
+                  f"with code {worker.process.exitcode}")
+            del self._workers[worker_id]
+
+            # A worker that never came up will not come up on restart either
+            if worker.ready:
+                self._start_worker(worker_id)
+                self.stats['restarts'] += 1
+                self.metrics.count('pool_worker_restarts')
+            elif self.startup_error is None:
+                self.startup_error = f"worker {worker_id} exited during start-up"
+                self._all_ready.notify_all()
+
+            for request_id, request in worker.pending.items():
+                if request.attempts <= self.max_retries:
+                    self.stats['retried'] += 1
+                    self._dispatch(request_id, request)
+                else:
+                    self.stats['failed'] += 1
+                    request.future.set_exception(
+                        WorkerError(f"Worker {worker_id} crashed while running {request.method}")
+                    )
+
+    def status(self):
+        """Per-worker pid, readiness and requests in flight"""
+        with self._lock:
+            return {
+                'workers': [{'worker_id': w.worker_id, 'pid': w.pid, 'ready': w.ready,
+                             'in_flight': len(w.pending), 'load': w.load}
+                            for w in sorted(self._workers.values(), key=lambda w: w.worker_id)],
+                'stats': dict(self.stats)
+            }
+
+    def close(self, timeout=5.0):
+        """Stop every worker and fail requests that have not finished"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers.values())
+
+        for worker in workers:
+            worker.tasks.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            for request in worker.pending.values():
+                if not request.future.done():
+                    request.future.set_exception(WorkerError("DreamWorkerPool closed"))
+
+    def __enter__(self):
+        self.initialize()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    # Same request API as DreamAIService
+
+    def validate_dream_text(self, dream_text, audio_url=None):
+        return self.call('validate_dream_text', dream_text, audio_url)
+
+    def validate_dreams_batch(self, dream_texts, audio_urls=None):
+        return self.call('validate_dreams_batch', list(dream_texts), audio_urls)
+
+    def generate_dream_image(self, dream_text, style=None, seed=None):
+        return self.call('generate_dream_image', dream_text, style, seed)
+
+    def generate_dream_images(self, dream_texts, styles=None, per_prompt=1, seeds=None):
+        return self.call('generate_dream_images', list(dream_texts), styles, per_prompt, seeds)
+
+    def analyze_dream_themes(self, dream_text, user_id=None, timestamp=None):
+        return self._analyzer.analyze_dream_themes(dream_text, user_id, timestamp)
+
+    def dream_trends(self, user_id, start=None, end=None, interval_days=7):
+        return self._analyzer.dream_trends(user_id, start, end, interval_days)
+
+    def top_dream_themes(self, user_id, start=None, end=None, limit=5, group='themes'):
+        return self._analyzer.top_dream_themes(user_id, start, end, limit, group)
+
+    def reload_models(self):
+        """
+        Ask every worker to reload changed model files
+
+        Returns:
+            bool: True if any worker reloaded its validator
+        """
+        if not self.initialized:
+            self.initialize()
+
+        # Sent to each worker directly rather than to the least-loaded one
+        futures = []
+        with self._lock:
+            for worker in self._workers.values():
+                request = _Request('reload_models', (), {})
+                request.attempts = self.max_retries + 1
+                request_id = next(self._request_ids)
+                worker.add(request_id, request)
+                worker.tasks.put((request_id, request.method, (), {}))
+                futures.append(request.future)
+        return any([future.result() for future in futures])